@@ -8,5 +8,7 @@ class CustomUserAdmin(UserAdmin):
     )
     list_display = UserAdmin.list_display + ('penalty_points',)
     list_filter = UserAdmin.list_filter + ('penalty_points',)
+    # Changed through penalty ledger entries so the history stays complete
+    readonly_fields = ('penalty_points',)
 
 admin.site.register(User, CustomUserAdmin)
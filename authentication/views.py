@@ -1,11 +1,11 @@
 from rest_framework import status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.generics import RetrieveAPIView
 from django.shortcuts import get_object_or_404
-from drf_spectacular.utils import extend_schema, OpenApiResponse
-from drf_spectacular.openapi import OpenApiParameter, OpenApiTypes
+from library_management.openapi import extend_schema, OpenApiParameter, OpenApiResponse, OpenApiTypes
+from library_management.throttling import LoginThrottle, RegisterThrottle
 
 from .models import User
 from .serializers import UserRegistrationSerializer, LoginSerializer, UserSerializer, AuthResponseSerializer
@@ -23,6 +23,7 @@ from .serializers import UserRegistrationSerializer, LoginSerializer, UserSerial
 )
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([RegisterThrottle])
 def register(request):
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
@@ -48,6 +49,7 @@ def register(request):
 )
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([LoginThrottle])
 def login(request):
     serializer = LoginSerializer(data=request.data)
     if serializer.is_valid():
@@ -86,7 +88,8 @@ class UserPenaltyView(RetrieveAPIView):
     
     def get_object(self):
         user_id = self.kwargs['id']
-        user = get_object_or_404(User, id=user_id)
+        # penalty_points is the ledger total kept up to date on every return
+        user = get_object_or_404(User.objects.only(*UserSerializer.Meta.fields), id=user_id)
         
         # Check permissions - admin can view any user, users can only view themselves
         if not (self.request.user.is_staff or self.request.user.id == user.id):
@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import Author, Category, Book, Borrow
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Now
+
+from library_management.batching import pk_batches
+
+from . import branches, bulk, penalties
+from .models import (
+    ArchivedBorrow, Author, Category, Book, Borrow, Branch, BranchInventory, FinePolicy, PenaltyLedgerEntry,
+    Reservation
+)
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
@@ -13,6 +22,17 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name']
     ordering = ['name']
 
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    list_display = ['name', 'created_at']
+    search_fields = ['name']
+    ordering = ['name']
+
+class BranchInventoryInline(admin.TabularInline):
+    model = BranchInventory
+    extra = 0
+    autocomplete_fields = ['branch']
+
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ['title', 'author', 'category', 'total_copies', 'available_copies', 'created_at']
@@ -20,6 +40,29 @@ class BookAdmin(admin.ModelAdmin):
     search_fields = ['title', 'author__name', 'category__name']
     ordering = ['title']
     raw_id_fields = ['author', 'category']
+    list_select_related = ['author', 'category']
+    show_full_result_count = False
+    actions = ['add_copy', 'remove_copy']
+    inlines = [BranchInventoryInline]
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Books stocked per branch show the sums of their branch rows
+        branches.sync_book_totals(form.instance.pk)
+    
+    @admin.action(description='Add one copy to the selected books')
+    def add_copy(self, request, queryset):
+        updated = sum(bulk.add_copy(pks) for pks in pk_batches(queryset))
+        self.message_user(request, f'Added a copy to {updated} book(s); books stocked per branch were skipped.')
+    
+    @admin.action(description='Withdraw one shelved copy from the selected books')
+    def remove_copy(self, request, queryset):
+        updated = sum(bulk.remove_copy(pks) for pks in pk_batches(queryset))
+        self.message_user(
+            request,
+            f'Withdrew a copy from {updated} book(s); books with no copy on the shelf '
+            f'or stocked per branch were skipped.'
+        )
 
 @admin.register(Borrow)
 class BorrowAdmin(admin.ModelAdmin):
@@ -29,8 +72,84 @@ class BorrowAdmin(admin.ModelAdmin):
     ordering = ['-borrow_date']
     raw_id_fields = ['user', 'book']
     readonly_fields = ['is_overdue', 'days_overdue']
+    list_select_related = ['user', 'book']
+    show_full_result_count = False
+    actions = ['mark_returned']
     
+    def get_queryset(self, request):
+        # Computed in SQL so the changelist doesn't call the property per row.
+        return super().get_queryset(request).annotate(
+            overdue=ExpressionWrapper(Q(return_date__isnull=True, due_date__lt=Now()), output_field=BooleanField())
+        )
+    
+    @admin.display(boolean=True, description='Overdue', ordering='overdue')
     def is_overdue(self, obj):
-        return obj.is_overdue
-    is_overdue.boolean = True
-    is_overdue.short_description = 'Overdue'
+        return obj.overdue
+    
+    @admin.action(description='Mark selected borrows as returned (with late penalties)')
+    def mark_returned(self, request, queryset):
+        returned = sum(bulk.return_borrows(pks) for pks in pk_batches(queryset.filter(return_date__isnull=True)))
+        self.message_user(request, f'Marked {returned} borrow(s) as returned.')
+
+@admin.register(ArchivedBorrow)
+class ArchivedBorrowAdmin(admin.ModelAdmin):
+    """Read-only: rows are written by archive_borrows."""
+    list_display = ['id', 'user', 'book', 'borrow_date', 'due_date', 'return_date']
+    list_filter = ['return_date']
+    search_fields = ['user__username', 'book__title']
+    ordering = ['-borrow_date']
+    raw_id_fields = ['user', 'book', 'branch']
+    list_select_related = ['user', 'book']
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'book', 'status', 'ticket', 'hold_expires_at', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__username', 'book__title']
+    ordering = ['-created_at']
+    raw_id_fields = ['user', 'book']
+    list_select_related = ['user', 'book__author']
+    readonly_fields = ['status', 'ticket', 'hold_expires_at']
+
+@admin.register(FinePolicy)
+class FinePolicyAdmin(admin.ModelAdmin):
+    """Changes apply to new returns; run rerate_penalties to re-rate past ones."""
+    list_display = [
+        '__str__', 'grace_days', 'points_per_day', 'escalate_after_days', 'escalated_points_per_day',
+        'max_points', 'updated_at'
+    ]
+    list_select_related = ['category']
+    autocomplete_fields = ['category']
+
+@admin.register(PenaltyLedgerEntry)
+class PenaltyLedgerEntryAdmin(admin.ModelAdmin):
+    """Append-only: staff add adjustments, nothing is edited or deleted."""
+    list_display = ['user', 'points', 'reason', 'borrow', 'created_at']
+    list_filter = ['reason', 'created_at']
+    search_fields = ['user__username', 'note']
+    ordering = ['-created_at']
+    raw_id_fields = ['user', 'borrow']
+    list_select_related = ['user']
+    
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return ['user', 'points', 'note']
+        return ['user', 'borrow', 'points', 'reason', 'note', 'created_at']
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def save_model(self, request, obj, form, change):
+        # Saves obj itself, so the admin can link to the new entry.
+        obj.reason = PenaltyLedgerEntry.ADJUSTMENT
+        penalties.add_penalties([obj])
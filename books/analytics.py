@@ -0,0 +1,94 @@
+"""
+Circulation rollups.
+
+``borrow_book`` and ``return_book`` bump one row per book, category and
+author for the current day inside their transaction, so dashboards read at
+most one row per day and dimension instead of scanning ``Borrow``.
+``python manage.py backfill_circulation`` rebuilds the rollups from history.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import DailyAuthorCirculation, DailyBookCirculation, DailyCategoryCirculation
+
+# (rollup model, dimension field, Borrow lookup of the dimension id)
+ROLLUPS = [
+    (DailyBookCirculation, 'book', 'book_id'),
+    (DailyAuthorCirculation, 'author', 'book__author_id'),
+    (DailyCategoryCirculation, 'category', 'book__category_id'),
+]
+
+COUNTERS = ['borrows', 'returns', 'late_returns', 'penalty_points']
+
+
+def _increment(model, key, deltas):
+    updates = {name: F(name) + value for name, value in deltas.items()}
+    if model.objects.filter(**key).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Another transaction created today's row first.
+        model.objects.filter(**key).update(**updates)
+
+
+def _record(book, when, deltas):
+    date = timezone.localdate(when)
+    dimensions = {'book': book.pk, 'author': book.author_id, 'category': book.category_id}
+    # Always book, author, category: a fixed lock order avoids deadlocks.
+    for model, dimension, _ in ROLLUPS:
+        _increment(model, {'date': date, f'{dimension}_id': dimensions[dimension]}, deltas)
+
+
+def record_borrow(borrow):
+    _record(borrow.book, borrow.borrow_date, {'borrows': 1})
+
+
+def record_return(borrow, penalty_points):
+    deltas = {'returns': 1}
+    if borrow.return_date > borrow.due_date:
+        deltas['late_returns'] = 1
+    if penalty_points:
+        deltas['penalty_points'] = penalty_points
+    _record(borrow.book, borrow.return_date, deltas)
+
+
+def record_returns(book, when, returns, late_returns, penalty_points):
+    """``record_return`` for several borrows of ``book`` returned together."""
+    deltas = {'returns': returns}
+    if late_returns:
+        deltas['late_returns'] = late_returns
+    if penalty_points:
+        deltas['penalty_points'] = penalty_points
+    _record(book, when, deltas)
+
+
+def circulation_report(model, dimension, start, end, limit=None):
+    """
+    Sum ``model`` rows between ``start`` and ``end`` (inclusive) per
+    dimension, most borrowed first.
+    """
+    rows = (
+        model.objects
+        .filter(date__gte=start, date__lte=end)
+        .values(f'{dimension}_id', name=F(f'{dimension}__{"title" if dimension == "book" else "name"}'))
+        .annotate(**{counter: Sum(counter) for counter in COUNTERS})
+        .order_by('-borrows', 'name')
+    )
+    if limit:
+        rows = rows[:limit]
+
+    report = []
+    for row in rows:
+        report.append({
+            'id': row[f'{dimension}_id'],
+            'name': row['name'],
+            'borrows': row['borrows'],
+            'returns': row['returns'],
+            'late_returns': row['late_returns'],
+            'late_return_rate': round(row['late_returns'] / row['returns'], 4) if row['returns'] else 0.0,
+            'penalty_points': row['penalty_points'],
+        })
+    return report
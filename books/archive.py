@@ -0,0 +1,63 @@
+"""
+Archival of old returned borrows.
+
+Every query on ``Borrow`` (open borrow counts, ``/api/my-borrows/``, the
+admin changelist) pays for the rows it has to skip, and returned borrows are
+almost all of them. ``python manage.py archive_borrows`` moves borrows
+returned more than ``BORROW_ARCHIVE['AFTER_DAYS']`` days ago to the compact
+``ArchivedBorrow`` table in primary key batches, each batch copied and
+deleted in one short transaction, so ``Borrow`` only holds open and recent
+loans. Archived rows keep their ids; penalty ledger entries (which have no
+database constraint on the borrow) and outbox payloads still refer to them.
+
+Code that reads borrow history (``/api/my-borrows/history/``,
+``backfill_circulation``, ``build_recommendations``) reads both tables.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from library_management.batching import keyset_batches
+
+from .fast_serializers import BorrowValuesSerializer
+from .models import ArchivedBorrow, Borrow
+
+# Every table holding borrow history, live first.
+HISTORY_MODELS = (Borrow, ArchivedBorrow)
+
+FIELDS = ['user_id', 'book_id', 'branch_id', 'borrow_date', 'due_date', 'return_date']
+
+
+def archivable(days=None):
+    """Borrows returned more than ``days`` days ago."""
+    days = settings.BORROW_ARCHIVE['AFTER_DAYS'] if days is None else days
+    return Borrow.objects.filter(return_date__lt=timezone.now() - timedelta(days=days))
+
+
+def archive_borrows(days=None, batch_size=None):
+    """Move ``archivable(days)`` borrows to ``ArchivedBorrow``; returns the count moved."""
+    batch_size = batch_size or settings.BORROW_ARCHIVE['BATCH_SIZE']
+    moved = 0
+    for batch in keyset_batches(archivable(days), batch_size, fields=FIELDS):
+        with transaction.atomic():
+            ArchivedBorrow.objects.bulk_create(
+                ArchivedBorrow(id=pk, **dict(zip(FIELDS, values))) for pk, *values in batch
+            )
+            # Their sent-reminder records go with them.
+            Borrow.objects.filter(pk__in=[row[0] for row in batch]).delete()
+        moved += len(batch)
+    return moved
+
+
+def history(user, names=None):
+    """
+    ``user``'s live and archived borrows, newest first, as one ``UNION ALL``
+    of ``BorrowValuesSerializer`` rows for ``names``.
+    """
+    live, archived = (
+        BorrowValuesSerializer.values(model.objects.filter(user=user).order_by(), names, extra=['borrow_date', 'id'])
+        for model in HISTORY_MODELS
+    )
+    return live.union(archived, all=True).order_by('-borrow_date', '-id')
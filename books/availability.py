@@ -0,0 +1,116 @@
+"""
+Push feed of ``Book.available_copies`` changes.
+
+``borrow_book`` and ``return_book`` publish the new count once their
+transaction commits; ``availability_stream`` relays it to browsers as
+Server-Sent Events so the catalogue stops polling ``/api/books/<pk>/``.
+
+Fan-out happens in the worker process through the broker named by
+``AVAILABILITY_FEED['BROKER']``. ``InProcessBroker`` only reaches clients
+connected to the same process; a broker for multi-process deployments
+overrides ``publish()`` to send the event to Redis/Postgres NOTIFY/etc. and
+calls ``dispatch()`` for every event it receives back.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """
+    One client's view of the feed.
+
+    Only the latest count per book is kept, so a burst of borrows and returns
+    on a title reaches the client as a single event.
+    """
+
+    def __init__(self, broker, book_ids, loop):
+        self.broker = broker
+        self.book_ids = frozenset(book_ids)
+        self._loop = loop
+        self._pending = {}
+        self._event = asyncio.Event()
+
+    def deliver(self, book_id, copies):
+        """Queue an update; safe to call from any thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._store, book_id, copies)
+        except RuntimeError:
+            # The client's event loop is gone; it will unsubscribe shortly.
+            pass
+
+    def _store(self, book_id, copies):
+        self._pending[book_id] = copies
+        self._event.set()
+
+    async def changes(self, timeout):
+        """Wait up to ``timeout`` seconds and return ``{book_id: copies}``."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        await asyncio.sleep(settings.AVAILABILITY_FEED['COALESCE_SECONDS'])
+        self._event.clear()
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, book_ids, loop):
+        subscription = Subscription(self, book_ids, loop)
+        with self._lock:
+            for book_id in subscription.book_ids:
+                self._subscriptions[book_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for book_id in subscription.book_ids:
+                subscribers = self._subscriptions.get(book_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[book_id]
+
+    def publish(self, book_id, copies):
+        self.dispatch(book_id, copies)
+
+    def dispatch(self, book_id, copies):
+        """Deliver an event to the subscriptions held by this process."""
+        with self._lock:
+            subscribers = list(self._subscriptions.get(book_id, ()))
+        for subscription in subscribers:
+            subscription.deliver(book_id, copies)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.AVAILABILITY_FEED['BROKER'])()
+    return _broker
+
+
+def publish_copies(book_id, copies):
+    """Publish a book's new ``available_copies`` after the current transaction commits."""
+    transaction.on_commit(lambda: get_broker().publish(book_id, copies))
+
+
+def publish_availability(book):
+    publish_copies(book.pk, book.available_copies)
@@ -0,0 +1,105 @@
+"""
+Per-branch copy inventory.
+
+A popular title stocked as one ``Book`` row funnels every borrow through a
+single row lock. Stocking it per branch spreads the copies over one
+``BranchInventory`` row per branch: a borrow takes a copy from one branch row
+with a conditional ``UPDATE`` (preferred branch first, then the branch with
+the most copies), so concurrent borrows of the same title mostly touch
+different rows. ``Book.total_copies`` and ``Book.available_copies`` remain
+the sums the catalogue reads; the borrow adjusts the book with a single
+``F()`` update (``lend_copy()``) as its last statement, so the ``Book`` row is
+only locked until the commit right after it.
+
+Books without branch rows keep the single-counter behaviour.
+
+Lock order: branch rows (by primary key), then the ``Book``. Code that needs
+the book locked for queue changes uses ``lock_book()`` so it cannot deadlock
+with a borrow that already holds a branch row.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+
+from .cache import book_detail_cache
+from .models import Book, BranchInventory
+
+
+def is_stocked(book_id):
+    """Whether ``book_id``'s copies are kept per branch."""
+    return BranchInventory.objects.filter(book_id=book_id).exists()
+
+
+def lock_book(book_id):
+    """Lock ``book_id``'s branch rows, then the book itself, and return the book."""
+    list(
+        BranchInventory.objects.select_for_update()
+        .filter(book_id=book_id).order_by('pk').values_list('pk')
+    )
+    return Book.objects.select_for_update().get(id=book_id)
+
+
+def take_copy(book_id, branch_id=None):
+    """
+    Take a shelved copy of ``book_id``, preferring ``branch_id`` and falling
+    back to the other branches. Returns the branch the copy came from, or
+    ``None`` when no branch has one left.
+    """
+    candidates = list(
+        BranchInventory.objects
+        .filter(book_id=book_id, available_copies__gt=0)
+        .order_by('-available_copies', 'branch_id')
+        .values_list('branch_id', flat=True)
+    )
+    if branch_id in candidates:
+        candidates.remove(branch_id)
+        candidates.insert(0, branch_id)
+    for candidate in candidates:
+        # Conditional on the count so a copy taken since the read above is skipped.
+        taken = BranchInventory.objects.filter(
+            book_id=book_id, branch_id=candidate, available_copies__gt=0
+        ).update(available_copies=F('available_copies') - 1)
+        if taken:
+            return candidate
+    return None
+
+
+def lend_copy(book_id):
+    """
+    Count a copy taken with ``take_copy()`` off the book's counter. Call it
+    last in the transaction: it locks the ``Book`` row until the commit.
+    """
+    Book.objects.filter(pk=book_id).update(available_copies=F('available_copies') - 1, updated_at=Now())
+
+
+def shelve_copies(book_id, branch_id, count=1):
+    """Put ``count`` copies back on ``branch_id``'s shelf (the caller updates the book)."""
+    BranchInventory.objects.filter(book_id=book_id, branch_id=branch_id).update(
+        available_copies=F('available_copies') + count
+    )
+
+
+def move_copy(book_id, from_branch_id, to_branch_id):
+    """Transfer ownership of a copy returned to a branch other than the one it was lent from."""
+    if from_branch_id == to_branch_id:
+        return
+    BranchInventory.objects.filter(book_id=book_id, branch_id=from_branch_id).update(
+        total_copies=F('total_copies') - 1
+    )
+    inventory, _ = BranchInventory.objects.get_or_create(book_id=book_id, branch_id=to_branch_id)
+    BranchInventory.objects.filter(pk=inventory.pk).update(total_copies=F('total_copies') + 1)
+
+
+def sync_book_totals(book_id):
+    """Set the book's counters to the sums of its branch rows, if it has any."""
+    rows = list(BranchInventory.objects.filter(book_id=book_id).values_list('total_copies', 'available_copies'))
+    if not rows:
+        return False
+    Book.objects.filter(pk=book_id).update(
+        total_copies=sum(total for total, _ in rows),
+        available_copies=sum(available for _, available in rows),
+        updated_at=Now(),
+    )
+    # update() sends no post_save, and total_copies is not re-read on a cache hit.
+    transaction.on_commit(lambda: book_detail_cache.invalidate(book_id))
+    return True
@@ -0,0 +1,141 @@
+"""
+Set-based circulation changes for admin actions.
+
+Each function takes one batch of primary keys (see
+``library_management.batching.pk_batches``) and applies it in a single
+transaction with a fixed number of statements per book or user rather than
+per row, so selecting every row in the admin keeps memory constant.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from . import analytics, branches, fines, outbox, penalties, reservations
+from .availability import publish_copies
+from .cache import book_detail_cache
+from .models import Book, BranchInventory, Borrow, HoldQueue, PenaltyLedgerEntry
+
+
+def _queued_book_ids(book_ids):
+    """Books with patrons waiting, whose copies must go through the queue."""
+    return set(
+        HoldQueue.objects.filter(book_id__in=book_ids, next_ticket__gt=F('head')).values_list('book_id', flat=True)
+    )
+
+
+def _publish(book_ids):
+    for book_id, copies in Book.objects.filter(pk__in=book_ids).values_list('pk', 'available_copies'):
+        publish_copies(book_id, copies)
+
+
+def _release_copies(copies_by_book, copies_by_branch=None):
+    """
+    Put ``{book_id: count}`` copies back on the shelf, honouring reservation
+    queues. ``copies_by_branch`` maps ``(book_id, branch_id)`` to the number
+    of those copies that belong to each branch, for books stocked per branch.
+    """
+    copies_by_branch = copies_by_branch or {}
+    # Lock in primary key order, branch rows first (see branches.lock_book), so
+    # concurrent batches can't deadlock, and so nobody can join a queue
+    # between the check below and the update.
+    list(
+        BranchInventory.objects.select_for_update()
+        .filter(book_id__in=copies_by_book).order_by('pk').values_list('pk')
+    )
+    list(Book.objects.select_for_update().filter(pk__in=copies_by_book).order_by('pk').values_list('pk'))
+    queued = _queued_book_ids(copies_by_book)
+
+    shelved = defaultdict(list)
+    for book_id, count in copies_by_book.items():
+        if book_id not in queued:
+            shelved[count].append(book_id)
+    for count, book_ids in shelved.items():
+        Book.objects.filter(pk__in=book_ids).update(available_copies=F('available_copies') + count, updated_at=Now())
+    for (book_id, branch_id), count in copies_by_branch.items():
+        if book_id not in queued:
+            branches.shelve_copies(book_id, branch_id, count)
+
+    for book in Book.objects.filter(pk__in=queued).order_by('pk'):
+        branch_ids = [
+            branch_id for (book_id, branch_id), count in sorted(copies_by_branch.items())
+            if book_id == book.pk for _ in range(count)
+        ]
+        for index in range(copies_by_book[book.pk]):
+            reservations.release_copy(book, branch_ids[index] if index < len(branch_ids) else None)
+    _publish(copies_by_book)
+
+
+def return_borrows(pks):
+    """Return the open borrows among ``pks`` as of now; returns how many were returned."""
+    now = timezone.now()
+    with transaction.atomic():
+        borrows = list(
+            Borrow.objects.select_for_update()
+            .filter(pk__in=pks, return_date__isnull=True)
+            .only('id', 'user_id', 'book_id', 'branch_id', 'borrow_date', 'due_date')
+        )
+        if not borrows:
+            return 0
+        Borrow.objects.filter(pk__in=[borrow.pk for borrow in borrows]).update(return_date=now)
+
+        books = Book.objects.only('id', 'author_id', 'category_id').in_bulk({borrow.book_id for borrow in borrows})
+        charges = fines.rate(
+            [now - borrow.due_date for borrow in borrows],
+            [books[borrow.book_id].category_id for borrow in borrows],
+        )
+
+        entries = []
+        events = []
+        returned = defaultdict(lambda: [0, 0, 0])  # book_id: [returns, late returns, points]
+        by_branch = defaultdict(int)
+        for borrow, points in zip(borrows, charges):
+            if borrow.branch_id is not None:
+                by_branch[borrow.book_id, borrow.branch_id] += 1
+            borrow.return_date = now
+            events.append((borrow, points))
+            totals = returned[borrow.book_id]
+            totals[0] += 1
+            if now > borrow.due_date:
+                totals[1] += 1
+            if points:
+                totals[2] += points
+                entries.append(PenaltyLedgerEntry(
+                    user_id=borrow.user_id, borrow=borrow, points=points, reason=PenaltyLedgerEntry.LATE_RETURN
+                ))
+        penalties.add_penalties(entries)
+        outbox.returned_many(events)
+
+        for book_id, (returns, late_returns, points) in sorted(returned.items()):
+            analytics.record_returns(books[book_id], now, returns, late_returns, points)
+
+        _release_copies({book_id: totals[0] for book_id, totals in returned.items()}, by_branch)
+    return len(borrows)
+
+
+def add_copy(pks):
+    """Add one copy to each book in ``pks``; books stocked per branch are skipped."""
+    with transaction.atomic():
+        pks = list(Book.objects.filter(pk__in=pks, branch_inventory__isnull=True).values_list('pk', flat=True))
+        updated = Book.objects.filter(pk__in=pks).update(total_copies=F('total_copies') + 1, updated_at=Now())
+        _release_copies(dict.fromkeys(pks, 1))
+    for pk in pks:
+        book_detail_cache.invalidate(pk)
+    return updated
+
+
+def remove_copy(pks):
+    """
+    Withdraw one shelved copy from each book in ``pks``; books with every
+    copy on loan or on hold, and books stocked per branch, are skipped.
+    """
+    with transaction.atomic():
+        updated = Book.objects.filter(pk__in=pks, available_copies__gt=0, branch_inventory__isnull=True).update(
+            total_copies=F('total_copies') - 1, available_copies=F('available_copies') - 1, updated_at=Now()
+        )
+        _publish(pks)
+    for pk in pks:
+        book_detail_cache.invalidate(pk)
+    return updated
@@ -0,0 +1,105 @@
+"""
+In-process cache of ``/api/books/<pk>/`` payloads.
+
+A handful of popular titles get most detail requests, so the serialized
+payload of the most recently requested books is kept in an LRU and only the
+volatile columns (``available_copies``, ``updated_at``) are re-read on a hit,
+with a primary-key lookup instead of the author/category join.
+
+Saving a book, author or category drops the affected entries (see
+``signals.py``); saves limited to the volatile columns do not. Code that
+changes ``total_copies`` with ``QuerySet.update()``, which sends no signal,
+invalidates the entry itself. Each worker
+process has its own cache and only sees its own saves, so
+``BOOK_DETAIL_CACHE['TTL_SECONDS']`` bounds how stale another worker's entry
+can get.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Book
+
+VOLATILE_FIELDS = frozenset({'available_copies', 'updated_at'})
+
+
+class BookDetailCache:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, pk, updated_at_field):
+        """
+        Return the payload for book ``pk`` with fresh volatile fields, or
+        ``None`` on a miss. ``updated_at_field`` renders ``updated_at``
+        the way the serializer does.
+        """
+        with self._lock:
+            entry = self._entries.get(pk)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[pk]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(pk)
+            self.hits += 1
+        payload = dict(entry[1])
+
+        volatile = Book.objects.filter(pk=pk).values_list('available_copies', 'updated_at').first()
+        if volatile is None:
+            self.invalidate(pk)
+            return None
+        payload['available_copies'] = volatile[0]
+        payload['updated_at'] = updated_at_field.to_representation(volatile[1])
+        return payload
+
+    def set(self, pk, payload):
+        with self._lock:
+            self._entries[pk] = (time.monotonic() + self.ttl, dict(payload))
+            self._entries.move_to_end(pk)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, pk):
+        with self._lock:
+            if self._entries.pop(pk, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_where(self, field, value):
+        """Drop every entry whose payload has ``field == value``."""
+        with self._lock:
+            stale = [pk for pk, (_, payload) in self._entries.items() if payload.get(field) == value]
+            for pk in stale:
+                del self._entries[pk]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+book_detail_cache = BookDetailCache(
+    settings.BOOK_DETAIL_CACHE['MAX_ENTRIES'], settings.BOOK_DETAIL_CACHE['TTL_SECONDS']
+)
@@ -0,0 +1,148 @@
+"""
+Read-only fast path for the hot list endpoints.
+
+A ``ModelSerializer`` instantiates a model per row and walks every field's
+``get_attribute``/``to_representation`` chain. The classes here mirror an
+existing serializer's output instead: the serializer's fields are inspected
+once and compiled into ``.values()`` lookups plus a per-field converter, so
+listing rows only builds plain dicts.
+
+The output must stay identical to the mirrored serializer; see
+``books/tests.py``.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from .models import Book
+from .serializers import AuthorSerializer, BookSerializer, BorrowSerializer
+
+# Fields whose to_representation() returns database values unchanged.
+PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ReadOnlyField,
+    PrimaryKeyRelatedField,
+)
+
+
+class ValuesSerializer:
+    """
+    Build the representation of ``serializer_class`` from ``.values()`` rows.
+
+    ``annotations`` maps field names to query expressions (for
+    ``SerializerMethodField`` counts), ``computed`` maps field names to
+    ``(lookups, function)`` pairs for model properties; ``function`` is
+    called with the raw row and the current time.
+    """
+    serializer_class = None
+    annotations = {}
+    computed = {}
+
+    _compiled = None
+
+    @classmethod
+    def compile(cls, names=None):
+        """
+        Return ``(lookups, annotations, mappers)`` for the given output field
+        names (all readable fields when ``names`` is None). Compiled once per
+        distinct selection.
+        """
+        if cls.__dict__.get('_compiled') is None:
+            cls._compiled = {}
+        key = None if names is None else tuple(names)
+        if key in cls._compiled:
+            return cls._compiled[key]
+
+        lookups, annotations, mappers = [], {}, []
+        for name, field in cls.serializer_class().fields.items():
+            if field.write_only or (names is not None and name not in names):
+                continue
+            if name in cls.computed:
+                needs, func = cls.computed[name]
+                lookups.extend(lookup for lookup in needs if lookup not in lookups)
+                mappers.append((name, None, func))
+                continue
+            if name in cls.annotations:
+                annotations[name] = cls.annotations[name]
+                mappers.append((name, name, None))
+                continue
+            lookup = field.source.replace('.', '__')
+            if lookup not in lookups:
+                lookups.append(lookup)
+            convert = None if isinstance(field, PASSTHROUGH_FIELDS) else field.to_representation
+            mappers.append((name, lookup, convert))
+
+        compiled = cls._compiled[key] = (tuple(lookups or ['pk']), annotations, tuple(mappers))
+        return compiled
+
+    @classmethod
+    def values(cls, queryset, names=None, extra=()):
+        """
+        Project ``queryset`` onto the lookups behind ``names``; joins only
+        happen for the related fields that were asked for. ``extra`` lookups
+        are selected as well (e.g. the ordering keys of a union).
+        """
+        lookups, annotations, _ = cls.compile(names)
+        queryset = queryset.values(*lookups, *(lookup for lookup in extra if lookup not in lookups))
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        return queryset
+
+    @classmethod
+    def to_representation(cls, rows, names=None):
+        _, _, mappers = cls.compile(names)
+        now = timezone.now()
+        data = []
+        for row in rows:
+            item = {}
+            for name, key, convert in mappers:
+                if key is None:
+                    item[name] = convert(row, now)
+                    continue
+                value = row[key]
+                if convert is not None and value is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+        return data
+
+
+def _count_books(field):
+    # A correlated subquery rather than JOIN + GROUP BY, so the paginator's
+    # COUNT(*) can drop it.
+    books = (
+        Book.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(count=Count('*')).values('count')
+    )
+    return Coalesce(Subquery(books, output_field=IntegerField()), 0)
+
+
+class AuthorValuesSerializer(ValuesSerializer):
+    serializer_class = AuthorSerializer
+    annotations = {'books_count': _count_books('author')}
+
+
+class BookValuesSerializer(ValuesSerializer):
+    serializer_class = BookSerializer
+
+
+def _is_overdue(row, now):
+    return row['return_date'] is None and now > row['due_date']
+
+
+def _days_overdue(row, now):
+    if not _is_overdue(row, now):
+        return 0
+    return (now - row['due_date']).days
+
+
+class BorrowValuesSerializer(ValuesSerializer):
+    serializer_class = BorrowSerializer
+    computed = {
+        'is_overdue': (('due_date', 'return_date'), _is_overdue),
+        'days_overdue': (('due_date', 'return_date'), _days_overdue),
+    }
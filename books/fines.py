@@ -0,0 +1,148 @@
+"""
+Fine policies: how many penalty points a late return costs.
+
+A return ``d`` full days late under a ``FinePolicy`` is charged for
+``d - grace_days`` days (never less than zero): ``points_per_day`` for the
+first ``escalate_after_days`` of them, ``escalated_points_per_day`` for the
+rest, and at most ``max_points`` in total. Each book's category picks the
+policy; the policy without a category covers the others, and ``DEFAULT``
+(1 point per day, no grace, no cap) applies when there is none.
+
+``return_book`` rates one borrow with ``points()``. ``rate()`` rates many at
+once for bulk returns and ``rerate()``: the lateness of each row is turned
+into whole days and run through its policy as NumPy arrays when NumPy is
+installed, in a plain loop otherwise (same results).
+
+After a policy change ``python manage.py rerate_penalties`` re-rates every
+late return in the history and appends the difference to what was charged
+to the penalty ledger, so totals stay the sum of the ledger.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Q, Sum
+
+from library_management.batching import keyset_batches
+
+from . import penalties
+from .archive import HISTORY_MODELS
+from .models import FinePolicy, PenaltyLedgerEntry
+
+DEFAULT = FinePolicy()
+
+# Database expression for how late a returned borrow came back.
+LATENESS = ExpressionWrapper(F('return_date') - F('due_date'), output_field=DurationField())
+
+
+def load():
+    """Return ``(default policy, {category_id: policy})``."""
+    policies = {policy.category_id: policy for policy in FinePolicy.objects.all()}
+    return policies.pop(None, DEFAULT), policies
+
+
+def policy_for(category_id):
+    """The policy for one category, in one query."""
+    policy = (
+        FinePolicy.objects.filter(Q(category_id=category_id) | Q(category__isnull=True))
+        .order_by(F('category_id').asc(nulls_last=True)).first()
+    )
+    return policy or DEFAULT
+
+
+def charge(days_late, policy):
+    """Points for a return ``days_late`` full days late under ``policy``."""
+    charged = max(days_late - policy.grace_days, 0)
+    normal = charged if policy.escalate_after_days is None else min(charged, policy.escalate_after_days)
+    points = normal * policy.points_per_day + (charged - normal) * policy.escalated_points_per_day
+    return points if policy.max_points is None else min(points, policy.max_points)
+
+
+def points(due_date, return_date, category_id):
+    """Points for a single return; only late returns cost a query."""
+    if return_date <= due_date:
+        return 0
+    return charge((return_date - due_date).days, policy_for(category_id))
+
+
+def _numpy():
+    """
+    NumPy, or ``None`` when it is not installed. Imported on first use rather
+    than with this module, which every worker loads via the views.
+    """
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover - optional dependency
+        return None
+    return numpy
+
+
+def _rate_numpy(np, lateness, category_ids, default, policies):
+    days = np.array(lateness, dtype='timedelta64[us]') // np.timedelta64(1, 'D')
+    keys, rows = np.unique(np.array([-1 if pk is None else pk for pk in category_ids]), return_inverse=True)
+    table = [policies.get(key, default) for key in keys.tolist()]
+
+    def column(name, missing=None):
+        return np.array([
+            missing if getattr(policy, name) is None else getattr(policy, name) for policy in table
+        ], dtype=np.int64)[rows]
+
+    unlimited = np.iinfo(np.int64).max
+    charged = np.maximum(days - column('grace_days'), 0)
+    normal = np.minimum(charged, column('escalate_after_days', unlimited))
+    points = normal * column('points_per_day') + (charged - normal) * column('escalated_points_per_day')
+    return np.minimum(points, column('max_points', unlimited)).tolist()
+
+
+def rate(lateness, category_ids, policies=None):
+    """
+    Points for many returns: ``lateness`` are ``return_date - due_date``
+    timedeltas (e.g. ``LATENESS`` annotations), ``category_ids`` the books'
+    categories. ``policies`` is a ``load()`` result to reuse across batches.
+    """
+    default, policies = policies or load()
+    lateness = [max(late, timedelta(0)) for late in lateness]
+    if not lateness:
+        return []
+    np = _numpy()
+    if np is not None:
+        return _rate_numpy(np, lateness, category_ids, default, policies)
+    return [
+        charge(late.days, policies.get(category_id, default))
+        for late, category_id in zip(lateness, category_ids)
+    ]
+
+
+def rerate(batch_size=1000, dry_run=False):
+    """
+    Re-rate every late return, live and archived, under the current
+    policies, in primary key batches with one ledger insert and one update
+    per user each. Returns ``(returns rated, returns adjusted, net points)``.
+    """
+    policies = load()
+    rated = adjusted = net = 0
+    for model in HISTORY_MODELS:
+        late = model.objects.filter(return_date__gt=F('due_date')).annotate(lateness=LATENESS)
+        for batch in keyset_batches(late, batch_size, fields=['user_id', 'lateness', 'book__category_id']):
+            charged = dict(
+                PenaltyLedgerEntry.objects
+                .filter(borrow_id__in=[row[0] for row in batch],
+                        reason__in=[PenaltyLedgerEntry.LATE_RETURN, PenaltyLedgerEntry.RERATE])
+                .values_list('borrow_id')
+                .annotate(total=Sum('points'))
+                .order_by()
+            )
+            owed = rate([row[2] for row in batch], [row[3] for row in batch], policies)
+            entries = [
+                PenaltyLedgerEntry(
+                    user_id=user_id, borrow_id=pk, points=points - charged.get(pk, 0),
+                    reason=PenaltyLedgerEntry.RERATE
+                )
+                for (pk, user_id, _, _), points in zip(batch, owed) if points != charged.get(pk, 0)
+            ]
+            if entries and not dry_run:
+                with transaction.atomic():
+                    penalties.add_penalties(entries)
+            rated += len(batch)
+            adjusted += len(entries)
+            net += sum(entry.points for entry in entries)
+    return rated, adjusted, net
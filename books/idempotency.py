@@ -0,0 +1,104 @@
+"""
+``Idempotency-Key`` support for borrow and return.
+
+A client that may retry (kiosks on flaky networks) sends a unique key with
+each logical request. The first request with a key claims it by inserting an
+``IdempotencyKey`` row in its own short transaction, runs the view, and
+stores the response on the row. A retry with the same key gets the stored
+response back without touching ``Book`` or ``Borrow``; a retry that arrives
+while the first request is still running gets 409, and the same key reused
+for a different request body gets 422. Keys are scoped per user and
+endpoint and expire after ``IDEMPOTENCY_KEY_TTL``
+(``python manage.py purge_idempotency_keys`` deletes expired rows).
+
+Server errors are not stored, so the client's retry runs the request again.
+A claim still without a response after ``IDEMPOTENCY_IN_FLIGHT_TIMEOUT`` was
+left by a worker killed mid-request and is claimed again by the next retry.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from library_management.openapi import OpenApiParameter
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+PARAMETER = OpenApiParameter(
+    HEADER, str, location=OpenApiParameter.HEADER,
+    description='Unique key per logical request; retries with the same key replay the first response'
+)
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _claim(request, endpoint, key):
+    """Return ``(record, created)``, replacing an expired or abandoned record for the key."""
+    request_hash = _request_hash(request)
+    now = timezone.now()
+    with transaction.atomic():
+        IdempotencyKey.objects.filter(
+            Q(created_at__lt=now - settings.IDEMPOTENCY_KEY_TTL)
+            | Q(status_code__isnull=True, created_at__lt=now - settings.IDEMPOTENCY_IN_FLIGHT_TIMEOUT),
+            user=request.user, endpoint=endpoint, key=key,
+        ).delete()
+        return IdempotencyKey.objects.get_or_create(
+            user=request.user, endpoint=endpoint, key=key, defaults={'request_hash': request_hash}
+        )
+
+
+def idempotent(view):
+    """Make a DRF function view honour the ``Idempotency-Key`` header; apply below ``@api_view``."""
+    endpoint = view.__name__
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({
+                'error': f'{HEADER} must be at most 255 characters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        record, created = _claim(request, endpoint, key)
+        if not created:
+            if record.request_hash != _request_hash(request):
+                return Response({
+                    'error': f'{HEADER} was already used for a different request'
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.status_code is None:
+                return Response({
+                    'error': f'A request with this {HEADER} is still being processed'
+                }, status=status.HTTP_409_CONFLICT)
+            response = Response(record.response, status=record.status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            # An update rather than save(): a retry may have reclaimed the
+            # row if this request outlived IDEMPOTENCY_IN_FLIGHT_TIMEOUT.
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code, response=response.data
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,174 @@
+"""
+Inventory consistency audit.
+
+Every book should satisfy
+
+    available_copies == total_copies - open borrows - ready holds
+
+since a copy held for the head of a reservation queue is neither on the shelf
+nor on loan. For books stocked per branch the same holds for every
+``BranchInventory`` row (counting the borrows lent from and the holds kept at
+that branch), and the book's counters must be the sums of its branch rows.
+Crashes between statements or manual edits can break it, so
+``audit()`` looks for offending books with one query over the catalogue
+(correlated counts per book, walked in primary key pages) and can repair them
+batch by batch under row locks.
+
+Incremental runs only check books whose ``updated_at`` is newer than the start
+of the last run that left no discrepancy behind.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest, Now
+from django.utils import timezone
+
+from library_management.batching import keyset_batches
+
+from .availability import publish_copies
+from .cache import book_detail_cache
+from .models import Book, Borrow, BranchInventory, InventoryAuditRun, Reservation
+
+# Rows saved just before a run started may commit after it, so incremental
+# runs look a little further back than the previous run's start.
+INCREMENTAL_OVERLAP = timedelta(minutes=5)
+
+DISCREPANCY_FIELDS = [
+    'title', 'total_copies', 'available_copies', 'open_borrows', 'ready_holds', 'expected', 'branch_total_copies',
+]
+
+
+def _count(model, **filters):
+    rows = (
+        model.objects.filter(book=OuterRef('pk'), **filters)
+        .order_by().values('book').annotate(count=Count('*')).values('count')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _branch_count(model, **filters):
+    """Like ``_count``, for the branch of a ``BranchInventory`` row."""
+    rows = (
+        model.objects.filter(book=OuterRef('book'), branch=OuterRef('branch'), **filters)
+        .order_by().values('book').annotate(count=Count('*')).values('count')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _expected(open_borrows, ready_holds):
+    return Greatest(F('total_copies') - open_borrows - ready_holds, 0)
+
+
+def _branch_expected():
+    """Expected ``available_copies`` of a ``BranchInventory`` row."""
+    return _expected(
+        _branch_count(Borrow, return_date__isnull=True), _branch_count(Reservation, status=Reservation.READY)
+    )
+
+
+def _branch_sum(field, rows=None):
+    """Sum of ``field`` over a book's branch rows; NULL for books not stocked per branch."""
+    rows = BranchInventory.objects.filter(book=OuterRef('pk')) if rows is None else rows
+    sums = rows.order_by().values('book').annotate(total=Sum(field)).values('total')
+    return Subquery(sums, output_field=IntegerField())
+
+
+def discrepancies(books=None):
+    """
+    ``books`` (default: all) whose ``available_copies`` is not the expected
+    count. For books stocked per branch that is the sum of what each branch
+    row should hold, and ``total_copies`` and every branch row are checked too.
+    """
+    books = Book.objects.all() if books is None else books
+    branch_rows = BranchInventory.objects.filter(book=OuterRef('pk')).annotate(expected=_branch_expected())
+    return (
+        books
+        .annotate(
+            open_borrows=_count(Borrow, return_date__isnull=True),
+            ready_holds=_count(Reservation, status=Reservation.READY),
+            branch_total_copies=_branch_sum('total_copies'),
+        )
+        .annotate(expected=Coalesce(
+            _branch_sum('expected', branch_rows), _expected(F('open_borrows'), F('ready_holds'))
+        ))
+        .filter(
+            ~Q(available_copies=F('expected'))
+            | ~Q(total_copies=Coalesce('branch_total_copies', 'total_copies'))
+            | Exists(branch_rows.exclude(available_copies=F('expected')))
+        )
+    )
+
+
+def repair(pks):
+    """
+    Recompute the counters of ``pks`` under lock: branch rows from their own
+    loans and holds, then the books from their branch rows, or from their
+    loans and holds when not stocked per branch. Returns the number fixed.
+    """
+    with transaction.atomic():
+        # Same lock order as branches.lock_book: branch rows, then books.
+        list(
+            BranchInventory.objects.select_for_update()
+            .filter(book_id__in=pks).order_by('pk').values_list('pk')
+        )
+        list(Book.objects.select_for_update().filter(pk__in=pks).order_by('pk').values_list('pk'))
+        # Re-check under the lock: a borrow may have committed since the audit read.
+        stale = list(discrepancies(Book.objects.filter(pk__in=pks)).values_list('pk', flat=True))
+        if not stale:
+            return 0
+        BranchInventory.objects.filter(book_id__in=stale).update(available_copies=_branch_expected())
+        Book.objects.filter(pk__in=stale).update(
+            total_copies=Coalesce(_branch_sum('total_copies'), F('total_copies')),
+            available_copies=Coalesce(
+                _branch_sum('available_copies'),
+                _expected(_count(Borrow, return_date__isnull=True), _count(Reservation, status=Reservation.READY)),
+            ),
+            updated_at=Now(),
+        )
+        for pk, copies in Book.objects.filter(pk__in=stale).values_list('pk', 'available_copies'):
+            publish_copies(pk, copies)
+    for pk in stale:
+        book_detail_cache.invalidate(pk)
+    return len(stale)
+
+
+def latest_run():
+    """The latest finished run, for reading results without scanning again."""
+    return InventoryAuditRun.objects.filter(finished_at__isnull=False).order_by('-started_at').first()
+
+
+def last_clean_run():
+    """The latest finished run that found nothing or repaired everything it found."""
+    return (
+        InventoryAuditRun.objects
+        .filter(finished_at__isnull=False, discrepancies=F('repaired'))
+        .order_by('-started_at')
+        .first()
+    )
+
+
+def audit(incremental=False, fix=False, batch_size=1000, report=None):
+    """
+    Check the catalogue (or, when ``incremental``, books touched since the
+    last clean run), calling ``report(row)`` for every discrepancy with a
+    dict of ``id`` and ``DISCREPANCY_FIELDS``. With ``fix`` each batch is
+    repaired before the next is read. Returns the recorded run.
+    """
+    books = Book.objects.all()
+    since = last_clean_run() if incremental else None
+    if since is not None:
+        books = books.filter(updated_at__gte=since.started_at - INCREMENTAL_OVERLAP)
+
+    run = InventoryAuditRun.objects.create(started_at=timezone.now(), incremental=since is not None)
+    run.books_checked = books.count()
+    for batch in keyset_batches(discrepancies(books), batch_size, fields=DISCREPANCY_FIELDS):
+        run.discrepancies += len(batch)
+        if report is not None:
+            for row in batch:
+                report(dict(zip(['id', *DISCREPANCY_FIELDS], row)))
+        if fix:
+            run.repaired += repair([row[0] for row in batch])
+    run.finished_at = timezone.now()
+    run.save()
+    return run
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from books.archive import archivable, archive_borrows
+
+
+class Command(BaseCommand):
+    help = 'Move borrows returned long ago from Borrow to the ArchivedBorrow table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.BORROW_ARCHIVE['AFTER_DAYS'],
+            help='Archive borrows returned more than this many days ago'
+        )
+        parser.add_argument('--batch-size', type=int, default=settings.BORROW_ARCHIVE['BATCH_SIZE'])
+        parser.add_argument('--dry-run', action='store_true', help='Only count the borrows that would move')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable(options['days']).count()
+            self.stdout.write(f'{count} borrow(s) returned more than {options["days"]} day(s) ago')
+            return
+        moved = archive_borrows(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} borrow(s)'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from books import inventory
+
+
+class Command(BaseCommand):
+    help = 'Check that available copies match total copies minus open borrows and ready holds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='Fix the discrepancies found')
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only check books updated since the last run that left no discrepancy'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def report(self, row):
+        line = (
+            f"#{row['id']} {row['title']}: available {row['available_copies']}, expected {row['expected']} "
+            f"(total {row['total_copies']}, on loan {row['open_borrows']}, on hold {row['ready_holds']})"
+        )
+        if row['branch_total_copies'] is not None:
+            line += f", branches own {row['branch_total_copies']}"
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        run = inventory.audit(
+            incremental=options['incremental'], fix=options['repair'],
+            batch_size=options['batch_size'], report=self.report,
+        )
+        scope = 'incremental' if run.incremental else 'full'
+        summary = f'Checked {run.books_checked} book(s) ({scope}): {run.discrepancies} discrepancies'
+        if options['repair']:
+            summary += f', {run.repaired} repaired'
+        style = self.style.SUCCESS if run.discrepancies == run.repaired else self.style.WARNING
+        self.stdout.write(style(summary))
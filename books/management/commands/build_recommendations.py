@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from books import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Update the "patrons who borrowed this also borrowed" neighbours from new borrows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild from the whole borrow history')
+        parser.add_argument('--top-k', type=int, help='Neighbours kept per book (default: RECOMMENDATIONS["TOP_K"])')
+        parser.add_argument(
+            '--chunk-size', type=int,
+            help='Users per co-occurrence chunk in full builds (default: RECOMMENDATIONS["USER_CHUNK"])'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='New borrows per incremental batch')
+
+    def handle(self, *args, **options):
+        run = recommendations.build(
+            full=options['full'], top_k=options['top_k'],
+            chunk_size=options['chunk_size'], batch_size=options['batch_size'],
+        )
+        engine = 'NumPy/SciPy' if recommendations.sparse is not None else 'pure Python'
+        kind = f'Full build ({engine})' if run.full else 'Incremental update'
+        self.stdout.write(self.style.SUCCESS(
+            f'{kind}: {run.books_updated} book(s) updated, up to borrow {run.last_borrow_id} '
+            f'in {(run.finished_at - run.started_at).total_seconds():.1f} s'
+        ))
@@ -1,12 +1,26 @@
-from django.core.management.base import BaseCommand
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
-from books.models import Author, Category, Book
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from books import fines, penalties
+from books.models import Author, Category, Book, Borrow, PenaltyLedgerEntry
+from library_management.batching import chunked
 
 User = get_user_model()
 
 class Command(BaseCommand):
     help = 'Create sample data for the library management system'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0, help='Also generate this many patrons')
+        parser.add_argument('--books', type=int, default=0, help='Also generate this many books')
+        parser.add_argument('--borrows', type=int, default=0, help='Also generate this many returned borrows')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
     def handle(self, *args, **options):
         self.stdout.write('Creating sample data...')
         
@@ -143,8 +157,88 @@ class Command(BaseCommand):
                 if created:
                     self.stdout.write(f'Created book: {book.title}')
         
+        if options['users'] or options['books'] or options['borrows']:
+            self.generate(options['users'], options['books'], options['borrows'], options['batch_size'])
+        
         self.stdout.write(self.style.SUCCESS('Sample data created successfully!'))
         self.stdout.write('You can now:')
         self.stdout.write('1. Login to admin panel: admin/admin123')
         self.stdout.write('2. Test API with user: user/user123')
         self.stdout.write('3. Start the server with: python manage.py runserver')
+    
+    def generate(self, users, books, borrows, batch_size):
+        """Bulk-insert generated rows in batches, never holding more than one batch."""
+        if users:
+            start = User.objects.count()
+            for batch in chunked(self.generate_users(start, users), batch_size):
+                User.objects.bulk_create(batch)
+            self.stdout.write(f'Generated {users} users')
+        
+        if books:
+            author_ids = list(Author.objects.values_list('id', flat=True))
+            category_ids = list(Category.objects.values_list('id', flat=True))
+            start = Book.objects.count()
+            for batch in chunked(self.generate_books(start, books, author_ids, category_ids), batch_size):
+                Book.objects.bulk_create(batch)
+            self.stdout.write(f'Generated {books} books')
+        
+        if borrows:
+            user_ids = list(User.objects.filter(is_staff=False).values_list('id', flat=True))
+            categories = dict(Book.objects.values_list('id', 'category_id'))
+            if not user_ids or not categories:
+                raise CommandError('Generating borrows needs at least one patron and one book')
+            policies = fines.load()
+            for batch in chunked(self.generate_borrows(borrows, user_ids, list(categories)), batch_size):
+                with transaction.atomic():
+                    created = Borrow.objects.bulk_create(batch)
+                    # borrow_date is auto_now_add, so it can only be backdated afterwards.
+                    Borrow.objects.filter(pk__in=[borrow.pk for borrow in created]).update(
+                        borrow_date=F('due_date') - timedelta(days=14)
+                    )
+                    self.charge_late_returns(created, categories, policies)
+            self.stdout.write(f'Generated {borrows} borrows; run backfill_circulation to update the analytics')
+    
+    def generate_users(self, start, count):
+        for i in range(start, start + count):
+            user = User(username=f'patron{i}', email=f'patron{i}@example.com')
+            user.set_unusable_password()
+            yield user
+    
+    def generate_books(self, start, count, author_ids, category_ids):
+        for i in range(start, start + count):
+            copies = random.randint(1, 5)
+            yield Book(
+                title=f'Sample Book {i}',
+                description='Generated sample book.',
+                author_id=random.choice(author_ids),
+                category_id=random.choice(category_ids),
+                total_copies=copies,
+                available_copies=copies,
+            )
+    
+    def generate_borrows(self, count, user_ids, book_ids):
+        now = timezone.now()
+        for _ in range(count):
+            due_date = now - timedelta(days=random.randint(0, 730), seconds=random.randint(0, 86399))
+            yield Borrow(
+                user_id=random.choice(user_ids),
+                book_id=random.choice(book_ids),
+                due_date=due_date,
+                # Mostly on time, sometimes up to three weeks late (but not in the future)
+                return_date=min(due_date - timedelta(days=random.randint(-21, 13)), now),
+            )
+    
+    def charge_late_returns(self, borrows, categories, policies):
+        """Charge late returns as return_book would, so rerate_penalties finds them paid."""
+        late = [borrow for borrow in borrows if borrow.return_date > borrow.due_date]
+        owed = fines.rate(
+            [borrow.return_date - borrow.due_date for borrow in late],
+            [categories[borrow.book_id] for borrow in late],
+            policies,
+        )
+        penalties.add_penalties([
+            PenaltyLedgerEntry(
+                user_id=borrow.user_id, borrow_id=borrow.pk, points=points, reason=PenaltyLedgerEntry.LATE_RETURN
+            )
+            for borrow, points in zip(late, owed) if points > 0
+        ])
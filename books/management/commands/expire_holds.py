@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from books import branches, reservations
+from books.models import Reservation
+
+
+class Command(BaseCommand):
+    help = 'Expire lapsed reservation holds and pass their copies to the next patron'
+
+    def handle(self, *args, **options):
+        book_ids = (
+            Reservation.objects
+            .filter(status=Reservation.READY, hold_expires_at__lte=timezone.now())
+            .values_list('book_id', flat=True)
+            .distinct()
+        )
+        expired = 0
+        for book_id in list(book_ids):
+            with transaction.atomic():
+                book = branches.lock_book(book_id)
+                expired += reservations.expire_holds(book)
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} hold(s)'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from books import penalties
+
+
+class Command(BaseCommand):
+    help = 'Recompute users\' penalty point totals from the penalty ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        corrected = penalties.rebuild_totals(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Corrected {corrected} penalty total(s)'))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books import outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending borrow and return events from the outbox to the configured publisher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Events per batch (default: OUTBOX["BATCH_SIZE"])')
+        parser.add_argument(
+            '--follow', action='store_true',
+            help='Keep running, polling for new events every --interval seconds'
+        )
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, **options):
+        publisher = outbox.get_publisher()
+        while True:
+            try:
+                delivered = outbox.relay(options['batch_size'], publisher)
+            except Exception as exc:
+                if not options['follow']:
+                    raise CommandError(f'Delivery failed; undelivered events stay in the outbox: {exc}')
+                self.stderr.write(f'Delivery failed, retrying in {options["interval"]} s: {exc}')
+                delivered = 0
+            if delivered or not options['follow']:
+                self.stdout.write(self.style.SUCCESS(f'Delivered {delivered} event(s)'))
+            if not options['follow']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from books import fines
+
+
+class Command(BaseCommand):
+    help = 'Re-rate late returns under the current fine policies and record the differences in the ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report the adjustments without writing them')
+
+    def handle(self, *args, **options):
+        rated, adjusted, net = fines.rerate(options['batch_size'], options['dry_run'])
+        verb = 'Would adjust' if options['dry_run'] else 'Adjusted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {adjusted} of {rated} late return(s), {net:+d} penalty point(s) in total'
+        ))
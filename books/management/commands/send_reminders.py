@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from books import reminders
+from books.models import ReminderLog
+
+
+class Command(BaseCommand):
+    help = 'Email users about borrows due soon and overdue borrows, once per borrow and kind'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='Remind about borrows due within this many days (default: REMINDERS["DUE_SOON_DAYS"])'
+        )
+        parser.add_argument(
+            '--only', choices=[kind for kind, _ in ReminderLog.KINDS],
+            help='Send only one kind of reminder'
+        )
+        parser.add_argument('--batch-size', type=int, help='Borrows per batch (default: REMINDERS["BATCH_SIZE"])')
+        parser.add_argument(
+            '--backend',
+            help=f'Email backend: {", ".join(reminders.BACKENDS)} or a dotted path '
+                 f'(default: REMINDERS["EMAIL_BACKEND"])'
+        )
+        parser.add_argument('--file-path', help='Directory for the file backend')
+
+    def handle(self, *args, **options):
+        backend_options = {'file_path': options['file_path']} if options['file_path'] else {}
+        kinds = [options['only']] if options['only'] else [kind for kind, _ in ReminderLog.KINDS]
+        for kind in kinds:
+            messages, borrows = reminders.send_reminders(
+                kind, days=options['days'], batch_size=options['batch_size'],
+                backend=options['backend'], **backend_options
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{dict(ReminderLog.KINDS)[kind]}: sent {messages} message(s) covering {borrows} borrow(s)'
+            ))
@@ -0,0 +1,104 @@
+import argparse
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from books import stress
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent borrows and returns at a few hot books from threads and processes, '
+        'then check the inventory invariants and report throughput and lock waits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=3, help='Hot books (default: 3)')
+        parser.add_argument('--copies', type=int, default=5, help='Copies of each book (default: 5)')
+        parser.add_argument('--users', type=int, default=20, help='Users sharing the books (default: 20)')
+        parser.add_argument('--branches', type=int, default=0, help='Stock the books over this many branches')
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes (default: 1)')
+        parser.add_argument('--threads', type=int, default=8, help='Threads per process (default: 8)')
+        parser.add_argument('--operations', type=int, default=100, help='Requests per thread (default: 100)')
+        parser.add_argument('--borrow-ratio', type=float, default=0.6, help='Share of borrows (default: 0.6)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Keep the fixture for inspection')
+        parser.add_argument('--output', help='Also write the summary as JSON to this file')
+        # Internal: run one worker process from a JSON spec on stdin.
+        parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            spec = json.load(sys.stdin)
+            result = stress.run_worker(**spec)
+            self.stdout.write(json.dumps(result))
+            return
+
+        fixture = stress.create_fixture(options['books'], options['copies'], options['users'], options['branches'])
+        try:
+            work = {
+                'threads': options['threads'], 'operations': options['operations'],
+                'borrow_ratio': options['borrow_ratio'],
+            }
+            if options['processes'] == 1:
+                result = stress.run_worker(fixture, seed=options['seed'], **work)
+            else:
+                result = stress.merge(self.run_processes(fixture, work, options))
+            summary = stress.summarize(result)
+            summary['violations'] = stress.check_invariants(fixture, result['outcomes'])
+        finally:
+            if not options['keep']:
+                stress.delete_fixture(fixture)
+
+        self.report(summary, options)
+        if summary['violations']:
+            raise CommandError(f"{len(summary['violations'])} invariant(s) violated")
+
+    def run_processes(self, fixture, work, options):
+        workers = []
+        for index in range(options['processes']):
+            process = subprocess.Popen(
+                [sys.executable, 'manage.py', 'stress_circulation', '--worker'],
+                cwd=settings.BASE_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            )
+            spec = {'fixture': fixture, 'seed': f"{options['seed']}-{index}", **work}
+            process.stdin.write(json.dumps(spec))
+            process.stdin.close()
+            workers.append(process)
+        results = []
+        for process in workers:
+            output = process.stdout.read()
+            if process.wait():
+                raise CommandError(f'Worker process exited with status {process.returncode}')
+            results.append(json.loads(output))
+        return results
+
+    def report(self, summary, options):
+        self.stdout.write(
+            f"{summary['vendor']}: {summary['requests']} requests from "
+            f"{options['processes']} process(es) x {options['threads']} thread(s) in "
+            f"{summary['duration_seconds']} s: {summary['throughput']} req/s"
+        )
+        self.stdout.write(
+            f"{'operation':<10} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+            f"{'max ms':>8} {'wait p50':>9} {'wait p90':>9} {'wait p99':>9} {'wait max':>9}"
+        )
+        for name, row in summary['operations'].items():
+            latency, wait = row['latency'], row['lock_wait']
+            self.stdout.write(
+                f"{name:<10} {row['requests']:>8} {row['throughput']:>8} {latency['p50_ms']:>8} "
+                f"{latency['p90_ms']:>8} {latency['p99_ms']:>8} {latency['max_ms']:>8} {wait['p50_ms']:>9} "
+                f"{wait['p90_ms']:>9} {wait['p99_ms']:>9} {wait['max_ms']:>9}"
+            )
+        self.stdout.write('Outcomes: ' + ', '.join(f'{name} {count}' for name, count in summary['outcomes'].items()))
+        for violation in summary['violations']:
+            self.stdout.write(self.style.ERROR(violation))
+        if not summary['violations']:
+            self.stdout.write(self.style.SUCCESS('All invariants hold'))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(summary, output, indent=2)
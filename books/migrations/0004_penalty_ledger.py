@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:37
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def open_ledgers(apps, schema_editor):
+    """
+    Carry existing penalty totals into the ledger. Each late return gets an
+    entry for what it was charged (a point per day late), so re-rating later
+    counts it as paid; the rest of a user's total (manual changes) becomes
+    their opening balance.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Borrow = apps.get_model('books', 'Borrow')
+    PenaltyLedgerEntry = apps.get_model('books', 'PenaltyLedgerEntry')
+
+    charged = defaultdict(int)
+    late = (
+        Borrow.objects.filter(return_date__gt=F('due_date'))
+        .values_list('pk', 'user_id', 'due_date', 'return_date')
+        .order_by('pk')
+    )
+    entries = []
+    for pk, user_id, due_date, return_date in late.iterator(chunk_size=2000):
+        points = (return_date - due_date).days
+        if points > 0:
+            charged[user_id] += points
+            entries.append(PenaltyLedgerEntry(user_id=user_id, borrow_id=pk, points=points, reason='late_return'))
+        if len(entries) == 2000:
+            PenaltyLedgerEntry.objects.bulk_create(entries, batch_size=500)
+            entries = []
+    PenaltyLedgerEntry.objects.bulk_create(entries, batch_size=500)
+
+    totals = dict(User.objects.exclude(penalty_points=0).values_list('id', 'penalty_points'))
+    PenaltyLedgerEntry.objects.bulk_create(
+        [
+            PenaltyLedgerEntry(user_id=user_id, points=points, reason='adjustment', note='Opening balance')
+            for user_id in sorted(totals.keys() | charged.keys())
+            if (points := totals.get(user_id, 0) - charged[user_id])
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_circulation_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PenaltyLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField()),
+                ('reason', models.CharField(choices=[('late_return', 'Late return'), ('adjustment', 'Manual adjustment')], max_length=20)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('borrow', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='penalty_entries', to='books.borrow')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='penalty_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'penalty ledger entries',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='books_penal_user_id_4ffabe_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_inventory_audit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'branches',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='borrow',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='borrows', to='books.branch'),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='holds', to='books.branch'),
+        ),
+        migrations.CreateModel(
+            name='BranchInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_copies', models.PositiveIntegerField(default=0)),
+                ('available_copies', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='branch_inventory', to='books.book')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='books.branch')),
+            ],
+            options={
+                'verbose_name_plural': 'branch inventory',
+                'ordering': ['branch__name'],
+                'constraints': [models.UniqueConstraint(fields=('book', 'branch'), name='unique_branch_inventory')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:09
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_borrow_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='penaltyledgerentry',
+            name='reason',
+            field=models.CharField(choices=[('late_return', 'Late return'), ('adjustment', 'Manual adjustment'), ('rerate', 'Fine policy re-rate')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='FinePolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grace_days', models.PositiveIntegerField(default=0, help_text='Days late that are not charged')),
+                ('points_per_day', models.PositiveIntegerField(default=1)),
+                ('escalate_after_days', models.PositiveIntegerField(blank=True, help_text='Charged days after which the escalated rate applies', null=True)),
+                ('escalated_points_per_day', models.PositiveIntegerField(default=2)),
+                ('max_points', models.PositiveIntegerField(blank=True, help_text='Cap per late return', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, help_text='Leave empty for the default policy', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='fine_policies', to='books.category')),
+            ],
+            options={
+                'verbose_name_plural': 'fine policies',
+                'constraints': [models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('category', 0), name='unique_fine_policy_per_category')],
+            },
+        ),
+    ]
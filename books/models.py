@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.functions import Coalesce, Upper
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
 from datetime import timedelta
 from django.utils import timezone
@@ -13,6 +15,10 @@ class Author(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Prefix lookups for suggestions (see suggest.search_database)
+            models.Index(Upper('name'), name='author_name_upper_idx'),
+        ]
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -24,6 +30,9 @@ class Category(models.Model):
     class Meta:
         ordering = ['name']
         verbose_name_plural = "Categories"
+        indexes = [
+            models.Index(Upper('name'), name='category_name_upper_idx'),
+        ]
 
 class Book(models.Model):
     title = models.CharField(max_length=300)
@@ -40,6 +49,11 @@ class Book(models.Model):
     
     class Meta:
         ordering = ['title']
+        indexes = [
+            # Incremental inventory audits look up recently touched books.
+            models.Index(fields=['updated_at']),
+            models.Index(Upper('title'), name='book_title_upper_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # Ensure available_copies doesn't exceed total_copies
@@ -47,9 +61,43 @@ class Book(models.Model):
             self.available_copies = self.total_copies
         super().save(*args, **kwargs)
 
+class Branch(models.Model):
+    name = models.CharField(max_length=200, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.name
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'branches'
+
+class BranchInventory(models.Model):
+    """
+    Copies of a book held by one branch. For books stocked this way,
+    ``Book.total_copies`` and ``Book.available_copies`` are the sums of
+    these rows, kept up to date on every change.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='branch_inventory')
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='inventory')
+    total_copies = models.PositiveIntegerField(default=0)
+    available_copies = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.book.title} at {self.branch.name}"
+    
+    class Meta:
+        ordering = ['branch__name']
+        verbose_name_plural = 'branch inventory'
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'branch'], name='unique_branch_inventory'),
+        ]
+
 class Borrow(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='borrows')
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='borrows')
+    # Where the copy came from; null for books not stocked per branch
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True, related_name='borrows')
     borrow_date = models.DateTimeField(auto_now_add=True)
     due_date = models.DateTimeField()
     return_date = models.DateTimeField(null=True, blank=True)
@@ -60,6 +108,10 @@ class Borrow(models.Model):
     
     class Meta:
         ordering = ['-borrow_date']
+        indexes = [
+            # Range scans over open borrows by due date (reminders, overdue lists)
+            models.Index(fields=['due_date'], name='borrow_open_due_idx', condition=models.Q(return_date__isnull=True)),
+        ]
     
     def save(self, *args, **kwargs):
         # Set due date to 14 days from borrow date if not set
@@ -78,13 +130,308 @@ class Borrow(models.Model):
         if not self.is_overdue:
             return 0
         return (timezone.now() - self.due_date).days
+
+class ArchivedBorrow(models.Model):
+    """
+    A returned borrow moved out of ``Borrow`` by ``archive_borrows``.
+    Keeps the original id, so ledger entries and events still refer to it.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_borrows')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='archived_borrows')
+    branch = models.ForeignKey(
+        Branch, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_borrows'
+    )
+    borrow_date = models.DateTimeField()
+    due_date = models.DateTimeField()
+    return_date = models.DateTimeField()
     
-    def calculate_penalty_on_return(self):
-        """Calculate penalty points if book is returned late"""
-        if not self.return_date:
-            return 0
-        
-        if self.return_date > self.due_date:
-            days_late = (self.return_date - self.due_date).days
-            return days_late  # 1 point per day late
-        return 0
+    def __str__(self):
+        return f"{self.user.username} borrowed {self.book.title} (archived)"
+    
+    class Meta:
+        ordering = ['-borrow_date']
+        indexes = [
+            models.Index(fields=['user', '-borrow_date'], name='archived_borrow_user_idx'),
+        ]
+
+class HoldQueue(models.Model):
+    """
+    Ticket counters of a book's reservation queue.
+
+    Waiting reservations hold the consecutive tickets ``head .. next_ticket - 1``,
+    so a patron's position is ``ticket - head + 1`` without counting rows.
+    ``reservations.cancel`` closes the gap a cancellation leaves; reservations
+    deleted outright (through the admin, or with their user) still leave one,
+    which ``reservations.promote_next`` skips when it advances ``head``.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='hold_queue')
+    head = models.PositiveIntegerField(default=1)
+    next_ticket = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"Queue for {self.book_id} (next ticket {self.next_ticket})"
+
+class Reservation(models.Model):
+    WAITING = 'waiting'
+    READY = 'ready'
+    FULFILLED = 'fulfilled'
+    CANCELLED = 'cancelled'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = [
+        (WAITING, 'Waiting'),
+        (READY, 'Ready for pickup'),
+        (FULFILLED, 'Fulfilled'),
+        (CANCELLED, 'Cancelled'),
+        (EXPIRED, 'Expired'),
+    ]
+    ACTIVE_STATUSES = (WAITING, READY)
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reservations')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='reservations')
+    # Branch holding the copy while the reservation is ready
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True, related_name='holds')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
+    ticket = models.PositiveIntegerField(null=True, blank=True)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.user.username} reserved {self.book.title} ({self.status})"
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['book', 'status', 'ticket']),
+            models.Index(fields=['status', 'hold_expires_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'book'],
+                condition=models.Q(status__in=['waiting', 'ready']),
+                name='unique_active_reservation',
+            ),
+        ]
+    
+    @property
+    def position(self):
+        """1-based place in the queue while waiting, otherwise ``None``."""
+        if self.status != self.WAITING:
+            return None
+        # Lists annotate the head (see reservations_view) instead of loading each queue.
+        head = getattr(self, 'queue_head', None)
+        if head is None:
+            head = self.book.hold_queue.head
+        return self.ticket - head + 1
+
+class DailyCirculation(models.Model):
+    """Per-day circulation counters, maintained by borrow_book/return_book."""
+    date = models.DateField()
+    borrows = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    late_returns = models.PositiveIntegerField(default=0)
+    penalty_points = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        abstract = True
+
+class DailyBookCirculation(DailyCirculation):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='daily_circulation')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'book'], name='unique_daily_book_circulation'),
+        ]
+
+class DailyCategoryCirculation(DailyCirculation):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_circulation')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_category_circulation'),
+        ]
+
+class DailyAuthorCirculation(DailyCirculation):
+    author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='daily_circulation')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'author'], name='unique_daily_author_circulation'),
+        ]
+
+class PenaltyLedgerEntry(models.Model):
+    """
+    Append-only record of every change to a user's penalty points.
+    ``User.penalty_points`` is the running total of these entries.
+    """
+    LATE_RETURN = 'late_return'
+    ADJUSTMENT = 'adjustment'
+    RERATE = 'rerate'
+    REASON_CHOICES = [
+        (LATE_RETURN, 'Late return'),
+        (ADJUSTMENT, 'Manual adjustment'),
+        (RERATE, 'Fine policy re-rate'),
+    ]
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='penalty_entries')
+    # No database constraint, so the entry keeps the borrow id if the borrow row is archived.
+    borrow = models.ForeignKey(
+        Borrow, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='penalty_entries'
+    )
+    points = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.points:+d} for {self.user.username} ({self.get_reason_display()})"
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'penalty ledger entries'
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+class FinePolicy(models.Model):
+    """
+    Penalty points for late returns of a category's books (see ``fines.py``).
+    The policy without a category covers all other books; with no policy at
+    all a late return costs 1 point per full day late.
+    """
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, null=True, blank=True, related_name='fine_policies',
+        help_text='Leave empty for the default policy'
+    )
+    grace_days = models.PositiveIntegerField(default=0, help_text='Days late that are not charged')
+    points_per_day = models.PositiveIntegerField(default=1)
+    escalate_after_days = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Charged days after which the escalated rate applies'
+    )
+    escalated_points_per_day = models.PositiveIntegerField(default=2)
+    max_points = models.PositiveIntegerField(null=True, blank=True, help_text='Cap per late return')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Fine policy for {self.category.name if self.category_id else 'other categories'}"
+    
+    class Meta:
+        verbose_name_plural = 'fine policies'
+        constraints = [
+            # One policy per category and one default (null category)
+            models.UniqueConstraint(Coalesce('category', 0), name='unique_fine_policy_per_category'),
+        ]
+
+class InventoryAuditRun(models.Model):
+    """One run of the inventory audit; incremental runs start from the last clean one."""
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    incremental = models.BooleanField(default=False)
+    books_checked = models.PositiveIntegerField(default=0)
+    discrepancies = models.PositiveIntegerField(default=0)
+    repaired = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Inventory audit {self.started_at:%Y-%m-%d %H:%M}: {self.discrepancies} discrepancies"
+    
+    class Meta:
+        ordering = ['-started_at']
+
+class OutboxEvent(models.Model):
+    """
+    A borrow or return event, written in the same transaction as the change
+    and delivered to downstream systems by ``relay_outbox``.
+    """
+    BORROWED = 'borrowed'
+    RETURNED = 'returned'
+    EVENT_TYPES = [
+        (BORROWED, 'Borrowed'),
+        (RETURNED, 'Returned'),
+    ]
+    
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.get_event_type_display()} event {self.pk}"
+
+class ReminderLog(models.Model):
+    """A due-date reminder already sent for a borrow; each kind is sent once."""
+    DUE_SOON = 'due_soon'
+    OVERDUE = 'overdue'
+    KINDS = [
+        (DUE_SOON, 'Due soon'),
+        (OVERDUE, 'Overdue'),
+    ]
+    
+    borrow = models.ForeignKey(Borrow, on_delete=models.CASCADE, related_name='reminders')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    sent_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} reminder for borrow {self.borrow_id}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['borrow', 'kind'], name='unique_reminder_per_kind'),
+        ]
+
+class IdempotencyKey(models.Model):
+    """
+    The first response to a borrow or return request sent with an
+    ``Idempotency-Key`` header, replayed to retries of the same request.
+    ``status_code`` is null while the first request is still running.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    endpoint = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(encoder=DjangoJSONEncoder, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.endpoint} {self.key}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'endpoint', 'key'], name='unique_idempotency_key'),
+        ]
+
+class BookNeighbour(models.Model):
+    """
+    One of a book's top co-borrowed books: ``co_borrows`` patrons borrowed
+    both. Maintained by ``build_recommendations``.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbours')
+    neighbour = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    co_borrows = models.PositiveIntegerField()
+    
+    def __str__(self):
+        return f"{self.book_id} -> {self.neighbour_id} ({self.co_borrows})"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'neighbour'], name='unique_book_neighbour'),
+        ]
+        indexes = [
+            # /api/books/<pk>/related/ reads one book's neighbours, best first
+            models.Index(fields=['book', '-co_borrows'], name='book_neighbour_rank_idx'),
+        ]
+
+class RecommendationRun(models.Model):
+    """One run of ``build_recommendations``; incremental runs start after ``last_borrow_id``."""
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    full = models.BooleanField(default=False)
+    last_borrow_id = models.PositiveBigIntegerField(default=0)
+    books_updated = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        kind = 'Full' if self.full else 'Incremental'
+        return f"{kind} recommendation build {self.started_at:%Y-%m-%d %H:%M}"
+    
+    class Meta:
+        ordering = ['-started_at']
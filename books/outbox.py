@@ -0,0 +1,110 @@
+"""
+Transactional outbox for circulation events.
+
+``borrow_book``, ``return_book`` and the admin bulk return write an
+``OutboxEvent`` row inside their own transaction, so an event exists if and
+only if the change committed, and the request never waits on the network.
+``python manage.py relay_outbox`` drains the table in id order: it reads a
+keyset batch, hands it to the publisher named by ``OUTBOX['PUBLISHER']``,
+and deletes exactly the rows it delivered with one statement.
+
+Delivery is at-least-once: a relay that dies between publishing and
+deleting sends the batch again next time, so consumers should deduplicate
+on the event ``id``. Ids are assigned at insert, not commit, so an event can
+become visible behind ones already relayed; it is picked up by the next
+run. Run a single relay at a time.
+"""
+import json
+import logging
+import urllib.request
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from library_management.batching import keyset_batches
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def _payload(borrow, **extra):
+    return {
+        'borrow_id': borrow.pk,
+        'user_id': borrow.user_id,
+        'book_id': borrow.book_id,
+        'branch_id': borrow.branch_id,
+        'borrow_date': borrow.borrow_date,
+        'due_date': borrow.due_date,
+        'return_date': borrow.return_date,
+        **extra,
+    }
+
+
+def borrowed(borrow):
+    OutboxEvent.objects.create(event_type=OutboxEvent.BORROWED, payload=_payload(borrow))
+
+
+def returned(borrow, penalty_points):
+    OutboxEvent.objects.create(
+        event_type=OutboxEvent.RETURNED, payload=_payload(borrow, penalty_points=penalty_points)
+    )
+
+
+def returned_many(returns):
+    """``returned`` for ``(borrow, penalty_points)`` pairs, in one insert."""
+    OutboxEvent.objects.bulk_create(
+        OutboxEvent(event_type=OutboxEvent.RETURNED, payload=_payload(borrow, penalty_points=points))
+        for borrow, points in returns
+    )
+
+
+class LogPublisher:
+    """Write events to the ``books.outbox`` logger; a stand-in until a real consumer exists."""
+
+    def publish(self, events):
+        for event in events:
+            logger.info('%s %s', event['type'], json.dumps(event, cls=DjangoJSONEncoder))
+
+
+class WebhookPublisher:
+    """POST each batch as a JSON array to ``OUTBOX['WEBHOOK_URL']``; any non-2xx reply is a failure."""
+
+    def __init__(self):
+        self.url = settings.OUTBOX['WEBHOOK_URL']
+        self.timeout = settings.OUTBOX.get('WEBHOOK_TIMEOUT', 10)
+
+    def publish(self, events):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(events, cls=DjangoJSONEncoder).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        # urlopen raises HTTPError for non-2xx responses.
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def get_publisher():
+    return import_string(settings.OUTBOX['PUBLISHER'])()
+
+
+def relay(batch_size=None, publisher=None):
+    """
+    Deliver pending events in id order, one batch at a time; returns how many
+    were delivered. A publisher error stops the relay and leaves the failed
+    batch in the table.
+    """
+    batch_size = batch_size or settings.OUTBOX['BATCH_SIZE']
+    publisher = publisher or get_publisher()
+    delivered = 0
+    for batch in keyset_batches(OutboxEvent.objects.all(), batch_size, fields=['event_type', 'payload', 'created_at']):
+        publisher.publish([
+            {'id': pk, 'type': event_type, 'created_at': created_at, 'payload': payload}
+            for pk, event_type, payload, created_at in batch
+        ])
+        OutboxEvent.objects.filter(pk__in=[row[0] for row in batch]).delete()
+        delivered += len(batch)
+    return delivered
@@ -0,0 +1,60 @@
+"""
+Penalty point bookkeeping.
+
+Every change is appended to ``PenaltyLedgerEntry`` and added to the
+materialized ``User.penalty_points`` total with a single ``F()`` update, so
+returns never lock or rewrite the whole user row.
+"""
+from collections import defaultdict
+
+from django.db.models import F, Sum
+
+from authentication.models import User
+from library_management.batching import keyset_batches
+
+from .models import PenaltyLedgerEntry
+
+
+def add_penalty(user_id, points, reason, borrow=None, note=''):
+    """Record ``points`` for the user and return their new total."""
+    PenaltyLedgerEntry.objects.create(
+        user_id=user_id, borrow=borrow, points=points, reason=reason, note=note
+    )
+    User.objects.filter(pk=user_id).update(penalty_points=F('penalty_points') + points)
+    return User.objects.filter(pk=user_id).values_list('penalty_points', flat=True).get()
+
+
+def add_penalties(entries):
+    """
+    Bulk version of ``add_penalty`` for ``PenaltyLedgerEntry`` instances:
+    one insert for the entries and one update per user.
+    """
+    PenaltyLedgerEntry.objects.bulk_create(entries)
+    totals = defaultdict(int)
+    for entry in entries:
+        totals[entry.user_id] += entry.points
+    for user_id, points in sorted(totals.items()):
+        User.objects.filter(pk=user_id).update(penalty_points=F('penalty_points') + points)
+
+
+def rebuild_totals(batch_size=1000):
+    """
+    Recompute ``User.penalty_points`` from the ledger, one batch of users at
+    a time; returns the number of users whose total was corrected.
+    """
+    corrected = 0
+    for batch in keyset_batches(User.objects.all(), batch_size, fields=('penalty_points',)):
+        totals = dict(
+            PenaltyLedgerEntry.objects
+            .filter(user_id__in=[pk for pk, _ in batch])
+            .values_list('user_id')
+            .annotate(total=Sum('points'))
+            .order_by()
+        )
+        stale = [
+            User(pk=pk, penalty_points=totals.get(pk, 0))
+            for pk, points in batch if points != totals.get(pk, 0)
+        ]
+        User.objects.bulk_update(stale, ['penalty_points'])
+        corrected += len(stale)
+    return corrected
@@ -0,0 +1,200 @@
+"""
+"Patrons who borrowed this also borrowed".
+
+Two books are related by the number of distinct patrons who borrowed both.
+Only each book's ``RECOMMENDATIONS['TOP_K']`` best neighbours are stored
+(``BookNeighbour``), so ``/api/books/<pk>/related/`` is one indexed read.
+
+A full build walks users in keyset chunks. With NumPy and SciPy installed
+each chunk becomes a sparse user x book incidence matrix ``B`` and
+``B.T @ B`` is added to the running book x book co-occurrence matrix, so
+memory depends on the chunk size and the number of co-borrowed pairs, not on
+the length of the borrow history. Without them the same counts are
+accumulated pair by pair in Python: identical results, only slower.
+Archived borrows count like live ones.
+
+Incremental builds read only borrows newer than the last run. A new borrow
+can only raise the counts of pairs it takes part in, so the exact count of
+each such pair is re-read from ``Borrow`` and offered to both books' top-K
+lists; nothing else can move. Counts that fall (deleted borrows) are
+corrected by the next full build.
+"""
+import heapq
+from collections import Counter, defaultdict
+from itertools import combinations, product
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from library_management.batching import chunked, keyset_batches, pk_batches
+
+from .archive import HISTORY_MODELS
+from .models import Book, BookNeighbour, Borrow, RecommendationRun
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - optional dependency
+    np = sparse = None
+
+
+def _rank(item):
+    neighbour, co_borrows = item
+    return (-co_borrows, neighbour)
+
+
+def _borrowed(model, **filters):
+    return model.objects.filter(**filters).values_list('user_id', 'book_id').order_by().distinct()
+
+
+def _user_chunks(last_borrow_id, chunk_size):
+    """Yield the distinct ``(user_id, book_id)`` pairs of each chunk of users."""
+    for user_ids in pk_batches(get_user_model().objects.all(), chunk_size):
+        pairs = set()
+        for model in HISTORY_MODELS:
+            pairs.update(_borrowed(model, user_id__in=user_ids, pk__lte=last_borrow_id))
+        if pairs:
+            yield list(pairs)
+
+
+def _top_neighbours_numpy(chunks, top_k):
+    size = (Book.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    co_borrows = sparse.csr_matrix((size, size), dtype=np.int64)
+    for pairs in chunks:
+        users, books = np.array(pairs, dtype=np.int64).T
+        _, rows = np.unique(users, return_inverse=True)
+        incidence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, books)), shape=(rows.max() + 1, size)
+        )
+        co_borrows = co_borrows + (incidence.T @ incidence).tocsr()
+    co_borrows.setdiag(0)
+    co_borrows.eliminate_zeros()
+
+    for book in np.flatnonzero(np.diff(co_borrows.indptr)):
+        start, end = co_borrows.indptr[book], co_borrows.indptr[book + 1]
+        neighbours, counts = co_borrows.indices[start:end], co_borrows.data[start:end]
+        if len(counts) > top_k:
+            # Keep everything tied with the K-th count, then break ties by id below.
+            threshold = np.partition(counts, len(counts) - top_k)[len(counts) - top_k]
+            keep = counts >= threshold
+            neighbours, counts = neighbours[keep], counts[keep]
+        items = sorted(zip(neighbours.tolist(), counts.tolist()), key=_rank)[:top_k]
+        yield int(book), items
+
+
+def _top_neighbours_python(chunks, top_k):
+    co_borrows = defaultdict(Counter)
+    for pairs in chunks:
+        by_user = defaultdict(list)
+        for user_id, book_id in pairs:
+            by_user[user_id].append(book_id)
+        for books in by_user.values():
+            for a, b in combinations(books, 2):
+                co_borrows[a][b] += 1
+                co_borrows[b][a] += 1
+    for book, counts in co_borrows.items():
+        yield book, heapq.nsmallest(top_k, counts.items(), key=_rank)
+
+
+def rebuild(last_borrow_id, top_k, chunk_size):
+    """Replace every book's neighbours with counts over borrows up to ``last_borrow_id``."""
+    top_neighbours = _top_neighbours_numpy if sparse is not None else _top_neighbours_python
+    rows = (
+        BookNeighbour(book_id=book, neighbour_id=neighbour, co_borrows=count)
+        for book, items in top_neighbours(_user_chunks(last_borrow_id, chunk_size), top_k)
+        for neighbour, count in items
+    )
+    books = set()
+    with transaction.atomic():
+        BookNeighbour.objects.all().delete()
+        for batch in chunked(rows, 1000):
+            BookNeighbour.objects.bulk_create(batch)
+            books.update(row.book_id for row in batch)
+    return len(books)
+
+
+def _pair_counts(pairs):
+    """Exact co-borrow counts of ``(a, b)`` pairs, one query per ``a`` and pair of tables."""
+    partners = defaultdict(set)
+    for a, b in pairs:
+        partners[a].add(b)
+    counts = {}
+    for a, bs in partners.items():
+        readers = defaultdict(set)
+        # A patron may have borrowed either book in the live or the archived table.
+        for model, a_model in product(HISTORY_MODELS, repeat=2):
+            a_readers = a_model.objects.filter(book_id=a).values('user_id')
+            for user_id, b in _borrowed(model, book_id__in=bs, user_id__in=a_readers):
+                readers[b].add(user_id)
+        for b, users in readers.items():
+            counts[a, b] = len(users)
+    return counts
+
+
+def _offer(counts, top_k):
+    """Merge new pair counts into both books' top-K lists; returns the books changed."""
+    offers = defaultdict(dict)
+    for (a, b), count in counts.items():
+        offers[a][b] = count
+        offers[b][a] = count
+    current = defaultdict(dict)
+    for book, neighbour, count in BookNeighbour.objects.filter(book_id__in=offers).values_list(
+        'book_id', 'neighbour_id', 'co_borrows'
+    ):
+        current[book][neighbour] = count
+
+    changed = {}
+    for book, offered in offers.items():
+        merged = {**current[book], **offered}
+        top = sorted(merged.items(), key=_rank)[:top_k]
+        if top != sorted(current[book].items(), key=_rank):
+            changed[book] = top
+    with transaction.atomic():
+        BookNeighbour.objects.filter(book_id__in=changed).delete()
+        BookNeighbour.objects.bulk_create(
+            BookNeighbour(book_id=book, neighbour_id=neighbour, co_borrows=count)
+            for book, top in changed.items() for neighbour, count in top
+        )
+    return set(changed)
+
+
+def update(since_borrow_id, top_k, batch_size):
+    """Fold borrows after ``since_borrow_id`` in; returns ``(last borrow id, books changed)``."""
+    last = since_borrow_id
+    changed = set()
+    for batch in keyset_batches(Borrow.objects.filter(pk__gt=since_borrow_id), batch_size, fields=['user_id', 'book_id']):
+        history = defaultdict(set)
+        user_ids = {user_id for _, user_id, _ in batch}
+        for model in HISTORY_MODELS:
+            for user_id, book_id in _borrowed(model, user_id__in=user_ids):
+                history[user_id].add(book_id)
+        pairs = {
+            (min(book_id, other), max(book_id, other))
+            for _, user_id, book_id in batch
+            for other in history[user_id] if other != book_id
+        }
+        changed |= _offer(_pair_counts(pairs), top_k)
+        last = batch[-1][0]
+    return last, len(changed)
+
+
+def build(full=False, top_k=None, chunk_size=None, batch_size=1000):
+    """
+    Update the neighbour table, from scratch when ``full`` or when there is
+    no previous run. Returns the recorded run.
+    """
+    top_k = top_k or settings.RECOMMENDATIONS['TOP_K']
+    chunk_size = chunk_size or settings.RECOMMENDATIONS['USER_CHUNK']
+    previous = RecommendationRun.objects.filter(finished_at__isnull=False).order_by('-started_at').first()
+    run = RecommendationRun.objects.create(started_at=timezone.now(), full=full or previous is None)
+    if run.full:
+        run.last_borrow_id = max(model.objects.aggregate(last=Max('pk'))['last'] or 0 for model in HISTORY_MODELS)
+        run.books_updated = rebuild(run.last_borrow_id, top_k, chunk_size)
+    else:
+        run.last_borrow_id, run.books_updated = update(previous.last_borrow_id, top_k, batch_size)
+    run.finished_at = timezone.now()
+    run.save()
+    return run
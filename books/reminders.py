@@ -0,0 +1,135 @@
+"""
+Due-date reminders and overdue notices.
+
+``send_reminders()`` walks open borrows due within ``days`` (or already
+overdue) in ``(due_date, id)`` keyset order, which the partial index on open
+borrows' ``due_date`` serves as a range scan, so only one batch is in memory
+however many borrows are open. Each batch is grouped per user: a user's
+other matching borrows are pulled in so they get one message listing all of
+them, and the borrows reminded are recorded in ``ReminderLog`` in the same
+transaction as the send so later batches and later runs skip them.
+
+Messages go through Django's email backends, so local runs can use the
+console or file backend and production SMTP or any third-party backend.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import fines
+from .models import Borrow, ReminderLog
+
+BACKENDS = {
+    'console': 'django.core.mail.backends.console.EmailBackend',
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+    'smtp': 'django.core.mail.backends.smtp.EmailBackend',
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+}
+
+SUBJECTS = {
+    ReminderLog.DUE_SOON: 'Library books due soon',
+    ReminderLog.OVERDUE: 'Overdue library books',
+}
+
+
+def pending(kind, now, days=None):
+    """Open borrows that need a ``kind`` reminder and haven't had one."""
+    borrows = Borrow.objects.filter(return_date__isnull=True)
+    if kind == ReminderLog.DUE_SOON:
+        borrows = borrows.filter(due_date__gte=now, due_date__lte=now + timedelta(days=days))
+    else:
+        borrows = borrows.filter(due_date__lt=now)
+    return borrows.filter(~Exists(ReminderLog.objects.filter(borrow=OuterRef('pk'), kind=kind)))
+
+
+def render(kind, user, borrows, now, policies=None):
+    """``policies`` is a ``fines.load()`` result, for the points an overdue book has run up."""
+    lines = [f'Hello {user.username},', '']
+    if kind == ReminderLog.DUE_SOON:
+        lines.append('The following books are due back soon:')
+    else:
+        default, by_category = policies or fines.load()
+        lines.append('The following books are overdue and collect penalty points until returned:')
+    lines.append('')
+    for borrow in borrows:
+        due = timezone.localtime(borrow.due_date)
+        if kind == ReminderLog.DUE_SOON:
+            lines.append(f'- {borrow.book.title}, due {due:%Y-%m-%d %H:%M}')
+        else:
+            days = (now - borrow.due_date).days
+            points = fines.charge(days, by_category.get(borrow.book.category_id, default))
+            lines.append(
+                f'- {borrow.book.title}, due {due:%Y-%m-%d}, {days} day(s) late, '
+                f'{points} penalty point(s) if returned today'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def _send_batch(kind, batch, borrows, now, connection, policies):
+    by_user = defaultdict(list)
+    for borrow in batch:
+        by_user[borrow.user_id].append(borrow)
+    # Pull in the same users' matching borrows from later batches.
+    seen = {borrow.pk for borrow in batch}
+    extra = borrows.filter(user_id__in=by_user).exclude(pk__in=seen).select_related('user', 'book')
+    for borrow in extra:
+        by_user[borrow.user_id].append(borrow)
+
+    messages = []
+    for user_borrows in by_user.values():
+        user = user_borrows[0].user
+        if not user.email:
+            continue
+        user_borrows.sort(key=lambda borrow: borrow.due_date)
+        messages.append(EmailMessage(
+            SUBJECTS[kind], render(kind, user, user_borrows, now, policies),
+            settings.REMINDERS['FROM_EMAIL'], [user.email],
+        ))
+    reminded = [borrow for user_borrows in by_user.values() for borrow in user_borrows]
+
+    with transaction.atomic():
+        # Recorded first but committed only if the send succeeds; users
+        # without an email address are recorded too so they aren't rescanned.
+        ReminderLog.objects.bulk_create(
+            [ReminderLog(borrow=borrow, kind=kind) for borrow in reminded], ignore_conflicts=True
+        )
+        if messages:
+            connection.send_messages(messages)
+    return len(messages), len(reminded)
+
+
+def send_reminders(kind, days=None, batch_size=None, backend=None, **backend_options):
+    """
+    Send ``kind`` reminders for every pending borrow; returns
+    ``(messages, borrows)`` counts.
+    """
+    now = timezone.now()
+    days = settings.REMINDERS['DUE_SOON_DAYS'] if days is None else days
+    batch_size = batch_size or settings.REMINDERS['BATCH_SIZE']
+    backend = BACKENDS.get(backend, backend) or settings.REMINDERS['EMAIL_BACKEND']
+    borrows = pending(kind, now, days)
+    ordered = borrows.select_related('user', 'book').order_by('due_date', 'pk')
+    policies = fines.load() if kind == ReminderLog.OVERDUE else None
+
+    sent = reminded = 0
+    last = None
+    with get_connection(backend, **backend_options) as connection:
+        while True:
+            page = ordered
+            if last is not None:
+                page = page.filter(Q(due_date__gt=last[0]) | Q(due_date=last[0], pk__gt=last[1]))
+            batch = list(page[:batch_size])
+            if not batch:
+                break
+            messages, borrow_count = _send_batch(kind, batch, borrows, now, connection, policies)
+            sent += messages
+            reminded += borrow_count
+            last = (batch[-1].due_date, batch[-1].pk)
+            if len(batch) < batch_size:
+                break
+    return sent, reminded
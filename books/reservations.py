@@ -0,0 +1,112 @@
+"""
+Reservation queue operations.
+
+Every function here must run inside ``transaction.atomic()`` with the
+``Book`` row already locked by the caller (``branches.lock_book``), which also
+serializes changes to the book's ``HoldQueue``.
+
+For books stocked per branch a copy belongs to a branch: a hold records the
+branch holding the copy, and a copy going back on the shelf goes back to it.
+"""
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import branches
+from .availability import publish_availability
+from .models import HoldQueue, Reservation
+
+
+def _queue(book):
+    queue, _ = HoldQueue.objects.get_or_create(book=book)
+    return queue
+
+
+def join_queue(user, book):
+    """Append ``user`` to ``book``'s queue and return the new reservation."""
+    queue = _queue(book)
+    reservation = Reservation.objects.create(user=user, book=book, ticket=queue.next_ticket)
+    queue.next_ticket += 1
+    queue.save(update_fields=['next_ticket'])
+    reservation.book.hold_queue = queue
+    return reservation
+
+
+def promote_next(book, branch_id=None):
+    """
+    Turn the head of the queue into a time-limited hold on a returned copy
+    (kept at ``branch_id`` for books stocked per branch).
+
+    Returns the promoted reservation, or ``None`` when nobody is waiting and
+    the copy should go back on the shelf.
+    """
+    queue = _queue(book)
+    reservation = (
+        Reservation.objects.filter(book=book, status=Reservation.WAITING, ticket__gte=queue.head)
+        .order_by('ticket').first()
+    )
+    if reservation is None:
+        if queue.head != queue.next_ticket:
+            queue.head = queue.next_ticket
+            queue.save(update_fields=['head'])
+        return None
+    queue.head = reservation.ticket + 1
+    queue.save(update_fields=['head'])
+    reservation.status = Reservation.READY
+    reservation.ticket = None
+    reservation.hold_expires_at = timezone.now() + settings.RESERVATION_HOLD_PERIOD
+    reservation.branch_id = branch_id
+    reservation.save(update_fields=['status', 'ticket', 'hold_expires_at', 'branch'])
+    return reservation
+
+
+def release_copy(book, branch_id=None):
+    """Give a held copy to the next patron, or put it back on the shelf."""
+    if promote_next(book, branch_id) is None:
+        if branch_id is not None:
+            branches.shelve_copies(book.pk, branch_id)
+        book.available_copies += 1
+        book.save(update_fields=['available_copies', 'updated_at'])
+        publish_availability(book)
+
+
+def cancel(reservation):
+    """Cancel a waiting or ready reservation, closing the gap it leaves."""
+    book = reservation.book
+    if reservation.status == Reservation.WAITING:
+        queue = _queue(book)
+        Reservation.objects.filter(
+            book=book, status=Reservation.WAITING, ticket__gt=reservation.ticket
+        ).update(ticket=F('ticket') - 1)
+        queue.next_ticket -= 1
+        queue.save(update_fields=['next_ticket'])
+        was_ready = False
+    else:
+        was_ready = reservation.status == Reservation.READY
+
+    reservation.status = Reservation.CANCELLED
+    reservation.ticket = None
+    reservation.save(update_fields=['status', 'ticket'])
+    if was_ready:
+        release_copy(book, reservation.branch_id)
+
+
+def expire_holds(book):
+    """Expire lapsed holds on ``book`` and pass their copies on."""
+    lapsed = list(
+        Reservation.objects.filter(
+            book=book, status=Reservation.READY, hold_expires_at__lte=timezone.now()
+        )
+    )
+    for reservation in lapsed:
+        reservation.status = Reservation.EXPIRED
+        reservation.save(update_fields=['status'])
+        release_copy(book, reservation.branch_id)
+    return len(lapsed)
+
+
+def ready_hold(user, book):
+    """Return ``user``'s unexpired hold on ``book``, if any."""
+    return Reservation.objects.filter(
+        user=user, book=book, status=Reservation.READY, hold_expires_at__gt=timezone.now()
+    ).first()
@@ -1,8 +1,65 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
-from drf_spectacular.utils import extend_schema_field
-from .models import Author, Category, Book, Borrow
+from library_management.openapi import extend_schema_field
+from .models import ArchivedBorrow, Author, Category, Book, Borrow, Branch, BranchInventory, InventoryAuditRun, Reservation
+
+def requested_fields(request, available):
+    """
+    Return the names in ``available`` selected by the ``?fields=`` and
+    ``?exclude=`` query parameters, in declaration order.
+    """
+    names = list(available)
+    fields = request.query_params.get('fields')
+    if fields:
+        wanted = {name.strip() for name in fields.split(',')}
+        names = [name for name in names if name in wanted]
+    exclude = request.query_params.get('exclude')
+    if exclude:
+        unwanted = {name.strip() for name in exclude.split(',')}
+        names = [name for name in names if name not in unwanted]
+    return names
+
+class SparseFieldsetMixin:
+    """
+    Let clients trim GET responses with ``?fields=id,title`` or
+    ``?exclude=description``, and fetch only what the remaining fields read.
+
+    ``Meta.field_dependencies`` lists the model fields behind properties.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None and request.method == 'GET':
+            keep = set(requested_fields(request, self.fields))
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
 
-class AuthorSerializer(serializers.ModelSerializer):
+    def project_queryset(self, queryset):
+        """Restrict ``queryset`` to the columns and joins the fields read."""
+        dependencies = getattr(self.Meta, 'field_dependencies', {})
+        columns = {self.Meta.model._meta.pk.name}
+        related = set()
+        for name, field in self.fields.items():
+            if name in dependencies:
+                columns.update(dependencies[name])
+                continue
+            if field.source == '*':
+                continue
+            parts = field.source.split('.')
+            for depth in range(1, len(parts)):
+                path = '__'.join(parts[:depth])
+                related.add(path)
+                columns.add(path)
+            columns.add('__'.join(parts))
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+class AuthorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     books_count = serializers.SerializerMethodField()
 
     class Meta:
@@ -24,7 +81,7 @@ class CategorySerializer(serializers.ModelSerializer):
     def get_books_count(self, obj) -> int:
         return obj.books.count()
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author_name = serializers.CharField(source='author.name', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
 
@@ -48,27 +105,55 @@ class BookSerializer(serializers.ModelSerializer):
             )
         return attrs
 
-class BorrowSerializer(serializers.ModelSerializer):
+class BranchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Branch
+        fields = ['id', 'name', 'created_at']
+        read_only_fields = ['created_at']
+
+class BranchInventorySerializer(serializers.ModelSerializer):
+    branch_name = serializers.CharField(source='branch.name', read_only=True)
+
+    class Meta:
+        model = BranchInventory
+        fields = ['branch', 'branch_name', 'total_copies', 'available_copies']
+        read_only_fields = fields
+
+def validate_branch(value):
+    if value is not None and not Branch.objects.filter(id=value).exists():
+        raise serializers.ValidationError("Branch not found")
+    return value
+
+class BorrowSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
     book_title = serializers.CharField(source='book.title', read_only=True)
     author_name = serializers.CharField(source='book.author.name', read_only=True)
+    branch_name = serializers.CharField(source='branch.name', read_only=True, allow_null=True)
     is_overdue = extend_schema_field(serializers.BooleanField)(serializers.ReadOnlyField())
     days_overdue = extend_schema_field(serializers.IntegerField)(serializers.ReadOnlyField())
 
     class Meta:
         model = Borrow
         fields = [
-            'id', 'user', 'user_username', 'book', 'book_title', 'author_name',
+            'id', 'user', 'user_username', 'book', 'book_title', 'author_name', 'branch', 'branch_name',
             'borrow_date', 'due_date', 'return_date', 'is_overdue', 'days_overdue'
         ]
-        read_only_fields = ['user', 'borrow_date', 'due_date']
+        read_only_fields = ['user', 'branch', 'borrow_date', 'due_date']
+        field_dependencies = {
+            'is_overdue': ['due_date', 'return_date'],
+            'days_overdue': ['due_date', 'return_date'],
+        }
 
 class BorrowCreateSerializer(serializers.ModelSerializer):
     book_id = serializers.IntegerField(write_only=True)
+    branch_id = serializers.IntegerField(
+        write_only=True, required=False, allow_null=True, validators=[validate_branch],
+        help_text='Preferred branch; another branch lends a copy if it has none left'
+    )
 
     class Meta:
         model = Borrow
-        fields = ['book_id']
+        fields = ['book_id', 'branch_id']
 
     def validate_book_id(self, value):
         try:
@@ -77,17 +162,30 @@ class BorrowCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Book not found")
         
         if book.available_copies <= 0:
-            raise serializers.ValidationError("No copies available for this book")
+            # Patrons whose reservation is ready borrow the copy held for them
+            request = self.context.get('request')
+            held = request and Reservation.objects.filter(
+                user=request.user, book=book, status=Reservation.READY
+            ).exists()
+            if not held:
+                raise serializers.ValidationError("No copies available for this book")
         
         return value
 
 class ReturnBookSerializer(serializers.Serializer):
     borrow_id = serializers.IntegerField()
+    branch_id = serializers.IntegerField(
+        required=False, allow_null=True, validators=[validate_branch],
+        help_text='Branch the copy is returned to (default: the branch that lent it)'
+    )
 
     def validate_borrow_id(self, value):
         try:
             borrow = Borrow.objects.get(id=value)
         except Borrow.DoesNotExist:
+            # Returned long ago and moved out by archive_borrows
+            if ArchivedBorrow.objects.filter(id=value).exists():
+                raise serializers.ValidationError("Book already returned")
             raise serializers.ValidationError("Borrow record not found")
         
         if borrow.return_date:
@@ -100,6 +198,113 @@ class ReturnBookSerializer(serializers.Serializer):
         
         return value
 
+class ReservationSerializer(serializers.ModelSerializer):
+    book_title = serializers.CharField(source='book.title', read_only=True)
+    position = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Reservation
+        fields = ['id', 'book', 'book_title', 'status', 'position', 'hold_expires_at', 'created_at']
+        read_only_fields = fields
+
+    @extend_schema_field(serializers.IntegerField(allow_null=True))
+    def get_position(self, obj):
+        return obj.position
+
+class ReservationCreateSerializer(serializers.Serializer):
+    book_id = serializers.IntegerField()
+
+class CirculationQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False, help_text='First day (default: 364 days before end)')
+    end = serializers.DateField(required=False, help_text='Last day (default: today)')
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=1000, default=20)
+
+    def validate(self, attrs):
+        end = attrs.setdefault('end', timezone.localdate())
+        start = attrs.setdefault('start', end - timedelta(days=364))
+        if start > end:
+            raise serializers.ValidationError("start must not be after end")
+        return attrs
+
+class CirculationReportSerializer(serializers.Serializer):
+    """Serializer for one row of a circulation report"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    borrows = serializers.IntegerField()
+    returns = serializers.IntegerField()
+    late_returns = serializers.IntegerField()
+    late_return_rate = serializers.FloatField()
+    penalty_points = serializers.IntegerField()
+
+class InventoryAuditQuerySerializer(serializers.Serializer):
+    """Serializer for inventory audit options"""
+    incremental = serializers.BooleanField(
+        default=False, help_text='Only check books updated since the last clean audit'
+    )
+    limit = serializers.IntegerField(
+        default=100, min_value=0, max_value=1000, help_text='Discrepancies to include in the response'
+    )
+    repair = serializers.BooleanField(default=False, help_text='Repair the discrepancies found')
+
+class InventoryDiscrepancySerializer(serializers.Serializer):
+    """Serializer for a book whose available copies don't add up"""
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    total_copies = serializers.IntegerField()
+    available_copies = serializers.IntegerField()
+    open_borrows = serializers.IntegerField()
+    ready_holds = serializers.IntegerField()
+    expected = serializers.IntegerField()
+    branch_total_copies = serializers.IntegerField(
+        allow_null=True, help_text='Sum of the branch rows, for books stocked per branch'
+    )
+
+class InventoryAuditRunSerializer(serializers.ModelSerializer):
+    """Serializer for a recorded inventory audit run"""
+
+    class Meta:
+        model = InventoryAuditRun
+        fields = [
+            'id', 'started_at', 'finished_at', 'incremental', 'books_checked',
+            'discrepancies', 'repaired'
+        ]
+
+class InventoryAuditSerializer(InventoryAuditRunSerializer):
+    """Serializer for an inventory audit run and the discrepancies it found"""
+    discrepancy_list = InventoryDiscrepancySerializer(many=True, read_only=True)
+
+    class Meta(InventoryAuditRunSerializer.Meta):
+        fields = InventoryAuditRunSerializer.Meta.fields + ['discrepancy_list']
+
+class BookCacheStatsSerializer(serializers.Serializer):
+    """Serializer for book detail cache statistics"""
+    entries = serializers.IntegerField()
+    max_entries = serializers.IntegerField()
+    ttl_seconds = serializers.IntegerField()
+    hits = serializers.IntegerField()
+    misses = serializers.IntegerField()
+    hit_ratio = serializers.FloatField()
+    evictions = serializers.IntegerField()
+    invalidations = serializers.IntegerField()
+
+class RelatedBookSerializer(serializers.Serializer):
+    """Serializer for a book co-borrowed with another"""
+    id = serializers.IntegerField(source='neighbour_id')
+    title = serializers.CharField()
+    author_name = serializers.CharField()
+    available_copies = serializers.IntegerField()
+    co_borrows = serializers.IntegerField(help_text='Patrons who borrowed both books')
+
+class SuggestQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100, trim_whitespace=True, help_text='What the user has typed so far')
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=20, default=10)
+
+class SuggestionSerializer(serializers.Serializer):
+    """Serializer for one typeahead suggestion"""
+    type = serializers.ChoiceField(choices=['book', 'author', 'category'])
+    id = serializers.IntegerField()
+    label = serializers.CharField()
+
 class BorrowResponseSerializer(serializers.Serializer):
     """Serializer for borrow book response"""
     message = serializers.CharField()
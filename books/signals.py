@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import VOLATILE_FIELDS, book_detail_cache
+from .models import Author, Book, Category
+from .suggest import suggest_index
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, update_fields=None, **kwargs):
+    # Borrows and returns only touch the volatile columns, which the
+    # cache re-reads on every hit anyway.
+    if update_fields is not None and set(update_fields) <= VOLATILE_FIELDS:
+        return
+    book_detail_cache.invalidate(instance.pk)
+    _index_on_commit('book', instance.pk, instance.title)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    book_detail_cache.invalidate(instance.pk)
+    _index_on_commit('book', instance.pk, None)
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, **kwargs):
+    book_detail_cache.invalidate_where('author', instance.pk)
+    _index_on_commit('author', instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, **kwargs):
+    book_detail_cache.invalidate_where('author', instance.pk)
+    _index_on_commit('author', instance.pk, None)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    book_detail_cache.invalidate_where('category', instance.pk)
+    _index_on_commit('category', instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    book_detail_cache.invalidate_where('category', instance.pk)
+    _index_on_commit('category', instance.pk, None)
+
+
+def _index_on_commit(kind, pk, label):
+    """Update the suggestion index once the change is committed (``None`` removes)."""
+    if label is None:
+        transaction.on_commit(lambda: suggest_index.remove(kind, pk))
+    else:
+        transaction.on_commit(lambda: suggest_index.update(kind, pk, label))
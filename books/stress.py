@@ -0,0 +1,263 @@
+"""
+Concurrency stress test for the borrow/return critical section.
+
+``python manage.py stress_circulation`` creates a throwaway fixture (a few
+hot books, a pool of users, optionally stocked per branch), then fires
+borrow and return calls at it from threads in one or more processes. The
+views are called through ``APIRequestFactory``: validation, idempotency,
+locking and the transaction run as in production, only HTTP is skipped.
+Afterwards ``check_invariants()`` verifies that
+
+* no book or branch has more copies available than it owns,
+* no user has more than 3 open borrows,
+* copies are conserved: totals are unchanged and every book's available
+  copies equal its total minus open borrows and ready holds (summed
+  correctly over its branches, when stocked per branch),
+
+and the fixture is deleted.
+
+Lock wait is the time a request spends in statements that take locks
+(``BEGIN IMMEDIATE`` on SQLite, ``SELECT ... FOR UPDATE`` and ``UPDATE``
+elsewhere), which is where it queues behind other transactions.
+"""
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.models import Count, Sum
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from library_management.loadtest import classify, is_lock_error, percentile
+
+from . import inventory
+from .models import Author, Book, Borrow, Branch, BranchInventory, Category, OutboxEvent
+from .views import borrow_book, return_book
+
+BORROW_LIMIT = 3
+
+
+class LockTimer:
+    """``connection.execute_wrapper`` that sums the time spent in locking statements."""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not (sql.startswith(('BEGIN', 'UPDATE')) or ' FOR UPDATE' in sql):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+def create_fixture(books=3, copies=5, users=20, branches=0):
+    """Create the hot books and users (and branches) under a unique prefix."""
+    User = get_user_model()
+    prefix = f'stress-{uuid.uuid4().hex[:8]}'
+    author = Author.objects.create(name=f'{prefix} author')
+    category = Category.objects.create(name=f'{prefix} category')
+    book_ids = [
+        book.pk for book in Book.objects.bulk_create(
+            Book(title=f'{prefix} book {n}', author=author, category=category,
+                 total_copies=copies, available_copies=copies)
+            for n in range(books)
+        )
+    ]
+    User.objects.bulk_create(
+        User(username=f'{prefix}-{n}', password=make_password(None)) for n in range(users)
+    )
+    user_ids = list(User.objects.filter(username__startswith=f'{prefix}-').values_list('pk', flat=True))
+
+    branch_ids = []
+    if branches:
+        branch_ids = [
+            branch.pk for branch in Branch.objects.bulk_create(
+                Branch(name=f'{prefix} branch {n}') for n in range(branches)
+            )
+        ]
+        BranchInventory.objects.bulk_create(
+            BranchInventory(book_id=book_id, branch_id=branch_id, total_copies=count, available_copies=count)
+            for book_id in book_ids
+            for index, branch_id in enumerate(branch_ids)
+            for count in [copies // branches + (index < copies % branches)]
+        )
+
+    return {
+        'prefix': prefix,
+        'author_id': author.pk,
+        'category_id': category.pk,
+        'book_ids': book_ids,
+        'user_ids': user_ids,
+        'branch_ids': branch_ids,
+        'total_copies': books * copies,
+    }
+
+
+def delete_fixture(fixture):
+    OutboxEvent.objects.filter(payload__book_id__in=fixture['book_ids']).delete()
+    get_user_model().objects.filter(pk__in=fixture['user_ids']).delete()
+    # Books and their rollups go with the author and category.
+    Author.objects.filter(pk=fixture['author_id']).delete()
+    Category.objects.filter(pk=fixture['category_id']).delete()
+    Branch.objects.filter(pk__in=fixture['branch_ids']).delete()
+
+
+def check_invariants(fixture, outcomes=None):
+    """Return a list of violated invariants (empty when all hold)."""
+    violations = []
+    books = Book.objects.filter(pk__in=fixture['book_ids'])
+
+    if outcomes and outcomes.get('integrity_error'):
+        violations.append(f"{outcomes['integrity_error']} request(s) hit a constraint (negative copies?)")
+    for pk, total, available in books.values_list('pk', 'total_copies', 'available_copies'):
+        if not 0 <= available <= total:
+            violations.append(f'book {pk}: {available} available of {total}')
+    total = books.aggregate(total=Sum('total_copies'))['total'] or 0
+    if total != fixture['total_copies']:
+        violations.append(f"copies not conserved: {total} owned, expected {fixture['total_copies']}")
+
+    over_limit = (
+        Borrow.objects.filter(user_id__in=fixture['user_ids'], return_date__isnull=True)
+        .values('user_id').annotate(open_borrows=Count('*')).filter(open_borrows__gt=BORROW_LIMIT)
+    )
+    for row in over_limit:
+        violations.append(f"user {row['user_id']}: {row['open_borrows']} open borrows")
+
+    for pk, available, expected in inventory.discrepancies(books).values_list('pk', 'available_copies', 'expected'):
+        violations.append(f'book {pk}: {available} available, {expected} expected from borrows and holds')
+
+    if fixture['branch_ids']:
+        sums = (
+            BranchInventory.objects.filter(book_id__in=fixture['book_ids'])
+            .values('book_id').annotate(total=Sum('total_copies'), available=Sum('available_copies'))
+        )
+        counters = {pk: (total, available) for pk, total, available in
+                    books.values_list('pk', 'total_copies', 'available_copies')}
+        for row in sums:
+            if (row['total'], row['available']) != counters[row['book_id']]:
+                violations.append(
+                    f"book {row['book_id']}: branches hold {row['available']}/{row['total']}, "
+                    f"book shows {counters[row['book_id']][1]}/{counters[row['book_id']][0]}"
+                )
+        for book_id, branch_id, total, available in BranchInventory.objects.filter(
+            book_id__in=fixture['book_ids']
+        ).values_list('book_id', 'branch_id', 'total_copies', 'available_copies'):
+            if available > total:
+                violations.append(f'book {book_id} at branch {branch_id}: {available} available of {total}')
+    return violations
+
+
+def run_worker(fixture, threads=8, operations=100, borrow_ratio=0.6, seed=0):
+    """
+    Run ``threads`` threads of ``operations`` requests each in this process.
+    Returns per-operation latency and lock-wait samples (seconds), outcome
+    counts and the wall-clock start and end.
+    """
+    users = get_user_model().objects.in_bulk(fixture['user_ids'])
+    factory = APIRequestFactory()
+    lock = threading.Lock()
+    result = {
+        'latency': defaultdict(list),
+        'lock_wait': defaultdict(list),
+        'outcomes': Counter(),
+    }
+
+    def request(rng, user):
+        if rng.random() >= borrow_ratio:
+            open_borrows = list(
+                Borrow.objects.filter(user=user, book_id__in=fixture['book_ids'], return_date__isnull=True)
+                .values_list('pk', flat=True)
+            )
+            if open_borrows:
+                return 'return', return_book, {'borrow_id': rng.choice(open_borrows)}
+        body = {'book_id': rng.choice(fixture['book_ids'])}
+        if fixture['branch_ids']:
+            body['branch_id'] = rng.choice(fixture['branch_ids'])
+        return 'borrow', borrow_book, body
+
+    def work(index):
+        rng = random.Random(f'{seed}:{index}')
+        try:
+            for _ in range(operations):
+                user = users[rng.choice(fixture['user_ids'])]
+                name, view, body = request(rng, user)
+                http_request = factory.post(f'/api/{name}/', body, format='json')
+                force_authenticate(http_request, user=user)
+                timer = LockTimer()
+                started = time.perf_counter()
+                try:
+                    with connection.execute_wrapper(timer):
+                        response = view(http_request)
+                    outcome = classify(response.status_code, response.data) or f'{name}_ok'
+                except IntegrityError:
+                    outcome = 'integrity_error'
+                except DatabaseError as exc:
+                    outcome = 'lock_error' if is_lock_error(str(exc).lower()) else 'database_error'
+                elapsed = time.perf_counter() - started
+                with lock:
+                    result['latency'][name].append(elapsed)
+                    result['lock_wait'][name].append(timer.seconds)
+                    result['outcomes'][outcome] += 1
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=work, args=(index,)) for index in range(threads)]
+    with override_settings(THROTTLE_ENABLED=False):
+        result['started'] = time.time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        result['finished'] = time.time()
+    return result
+
+
+def merge(results):
+    """Combine ``run_worker`` results from several processes."""
+    merged = {'latency': defaultdict(list), 'lock_wait': defaultdict(list), 'outcomes': Counter()}
+    for result in results:
+        for key in ('latency', 'lock_wait'):
+            for name, samples in result[key].items():
+                merged[key][name].extend(samples)
+        merged['outcomes'].update(result['outcomes'])
+    merged['started'] = min(result['started'] for result in results)
+    merged['finished'] = max(result['finished'] for result in results)
+    return merged
+
+
+def _distribution(samples):
+    samples = sorted(samples)
+    return {
+        **{f'p{int(fraction * 100)}_ms': round(percentile(samples, fraction) * 1000, 2)
+           for fraction in (0.5, 0.9, 0.99)},
+        'max_ms': round(samples[-1] * 1000, 2) if samples else 0.0,
+    }
+
+
+def summarize(result):
+    elapsed = max(result['finished'] - result['started'], 1e-9)
+    requests = sum(len(samples) for samples in result['latency'].values())
+    return {
+        'vendor': connection.vendor,
+        'duration_seconds': round(elapsed, 2),
+        'requests': requests,
+        'throughput': round(requests / elapsed, 2),
+        'outcomes': dict(Counter(result['outcomes']).most_common()),
+        'operations': {
+            name: {
+                'requests': len(samples),
+                'throughput': round(len(samples) / elapsed, 2),
+                'latency': _distribution(samples),
+                'lock_wait': _distribution(result['lock_wait'][name]),
+            }
+            for name, samples in sorted(result['latency'].items())
+        },
+    }
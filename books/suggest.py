@@ -0,0 +1,201 @@
+"""
+Typeahead suggestions over book titles and author and category names.
+
+The search box asks for suggestions on every keystroke, so they come from an
+in-process sorted list instead of the catalogue query. Every label is
+indexed under each of its word starts ("harry potter" is found by "har"
+and "pot"); a lookup is a binary search for the prefix followed by a short
+forward scan, with no database access.
+
+The index is loaded on first use in a background thread (queries fall back
+to the database meanwhile) and kept current by ``signals.py`` once each
+save commits. Saves made by other worker processes, ``bulk_create()`` and
+``QuerySet.update()`` send no signal here, so the whole index is rebuilt
+after ``BOOK_SUGGEST['TTL_SECONDS']``, again in the background while the
+old one keeps serving. Catalogues larger than ``BOOK_SUGGEST['MAX_ENTRIES']``
+labels are not loaded at all and always use the database fallback. It only
+finds labels that start with the query (a range scan over the ``UPPER(...)``
+indexes on the label columns), not matches at a later word ("pot" finds
+"Potions" but not "Harry Potter"): those need the in-memory index, since a
+substring search would scan every label on each keystroke.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.functions import Upper
+
+from .models import Author, Book, Category
+
+KINDS = ['book', 'author', 'category']
+
+# kind: (model, label field)
+SOURCES = {
+    'book': (Book, 'title'),
+    'author': (Author, 'name'),
+    'category': (Category, 'name'),
+}
+
+WORD_START = re.compile(r'\b\w')
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def _keys(label):
+    text = normalize(label)
+    return {text[match.start():] for match in WORD_START.finditer(text)}
+
+
+def _rank(prefix):
+    def key(item):
+        kind, _, label = item
+        # Labels that start with the query first, then books, authors, categories.
+        return (not normalize(label).startswith(prefix), KINDS.index(kind), label.casefold())
+    return key
+
+
+class SuggestIndex:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = []  # sorted (key, kind, id)
+        self._labels = {}   # (kind, id): label
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._loading = False
+        self._pending = None  # changes made while a rebuild is loading
+        self.too_large = False
+
+    # Maintenance
+
+    def _add(self, entries, labels, kind, pk, label):
+        labels[kind, pk] = label
+        for key in _keys(label):
+            insort(entries, (key, kind, pk))
+
+    def _remove(self, entries, labels, kind, pk):
+        label = labels.pop((kind, pk), None)
+        if label is None:
+            return
+        for key in _keys(label):
+            index = bisect_left(entries, (key, kind, pk))
+            if index < len(entries) and entries[index] == (key, kind, pk):
+                del entries[index]
+
+    def update(self, kind, pk, label):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((kind, pk, label))
+            if self._loaded_at is not None:
+                self._remove(self._entries, self._labels, kind, pk)
+                self._add(self._entries, self._labels, kind, pk, label)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((kind, pk, None))
+            if self._loaded_at is not None:
+                self._remove(self._entries, self._labels, kind, pk)
+
+    def load(self):
+        """Read every label from the database and swap the new index in."""
+        with self._lock:
+            self._pending = []
+        try:
+            count = sum(model.objects.count() for model, _ in SOURCES.values())
+            if count > self.max_entries:
+                with self._lock:
+                    self.too_large = True
+                    self._entries, self._labels, self._loaded_at = [], {}, time.monotonic()
+                return
+            entries, labels = [], {}
+            for kind, (model, field) in SOURCES.items():
+                for pk, label in model.objects.values_list('pk', field).iterator(chunk_size=2000):
+                    labels[kind, pk] = label
+                    entries.extend((key, kind, pk) for key in _keys(label))
+            entries.sort()
+            with self._lock:
+                for kind, pk, label in self._pending:
+                    self._remove(entries, labels, kind, pk)
+                    if label is not None:
+                        self._add(entries, labels, kind, pk, label)
+                self.too_large = False
+                self._entries, self._labels, self._loaded_at = entries, labels, time.monotonic()
+        finally:
+            with self._lock:
+                self._pending = None
+                self._loading = False
+            connection.close()
+
+    def _refresh(self):
+        """Start a background load when there is no index yet or it has expired."""
+        with self._lock:
+            fresh = self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+            if fresh or self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self.load, name='suggest-index-load', daemon=True).start()
+
+    # Queries
+
+    def search(self, query, limit=10):
+        """
+        Return up to ``limit`` ``(kind, id, label)`` matches for ``query``,
+        or ``None`` when the index can't answer and the caller should fall
+        back to the database.
+        """
+        self._refresh()
+        prefix = normalize(query)
+        with self._lock:
+            if self._loaded_at is None or self.too_large:
+                return None
+            found = {}
+            index = bisect_left(self._entries, (prefix,))
+            # Scan a few pages past the limit so the ranking has candidates.
+            while index < len(self._entries) and len(found) < limit * 5:
+                key, kind, pk = self._entries[index]
+                if not key.startswith(prefix):
+                    break
+                found[kind, pk] = self._labels[kind, pk]
+                index += 1
+        matches = [(kind, pk, label) for (kind, pk), label in found.items()]
+        return sorted(matches, key=_rank(prefix))[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._entries, self._labels, self._loaded_at = [], {}, None
+
+
+def search_database(query, limit=10):
+    """
+    Labels starting with ``query``, from a range scan over the ``UPPER(...)``
+    indexes. Matches at a later word of a label are left to the index.
+    """
+    upper = query.upper()
+    # Everything in [upper, upper-with-last-character-incremented) starts with it.
+    bound = upper[:-1] + chr(ord(upper[-1]) + 1)
+    matches = []
+    for kind, (model, field) in SOURCES.items():
+        rows = (
+            model.objects.alias(upper=Upper(field))
+            .filter(upper__gte=upper, upper__lt=bound, **{f'{field}__istartswith': query})
+            .order_by('upper')
+            .values_list('pk', field)[:limit]
+        )
+        matches.extend((kind, pk, label) for pk, label in rows)
+    return sorted(matches, key=_rank(normalize(query)))[:limit]
+
+
+def suggest(query, limit=10):
+    matches = suggest_index.search(query, limit)
+    if matches is None:
+        matches = search_database(query, limit)
+    return [{'type': kind, 'id': pk, 'label': label} for kind, pk, label in matches]
+
+
+suggest_index = SuggestIndex(settings.BOOK_SUGGEST['MAX_ENTRIES'], settings.BOOK_SUGGEST['TTL_SECONDS'])
@@ -1,3 +1,564 @@
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock, skipIf
+
+from django.conf import settings
+from django.apps import apps
+from django.core import mail
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from authentication.models import User
+from . import fines, inventory, outbox, recommendations, reminders, suggest
+from .fast_serializers import AuthorValuesSerializer, BookValuesSerializer, BorrowValuesSerializer
+from .models import (
+    Author, Category, Book, BookNeighbour, Borrow, Branch, BranchInventory, FinePolicy, IdempotencyKey,
+    OutboxEvent, PenaltyLedgerEntry, ReminderLog, Reservation,
+)
+from .serializers import AuthorSerializer, BookSerializer, BorrowSerializer, ReturnBookSerializer
+
+
+class ValuesSerializerEquivalenceTests(TestCase):
+    """The fast list path must render exactly what the ModelSerializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password123')
+        orwell = Author.objects.create(name='George Orwell', bio='English novelist')
+        Author.objects.create(name='Nobody Yet')
+        fiction = Category.objects.create(name='Fiction')
+        cls.books = [
+            Book.objects.create(
+                title='1984', description='Dystopia   line', author=orwell,
+                category=fiction, total_copies=3, available_copies=2,
+            ),
+            Book.objects.create(
+                title='Animal Farm', author=orwell, category=fiction,
+                total_copies=1, available_copies=0,
+            ),
+        ]
+        now = timezone.now()
+        Borrow.objects.create(user=cls.user, book=cls.books[0], due_date=now - timedelta(days=5, hours=12))
+        Borrow.objects.create(user=cls.user, book=cls.books[1], due_date=now + timedelta(days=3))
+
+    def assertSameOutput(self, expected, actual):
+        self.assertEqual(expected, actual)
+        self.assertEqual(JSONRenderer().render(expected), JSONRenderer().render(actual))
+
+    def test_books(self):
+        queryset = Book.objects.select_related('author', 'category')
+        self.assertSameOutput(
+            BookSerializer(queryset, many=True).data,
+            BookValuesSerializer.to_representation(BookValuesSerializer.values(queryset)),
+        )
+
+    def test_authors(self):
+        queryset = Author.objects.all()
+        self.assertSameOutput(
+            AuthorSerializer(queryset, many=True).data,
+            AuthorValuesSerializer.to_representation(AuthorValuesSerializer.values(queryset)),
+        )
+
+    def test_borrows(self):
+        queryset = Borrow.objects.filter(user=self.user, return_date__isnull=True)
+        self.assertSameOutput(
+            BorrowSerializer(queryset, many=True).data,
+            BorrowValuesSerializer.to_representation(BorrowValuesSerializer.values(queryset)),
+        )
+
+    def test_list_endpoints(self):
+        client = APIClient()
+        response = client.get('/api/books/')
+        self.assertEqual(
+            response.json()['results'],
+            BookSerializer(Book.objects.all(), many=True).data,
+        )
+
+        client.force_authenticate(self.user)
+        response = client.get('/api/my-borrows/')
+        self.assertEqual(
+            response.json(),
+            BorrowSerializer(Borrow.objects.filter(user=self.user), many=True).data,
+        )
+
+
+class SparseFieldsetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        category = Category.objects.create(name='Fiction')
+        cls.book = Book.objects.create(title='1984', author=author, category=category)
+
+    def test_fields_and_exclude(self):
+        client = APIClient()
+        response = client.get('/api/books/?fields=id,title,available_copies')
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': self.book.id, 'title': '1984', 'available_copies': 1}],
+        )
+
+        response = client.get(f'/api/books/{self.book.id}/?exclude=description,created_at,updated_at')
+        self.assertNotIn('description', response.json())
+        self.assertEqual(response.json()['author_name'], 'George Orwell')
+
+    def test_projection_skips_unneeded_joins(self):
+        request = Request(APIRequestFactory().get('/api/books/', {'fields': 'id,title'}))
+        serializer = BookSerializer(context={'request': request})
+        queryset = serializer.project_queryset(Book.objects.select_related('author', 'category'))
+        self.assertFalse(queryset.query.select_related)
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'title'}, False))
+
+
+class ReservationQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        category = Category.objects.create(name='Fiction')
+        cls.book = Book.objects.create(title='1984', author=author, category=category)
+        cls.users = [
+            User.objects.create_user(f'reader{i}', f'reader{i}@example.com', 'password123') for i in range(4)
+        ]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_cancel_closes_gap_and_promotion_skips_deleted_tickets(self):
+        borrower, first, second, third = self.users
+        response = self.client_for(borrower).post('/api/borrow/', {'book_id': self.book.id})
+        borrow_id = response.json()['id']
+        for user in (first, second, third):
+            self.client_for(user).post('/api/reservations/', {'book_id': self.book.id})
+
+        cancelled = Reservation.objects.get(user=second)
+        self.client_for(second).delete(f'/api/reservations/{cancelled.id}/')
+        client = self.client_for(third)
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get('/api/reservations/').json()[0]['position'], 2)
+
+        # A reservation deleted outright (admin, user deletion) leaves a gap.
+        Reservation.objects.get(user=first).delete()
+
+        response = self.client_for(borrower).post('/api/return/', {'borrow_id': borrow_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Reservation.objects.get(user=third).status, Reservation.READY)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+
+
+class IdempotencyKeyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        category = Category.objects.create(name='Fiction')
+        cls.book = Book.objects.create(title='1984', author=author, category=category, total_copies=3, available_copies=3)
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password123')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, path, data, key):
+        return self.client.post(path, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.post('/api/borrow/', {'book_id': self.book.id}, 'borrow-1')
+        retry = self.post('/api/borrow/', {'book_id': self.book.id}, 'borrow-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.json()), (201, first.json()))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Borrow.objects.filter(user=self.user).count(), 1)
+
+    def test_key_reused_for_another_body(self):
+        self.post('/api/borrow/', {'book_id': self.book.id}, 'borrow-1')
+        response = self.post('/api/borrow/', {'book_id': self.book.id + 1}, 'borrow-1')
+        self.assertEqual(response.status_code, 422)
+
+    def test_retry_while_running_and_after_worker_died(self):
+        borrow_id = self.post('/api/borrow/', {'book_id': self.book.id}, 'borrow-1').json()['id']
+        self.post('/api/return/', {'borrow_id': borrow_id}, 'return-1')
+        # As if the worker had been killed before storing the response.
+        pending = IdempotencyKey.objects.filter(key='return-1')
+        pending.update(status_code=None, response=None)
+        self.assertEqual(self.post('/api/return/', {'borrow_id': borrow_id}, 'return-1').status_code, 409)
+
+        pending.update(created_at=timezone.now() - settings.IDEMPOTENCY_IN_FLIGHT_TIMEOUT - timedelta(seconds=1))
+        response = self.post('/api/return/', {'borrow_id': borrow_id}, 'return-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'borrow_id': ['Book already returned']})
+
+
+class CirculationRaceTests(TestCase):
+    """Checks that must run under the row locks, with a concurrent request committing just before them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        category = Category.objects.create(name='Fiction')
+        cls.books = [
+            Book.objects.create(title=f'Book {n}', author=author, category=category, total_copies=2, available_copies=2)
+            for n in range(4)
+        ]
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password123')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_borrow_limit_counted_after_locking_user(self):
+        for book in self.books[:2]:
+            self.client.post('/api/borrow/', {'book_id': book.id})
+
+        def concurrent_borrow(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.startswith('SELECT "authentication_user"."id"') and not concurrent:
+                # Another borrow by the same user commits while this one waits for the user lock.
+                concurrent.append(Borrow.objects.create(
+                    user=self.user, book=self.books[2], due_date=timezone.now() + timedelta(days=14)
+                ))
+            return result
+
+        concurrent = []
+        with connection.execute_wrapper(concurrent_borrow):
+            response = self.client.post('/api/borrow/', {'book_id': self.books[3].id})
+        self.assertEqual(len(concurrent), 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Borrow.objects.filter(user=self.user, return_date__isnull=True).count(), 3)
+
+    def test_double_return_rechecked_under_lock(self):
+        borrow_id = self.client.post('/api/borrow/', {'book_id': self.books[0].id}).json()['id']
+        Borrow.objects.filter(pk=borrow_id).update(due_date=timezone.now() - timedelta(days=2))
+        self.assertEqual(self.client.post('/api/return/', {'borrow_id': borrow_id}).status_code, 200)
+
+        # The second return passed validation before the first one committed.
+        with mock.patch.object(ReturnBookSerializer, 'validate_borrow_id', lambda serializer, value: value):
+            response = self.client.post('/api/return/', {'borrow_id': borrow_id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Book already returned'})
+        self.books[0].refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(self.books[0].available_copies, 2)
+        self.assertEqual(self.user.penalty_points, 2)
+
+
+class SuggestFallbackTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='J.K. Rowling')
+        category = Category.objects.create(name='Fantasy')
+        for title in ['Harry Potter and the Chamber of Secrets', 'Potions Explained', 'Teapot Care']:
+            Book.objects.create(title=title, author=author, category=category)
+
+    def test_database_finds_the_label_starts_the_index_finds(self):
+        index = suggest.SuggestIndex(max_entries=1000, ttl=600)
+        # load() closes its connection for the background thread it normally runs in.
+        with mock.patch.object(suggest.connection, 'close'):
+            index.load()
+        for query in ['pot', 'Harry P', 'row', 'j.k', 'tea']:
+            with self.subTest(query=query):
+                expected = [match for match in index.search(query) if match[2].upper().startswith(query.upper())]
+                self.assertEqual(suggest.search_database(query), expected)
+        self.assertEqual([label for _, _, label in suggest.search_database('pot')], ['Potions Explained'])
+
+
+@skipIf(recommendations.sparse is None, 'NumPy and SciPy are not installed')
+class RecommendationBuildTests(TestCase):
+    """The NumPy/SciPy and pure-Python full builds must store the same neighbours."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        category = Category.objects.create(name='Fiction')
+        books = [Book.objects.create(title=f'Book {n}', author=author, category=category) for n in range(8)]
+        due = timezone.now() + timedelta(days=14)
+        for n in range(12):
+            user = User.objects.create_user(f'reader{n}', f'reader{n}@example.com', 'password123')
+            # Overlapping shelves with plenty of tied counts; the repeat borrow must count once.
+            for book in books[n % 3:n % 3 + 2 + n % 4] + books[n % 3:n % 3 + 1]:
+                Borrow.objects.create(user=user, book=book, due_date=due)
+
+    def neighbours(self):
+        recommendations.build(full=True, top_k=3, chunk_size=5)
+        return list(BookNeighbour.objects.order_by('book_id', '-co_borrows', 'neighbour_id')
+                    .values_list('book_id', 'neighbour_id', 'co_borrows'))
+
+    def test_same_neighbours(self):
+        expected = self.neighbours()
+        self.assertTrue(expected)
+        with mock.patch.object(recommendations, 'sparse', None):
+            self.assertEqual(self.neighbours(), expected)
+
+
+class FineRerateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        fiction = Category.objects.create(name='Fiction')
+        reference = Category.objects.create(name='Reference')
+        FinePolicy.objects.create(
+            category=fiction, grace_days=1, points_per_day=1, escalate_after_days=2,
+            escalated_points_per_day=3, max_points=6
+        )
+        cls.fiction = [
+            Book.objects.create(title=f'Novel {n}', author=author, category=fiction, total_copies=2, available_copies=2)
+            for n in range(3)
+        ]
+        cls.reference = Book.objects.create(title='Atlas', author=author, category=reference)
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password123')
+
+    def return_late(self, book, days):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        borrow_id = client.post('/api/borrow/', {'book_id': book.id}).json()['id']
+        Borrow.objects.filter(pk=borrow_id).update(due_date=timezone.now() - timedelta(days=days, hours=1))
+        client.post('/api/return/', {'borrow_id': borrow_id})
+
+    def test_rerate_with_unchanged_policies_changes_nothing(self):
+        # From before the ledger: a return 5 days late and 2 points added by hand (migration 0004).
+        now = timezone.now()
+        Borrow.objects.create(
+            user=self.user, book=self.reference, due_date=now - timedelta(days=10), return_date=now - timedelta(days=5)
+        )
+        User.objects.filter(pk=self.user.pk).update(penalty_points=7)
+        import_module('books.migrations.0004_penalty_ledger').open_ledgers(apps, None)
+        self.assertEqual(
+            sorted(PenaltyLedgerEntry.objects.values_list('reason', 'points')),
+            [(PenaltyLedgerEntry.ADJUSTMENT, 2), (PenaltyLedgerEntry.LATE_RETURN, 5)],
+        )
+        for book, days in zip(self.fiction, [1, 4, 9]):
+            self.return_late(book, days)
+        self.user.refresh_from_db()
+        # Within grace, escalated, capped
+        self.assertEqual(self.user.penalty_points, 7 + 0 + 5 + 6)
+
+        self.assertEqual(fines.rerate(batch_size=2), (4, 0, 0))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.penalty_points, 18)
+
+    @skipIf(fines._numpy() is None, 'NumPy is not installed')
+    def test_numpy_and_python_rates_agree(self):
+        lateness = [timedelta(days=days, hours=hours) for days in range(-2, 15) for hours in (0, 23)]
+        categories = [[self.fiction[0].category_id, self.reference.category_id, None][n % 3] for n in range(len(lateness))]
+        expected = fines.rate(lateness, categories)
+        with mock.patch.object(fines, '_numpy', return_value=None):
+            self.assertEqual(fines.rate(lateness, categories), expected)
+
+
+class InventoryAuditTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        category = Category.objects.create(name='Fiction')
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password123')
+        cls.single = Book.objects.create(title='1984', author=author, category=category, total_copies=3, available_copies=3)
+        cls.stocked = Book.objects.create(
+            title='Animal Farm', author=author, category=category, total_copies=3, available_copies=3
+        )
+        cls.north = BranchInventory.objects.create(
+            book=cls.stocked, branch=Branch.objects.create(name='North'), total_copies=2, available_copies=2
+        )
+        BranchInventory.objects.create(
+            book=cls.stocked, branch=Branch.objects.create(name='South'), total_copies=1, available_copies=1
+        )
+
+    def setUp(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for book in (self.single, self.stocked):
+            self.assertEqual(client.post('/api/borrow/', {'book_id': book.id}).status_code, 201)
+
+    def test_audit_reports_and_repairs_drift(self):
+        self.assertEqual(inventory.audit().discrepancies, 0)
+        # Book level: a lost decrement, and a total that is not the sum of the branches
+        Book.objects.filter(pk=self.single.pk).update(available_copies=3)
+        Book.objects.filter(pk=self.stocked.pk).update(total_copies=5)
+        # Branch level: a shelf count off while the book's own counter is right
+        BranchInventory.objects.filter(pk=self.north.pk).update(available_copies=0)
+
+        rows = []
+        run = inventory.audit(report=rows.append)
+        self.assertEqual((run.discrepancies, run.repaired), (2, 0))
+        reported = {row['id']: row for row in rows}
+        self.assertEqual(set(reported), {self.single.pk, self.stocked.pk})
+        self.assertEqual((reported[self.single.pk]['available_copies'], reported[self.single.pk]['expected']), (3, 2))
+        self.assertEqual((reported[self.stocked.pk]['total_copies'], reported[self.stocked.pk]['branch_total_copies']), (5, 3))
+
+        run = inventory.audit(fix=True)
+        self.assertEqual((run.discrepancies, run.repaired), (2, 2))
+        self.assertEqual(inventory.audit().discrepancies, 0)
+        self.single.refresh_from_db()
+        self.stocked.refresh_from_db()
+        self.north.refresh_from_db()
+        self.assertEqual(self.single.available_copies, 2)
+        self.assertEqual((self.stocked.total_copies, self.stocked.available_copies), (3, 2))
+        self.assertEqual(self.north.available_copies, 1)
+
+    def test_incremental_checks_books_updated_since_last_clean_run(self):
+        # No clean run yet: a full check.
+        self.assertFalse(inventory.audit(incremental=True).incremental)
+        Book.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        # Drift that leaves updated_at alone is only found by a full run...
+        Book.objects.filter(pk=self.stocked.pk).update(available_copies=0)
+        Book.objects.filter(pk=self.single.pk).update(available_copies=0, updated_at=timezone.now())
+
+        run = inventory.audit(incremental=True)
+        self.assertTrue(run.incremental)
+        self.assertEqual((run.books_checked, run.discrepancies), (1, 1))
+        # ...and the last clean run stays the baseline while discrepancies are left unrepaired.
+        self.assertEqual(inventory.audit(incremental=True).books_checked, 1)
+        run = inventory.audit()
+        self.assertEqual((run.books_checked, run.discrepancies), (2, 2))
+
+
+class BranchCirculationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        category = Category.objects.create(name='Fiction')
+        cls.book = Book.objects.create(title='1984', author=author, category=category, total_copies=3, available_copies=3)
+        cls.north = Branch.objects.create(name='North')
+        cls.south = Branch.objects.create(name='South')
+        BranchInventory.objects.create(book=cls.book, branch=cls.north, total_copies=1, available_copies=1)
+        BranchInventory.objects.create(book=cls.book, branch=cls.south, total_copies=2, available_copies=2)
+        cls.users = [User.objects.create_user(f'reader{n}', f'reader{n}@example.com', 'password123') for n in range(4)]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def borrow(self, user, branch):
+        response = self.client_for(user).post('/api/borrow/', {'book_id': self.book.id, 'branch_id': branch.id})
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def stock(self):
+        """``{branch name: (total, available)}``, after checking the book's counters are their sums."""
+        rows = {row.branch.name: (row.total_copies, row.available_copies) for row in self.book.branch_inventory.all()}
+        self.book.refresh_from_db()
+        self.assertEqual(
+            (self.book.total_copies, self.book.available_copies),
+            tuple(map(sum, zip(*rows.values()))),
+        )
+        return rows
+
+    def test_borrow_prefers_branch_then_falls_back(self):
+        self.assertEqual(self.borrow(self.users[0], self.north)['branch'], self.north.id)
+        self.assertEqual(self.borrow(self.users[1], self.north)['branch'], self.south.id)
+        self.assertEqual(self.stock(), {'North': (1, 0), 'South': (2, 1)})
+
+    def test_return_to_another_branch_moves_the_copy(self):
+        borrow = self.borrow(self.users[0], self.north)
+        response = self.client_for(self.users[0]).post(
+            '/api/return/', {'borrow_id': borrow['id'], 'branch_id': self.south.id}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), {'North': (0, 0), 'South': (3, 3)})
+
+    def test_ready_hold_stays_at_its_branch(self):
+        borrows = [self.borrow(user, self.north) for user in self.users[:3]]
+        self.assertEqual(borrows[0]['branch'], self.north.id)
+        waiting = self.users[3]
+        self.assertEqual(self.client_for(waiting).post('/api/reservations/', {'book_id': self.book.id}).status_code, 201)
+
+        self.client_for(self.users[0]).post('/api/return/', {'borrow_id': borrows[0]['id']})
+        hold = Reservation.objects.get(user=waiting)
+        self.assertEqual((hold.status, hold.branch_id), (Reservation.READY, self.north.id))
+        self.assertEqual(self.stock(), {'North': (1, 0), 'South': (2, 0)})
+
+        # Preferring another branch does not move the held copy.
+        self.assertEqual(self.borrow(waiting, self.south)['branch'], self.north.id)
+        self.assertEqual(self.stock(), {'North': (1, 0), 'South': (2, 0)})
+
+
+class OutboxRelayTests(TestCase):
+
+    class Publisher:
+        def __init__(self, fail_calls=()):
+            self.fail_calls = set(fail_calls)
+            self.calls = 0
+            self.delivered = []
+
+        def publish(self, events):
+            self.calls += 1
+            if self.calls in self.fail_calls:
+                raise OSError('consumer unavailable')
+            self.delivered.extend(events)
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        category = Category.objects.create(name='Fiction')
+        cls.book = Book.objects.create(title='1984', author=author, category=category, total_copies=3, available_copies=3)
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password123')
+
+    def setUp(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        borrow_id = client.post('/api/borrow/', {'book_id': self.book.id}).json()['id']
+        client.post('/api/return/', {'borrow_id': borrow_id})
+        client.post('/api/borrow/', {'book_id': self.book.id})
+        self.event_ids = list(OutboxEvent.objects.order_by('pk').values_list('pk', flat=True))
+        self.assertEqual(len(self.event_ids), 3)
+
+    def test_delivers_in_order_and_empties_the_outbox(self):
+        publisher = self.Publisher()
+        self.assertEqual(outbox.relay(batch_size=2, publisher=publisher), 3)
+        self.assertEqual([event['id'] for event in publisher.delivered], self.event_ids)
+        self.assertEqual(
+            [event['type'] for event in publisher.delivered],
+            [OutboxEvent.BORROWED, OutboxEvent.RETURNED, OutboxEvent.BORROWED],
+        )
+        self.assertEqual(publisher.delivered[1]['payload']['penalty_points'], 0)
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(outbox.relay(publisher=publisher), 0)
+
+    def test_failed_batch_stays_for_the_next_run(self):
+        publisher = self.Publisher(fail_calls=[2])
+        with self.assertRaises(OSError):
+            outbox.relay(batch_size=2, publisher=publisher)
+        # The first batch was delivered and deleted, the failed one is kept.
+        self.assertEqual([event['id'] for event in publisher.delivered], self.event_ids[:2])
+        self.assertEqual(list(OutboxEvent.objects.values_list('pk', flat=True)), self.event_ids[2:])
+
+        self.assertEqual(outbox.relay(batch_size=2, publisher=publisher), 1)
+        self.assertEqual([event['id'] for event in publisher.delivered], self.event_ids)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class ReminderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        category = Category.objects.create(name='Fiction')
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password123')
+        now = timezone.now()
+        for n, due in enumerate([timedelta(days=1), timedelta(days=2, hours=-1), timedelta(days=-3)]):
+            book = Book.objects.create(title=f'Book {n}', author=author, category=category, total_copies=1, available_copies=0)
+            Borrow.objects.create(user=cls.user, book=book, due_date=now + due)
+
+    def test_each_reminder_is_sent_once(self):
+        # Batches of one: the user's second due borrow is pulled into the first message.
+        self.assertEqual(reminders.send_reminders(ReminderLog.DUE_SOON, days=2, batch_size=1, backend='locmem'), (1, 2))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Book 0', mail.outbox[0].body)
+        self.assertIn('Book 1', mail.outbox[0].body)
 
-# Create your tests here.
+        self.assertEqual(reminders.send_reminders(ReminderLog.DUE_SOON, days=2, backend='locmem'), (0, 0))
+        self.assertEqual(reminders.send_reminders(ReminderLog.OVERDUE, backend='locmem'), (1, 1))
+        self.assertEqual(reminders.send_reminders(ReminderLog.OVERDUE, backend='locmem'), (0, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(ReminderLog.objects.count(), 3)
@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
+from .models import DailyAuthorCirculation, DailyBookCirculation, DailyCategoryCirculation
 
 urlpatterns = [
     # Authors
@@ -13,9 +14,33 @@ urlpatterns = [
     # Books
     path('books/', views.BookListCreateView.as_view(), name='book-list-create'),
     path('books/<int:pk>/', views.BookDetailView.as_view(), name='book-detail'),
+    path('books/availability/stream/', views.availability_stream, name='book-availability-stream'),
+    path('books/cache/stats/', views.book_cache_stats, name='book-cache-stats'),
+    path('books/suggest/', views.suggest_books, name='book-suggest'),
+    path('books/<int:pk>/related/', views.related_books, name='book-related'),
+    path('books/<int:pk>/branches/', views.BookBranchInventoryView.as_view(), name='book-branch-inventory'),
+    
+    # Branches
+    path('branches/', views.BranchListCreateView.as_view(), name='branch-list-create'),
     
     # Borrowing
     path('borrow/', views.borrow_book, name='borrow-book'),
     path('my-borrows/', views.list_user_borrows, name='list-user-borrows'),
+    path('my-borrows/history/', views.BorrowHistoryView.as_view(), name='borrow-history'),
     path('return/', views.return_book, name='return-book'),
+    
+    # Reservations
+    path('reservations/', views.reservations_view, name='reservations'),
+    path('reservations/<int:pk>/', views.cancel_reservation, name='cancel-reservation'),
+    
+    # Inventory
+    path('inventory/audit/', views.InventoryAuditView.as_view(), name='inventory-audit'),
+    
+    # Analytics
+    path('analytics/books/', views.CirculationReportView.as_view(
+        model=DailyBookCirculation, dimension='book'), name='analytics-books'),
+    path('analytics/categories/', views.CirculationReportView.as_view(
+        model=DailyCategoryCirculation, dimension='category'), name='analytics-categories'),
+    path('analytics/authors/', views.CirculationReportView.as_view(
+        model=DailyAuthorCirculation, dimension='author'), name='analytics-authors'),
 ]
@@ -1,19 +1,38 @@
+import asyncio
+import json
+
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
 from django.db import transaction
+from django.db.models import F
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from drf_spectacular.utils import extend_schema, OpenApiResponse
+from library_management.openapi import extend_schema, extend_schema_view, OpenApiParameter, OpenApiResponse
 
-from .models import Author, Category, Book, Borrow
+from . import analytics, archive, branches, fines, inventory, outbox, penalties, reservations
+from .models import (
+    Author, Category, Book, BookNeighbour, Borrow, Branch, BranchInventory, PenaltyLedgerEntry, Reservation
+)
 from .serializers import (
     AuthorSerializer, CategorySerializer, BookSerializer, BorrowSerializer,
     BorrowCreateSerializer, ReturnBookSerializer, ReturnBookResponseSerializer,
-    ErrorResponseSerializer
+    ReservationSerializer, ReservationCreateSerializer, CirculationQuerySerializer,
+    CirculationReportSerializer, BookCacheStatsSerializer, InventoryAuditQuerySerializer,
+    InventoryAuditRunSerializer, InventoryAuditSerializer, BranchSerializer, BranchInventorySerializer, RelatedBookSerializer, SuggestQuerySerializer,
+    SuggestionSerializer, ErrorResponseSerializer
 )
+from .availability import get_broker, publish_availability
+from .cache import book_detail_cache
+from .suggest import suggest
+from .idempotency import PARAMETER as IDEMPOTENCY_KEY_PARAMETER, idempotent
+from .fast_serializers import AuthorValuesSerializer, BookValuesSerializer, BorrowValuesSerializer
 from authentication.models import User
+from library_management.throttling import BorrowThrottle, ReturnThrottle
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """Custom permission to only allow admins to edit objects."""
@@ -22,22 +41,55 @@ class IsAdminOrReadOnly(permissions.BasePermission):
             return True
         return request.user.is_staff
 
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter('fields', str, description='Comma-separated fields to include'),
+    OpenApiParameter('exclude', str, description='Comma-separated fields to leave out'),
+]
+
+class ValuesListMixin:
+    """Serve list requests from ``.values()`` rows instead of model instances."""
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.values_serializer_class
+        names = list(self.get_serializer().fields)
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()), names)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page, names))
+        return Response(serializer.to_representation(queryset, names))
+
+class ProjectedRetrieveMixin:
+    """Fetch only the columns and joins the requested detail fields need."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == 'GET':
+            queryset = self.get_serializer().project_queryset(queryset)
+        return queryset
+
 # Author Views
 @extend_schema(tags=['Authors'])
-class AuthorListCreateView(generics.ListCreateAPIView):
+@extend_schema_view(get=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS))
+class AuthorListCreateView(ValuesListMixin, generics.ListCreateAPIView):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
+    values_serializer_class = AuthorValuesSerializer
     permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = 'catalogue'
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['name']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
 
 @extend_schema(tags=['Authors'])
-class AuthorDetailView(generics.RetrieveUpdateDestroyAPIView):
+@extend_schema_view(get=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS))
+class AuthorDetailView(ProjectedRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = 'catalogue'
 
 # Category Views
 @extend_schema(tags=['Categories'])
@@ -45,6 +97,7 @@ class CategoryListCreateView(generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = 'catalogue'
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['name']
     ordering_fields = ['name', 'created_at']
@@ -55,13 +108,17 @@ class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = 'catalogue'
 
 # Book Views
 @extend_schema(tags=['Books'])
-class BookListCreateView(generics.ListCreateAPIView):
+@extend_schema_view(get=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS))
+class BookListCreateView(ValuesListMixin, generics.ListCreateAPIView):
     queryset = Book.objects.select_related('author', 'category').all()
     serializer_class = BookSerializer
+    values_serializer_class = BookValuesSerializer
     permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = 'catalogue'
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['author', 'category']
     search_fields = ['title', 'author__name', 'category__name']
@@ -69,59 +126,194 @@ class BookListCreateView(generics.ListCreateAPIView):
     ordering = ['title']
 
 @extend_schema(tags=['Books'])
-class BookDetailView(generics.RetrieveUpdateDestroyAPIView):
+@extend_schema_view(get=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS))
+class BookDetailView(ProjectedRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Book.objects.select_related('author', 'category').all()
     serializer_class = BookSerializer
     permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = 'catalogue'
+
+    def retrieve(self, request, *args, **kwargs):
+        # Sparse fieldset requests are cheap already and bypass the cache.
+        if 'fields' in request.query_params or 'exclude' in request.query_params:
+            return super().retrieve(request, *args, **kwargs)
+        
+        serializer = self.get_serializer()
+        payload = book_detail_cache.get(self.kwargs['pk'], serializer.fields['updated_at'])
+        if payload is not None:
+            return Response(payload)
+        response = super().retrieve(request, *args, **kwargs)
+        book_detail_cache.set(self.kwargs['pk'], response.data)
+        return response
+
+@extend_schema(
+    operation_id='book_detail_cache_stats',
+    summary='Book detail cache statistics',
+    description='Hit ratio, evictions and invalidations of the book detail cache in the worker process '
+                'that serves the request.',
+    responses={200: BookCacheStatsSerializer},
+    tags=['Books']
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def book_cache_stats(request):
+    return Response(book_detail_cache.stats())
+
+@extend_schema(
+    operation_id='suggest_books',
+    summary='Typeahead suggestions',
+    description='Up to `limit` book titles, author names and category names with a word starting with `q`, '
+                'for a search box that asks on every keystroke. Served from an in-memory index.',
+    parameters=[SuggestQuerySerializer],
+    responses={200: SuggestionSerializer(many=True)},
+    tags=['Books']
+)
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def suggest_books(request):
+    query = SuggestQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    return Response(suggest(query.validated_data['q'], query.validated_data['limit']))
+
+@extend_schema(
+    operation_id='related_books',
+    summary='Patrons who borrowed this also borrowed',
+    description='Books most often borrowed by patrons who borrowed this one, best first. '
+                'Updated offline by `manage.py build_recommendations`; empty until it has run.',
+    responses={200: RelatedBookSerializer(many=True)},
+    tags=['Books']
+)
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def related_books(request, pk):
+    related = (
+        BookNeighbour.objects.filter(book_id=pk)
+        .order_by('-co_borrows', 'neighbour_id')
+        .values(
+            'neighbour_id',
+            'co_borrows',
+            title=F('neighbour__title'),
+            author_name=F('neighbour__author__name'),
+            available_copies=F('neighbour__available_copies'),
+        )
+    )
+    return Response(RelatedBookSerializer(related, many=True).data)
+
+# Branch Views
+@extend_schema(tags=['Branches'])
+class BranchListCreateView(generics.ListCreateAPIView):
+    queryset = Branch.objects.all()
+    serializer_class = BranchSerializer
+    permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = 'catalogue'
+
+@extend_schema(tags=['Branches'])
+@extend_schema_view(get=extend_schema(
+    operation_id='list_book_branch_inventory',
+    summary='Copies of a book per branch',
+    description='Total and available copies of a book at each branch that stocks it. '
+                'Empty for books that are not stocked per branch.'
+))
+class BookBranchInventoryView(generics.ListAPIView):
+    serializer_class = BranchInventorySerializer
+    permission_classes = [permissions.AllowAny]
+    throttle_scope = 'catalogue'
+    pagination_class = None
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return BranchInventory.objects.none()
+        return BranchInventory.objects.filter(book_id=self.kwargs['pk']).select_related('branch')
 
 # Borrowing Views
 @extend_schema(
     operation_id='borrow_book',
     summary='Borrow a book',
-    description='Borrow a book from the library. Users can have maximum 3 active borrows.',
+    description='Borrow a book from the library. Users can have maximum 3 active borrows. '
+                'Send an Idempotency-Key header to make retries safe.',
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
     request=BorrowCreateSerializer,
     responses={
         201: BorrowSerializer,
         400: ErrorResponseSerializer,
-        404: ErrorResponseSerializer
+        404: ErrorResponseSerializer,
+        409: ErrorResponseSerializer,
+        422: ErrorResponseSerializer
     },
     tags=['Borrowing']
 )
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@throttle_classes([BorrowThrottle])
+@idempotent
 def borrow_book(request):
-    serializer = BorrowCreateSerializer(data=request.data)
+    serializer = BorrowCreateSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
         book_id = serializer.validated_data['book_id']
         user = request.user
-        
-        # Check user's current active borrows (max 3)
-        active_borrows = Borrow.objects.filter(user=user, return_date__isnull=True).count()
-        if active_borrows >= 3:
-            return Response({
-                'error': 'You have reached the maximum borrowing limit (3 books)'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        preferred_branch_id = serializer.validated_data.get('branch_id')
         
         try:
             with transaction.atomic():
-                book = Book.objects.select_for_update().get(id=book_id)
+                # Lock the user first so concurrent borrows can't both pass the limit check
+                list(User.objects.select_for_update().filter(id=user.id).values_list('id'))
                 
-                # Double-check availability
-                if book.available_copies <= 0:
+                # Check user's current active borrows (max 3)
+                active_borrows = Borrow.objects.filter(user=user, return_date__isnull=True).count()
+                if active_borrows >= 3:
                     return Response({
-                        'error': 'No copies available for this book'
+                        'error': 'You have reached the maximum borrowing limit (3 books)'
                     }, status=status.HTTP_400_BAD_REQUEST)
                 
+                branch_id = None
+                if reservations.ready_hold(user, book_id) is None and branches.is_stocked(book_id):
+                    # Stocked per branch: take a copy from a branch row without locking the book
+                    branch_id = branches.take_copy(book_id, preferred_branch_id)
+                
+                if branch_id is not None:
+                    book = Book.objects.get(id=book_id)
+                    hold = None
+                else:
+                    book = branches.lock_book(book_id)
+                    reservations.expire_holds(book)
+                    
+                    # A ready reservation means a copy is already set aside for this user
+                    hold = reservations.ready_hold(user, book)
+                    
+                    # Double-check availability
+                    if hold is None and book.available_copies <= 0:
+                        return Response({
+                            'error': 'No copies available for this book'
+                        }, status=status.HTTP_400_BAD_REQUEST)
+                    
+                    if hold is not None:
+                        branch_id = hold.branch_id
+                    else:
+                        branch_id = branches.take_copy(book.pk, preferred_branch_id)
+                        if branch_id is None:
+                            # Update available copies
+                            book.available_copies -= 1
+                            book.save(update_fields=['available_copies', 'updated_at'])
+                
                 # Create borrow record
                 borrow = Borrow.objects.create(
                     user=user,
                     book=book,
+                    branch_id=branch_id,
                     due_date=timezone.now() + timezone.timedelta(days=14)
                 )
+                analytics.record_borrow(borrow)
+                outbox.borrowed(borrow)
                 
-                # Update available copies
-                book.available_copies -= 1
-                book.save()
+                if hold is not None:
+                    hold.status = Reservation.FULFILLED
+                    hold.save(update_fields=['status'])
+                else:
+                    if branch_id is not None:
+                        # Last statement, so the Book row lock is held only until the commit
+                        branches.lend_copy(book.pk)
+                        book.refresh_from_db(fields=['available_copies'])
+                    publish_availability(book)
                 
                 return Response(
                     BorrowSerializer(borrow).data,
@@ -139,6 +331,7 @@ def borrow_book(request):
     operation_id='list_user_borrows',
     summary='List user active borrows',
     description='Get all active borrows for the authenticated user.',
+    parameters=SPARSE_FIELDSET_PARAMETERS,
     responses={
         200: BorrowSerializer(many=True),
     },
@@ -150,25 +343,51 @@ def list_user_borrows(request):
     borrows = Borrow.objects.filter(
         user=request.user,
         return_date__isnull=True
-    ).select_related('book', 'book__author')
+    )
     
-    serializer = BorrowSerializer(borrows, many=True)
-    return Response(serializer.data)
+    names = list(BorrowSerializer(context={'request': request}).fields)
+    rows = BorrowValuesSerializer.values(borrows, names)
+    return Response(BorrowValuesSerializer.to_representation(rows, names))
+
+@extend_schema(tags=['Borrowing'])
+@extend_schema_view(get=extend_schema(
+    operation_id='list_borrow_history',
+    summary='List user borrow history',
+    description='All borrows of the authenticated user, open and returned, newest first. '
+                'Includes borrows moved to the archive by `manage.py archive_borrows`.',
+    parameters=SPARSE_FIELDSET_PARAMETERS
+))
+class BorrowHistoryView(generics.ListAPIView):
+    # Only for schema generation: list() reads live and archived borrows through archive.history().
+    queryset = Borrow.objects.none()
+    serializer_class = BorrowSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        names = list(self.get_serializer().fields)
+        page = self.paginate_queryset(archive.history(request.user, names))
+        return self.get_paginated_response(BorrowValuesSerializer.to_representation(page, names))
 
 @extend_schema(
     operation_id='return_book',
     summary='Return a borrowed book',
-    description='Return a previously borrowed book. Penalty points may be added for late returns.',
+    description='Return a previously borrowed book. Penalty points may be added for late returns. '
+                'Send an Idempotency-Key header to make retries safe.',
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
     request=ReturnBookSerializer,
     responses={
         200: ReturnBookResponseSerializer,
         400: ErrorResponseSerializer,
-        404: ErrorResponseSerializer
+        404: ErrorResponseSerializer,
+        409: ErrorResponseSerializer,
+        422: ErrorResponseSerializer
     },
     tags=['Borrowing']
 )
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@throttle_classes([ReturnThrottle])
+@idempotent
 def return_book(request):
     serializer = ReturnBookSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
@@ -176,29 +395,49 @@ def return_book(request):
         
         try:
             with transaction.atomic():
-                borrow = Borrow.objects.select_for_update().get(id=borrow_id)
-                book = Book.objects.select_for_update().get(id=borrow.book.id)
-                user = User.objects.select_for_update().get(id=borrow.user.id)
+                borrow = (
+                    Borrow.objects.select_for_update(of=('self',)).select_related('book').get(id=borrow_id)
+                )
+                # A concurrent return of the same borrow may have committed since validation
+                if borrow.return_date:
+                    return Response({
+                        'error': 'Book already returned'
+                    }, status=status.HTTP_400_BAD_REQUEST)
                 
                 # Set return date
                 borrow.return_date = timezone.now()
+                borrow.save()
                 
-                # Calculate penalty if late
-                penalty_points = borrow.calculate_penalty_on_return()
+                # Penalty under the category's fine policy; the ledger keeps the user's total.
+                # Its F() update locks the user row before the book, the order borrow_book uses.
+                penalty_points = fines.points(borrow.due_date, borrow.return_date, borrow.book.category_id)
                 if penalty_points > 0:
-                    user.penalty_points += penalty_points
-                    user.save()
+                    total_penalty_points = penalties.add_penalty(
+                        borrow.user_id, penalty_points, PenaltyLedgerEntry.LATE_RETURN, borrow=borrow
+                    )
+                else:
+                    total_penalty_points = (
+                        User.objects.filter(id=borrow.user_id).values_list('penalty_points', flat=True).get()
+                    )
                 
-                borrow.save()
+                book = branches.lock_book(borrow.book_id)
+                analytics.record_return(borrow, penalty_points)
+                outbox.returned(borrow, penalty_points)
+                
+                # Copies stocked per branch go back to the branch they are returned to
+                branch_id = borrow.branch_id
+                if branch_id is not None:
+                    returned_to = serializer.validated_data.get('branch_id') or branch_id
+                    branches.move_copy(book.pk, branch_id, returned_to)
+                    branch_id = returned_to
                 
-                # Update available copies
-                book.available_copies += 1
-                book.save()
+                # Hold the copy for the next patron in the queue, or put it back
+                reservations.release_copy(book, branch_id)
                 
                 return Response({
                     'message': 'Book returned successfully',
                     'penalty_points_added': penalty_points,
-                    'total_penalty_points': user.penalty_points,
+                    'total_penalty_points': total_penalty_points,
                     'borrow': BorrowSerializer(borrow).data
                 })
         
@@ -208,3 +447,200 @@ def return_book(request):
             }, status=status.HTTP_404_NOT_FOUND)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+# Reservation Views
+@extend_schema(
+    methods=['GET'],
+    operation_id='list_user_reservations',
+    summary='List user reservations',
+    description='Get the waiting and ready reservations of the authenticated user with their queue positions.',
+    responses={200: ReservationSerializer(many=True)},
+    tags=['Reservations']
+)
+@extend_schema(
+    methods=['POST'],
+    operation_id='reserve_book',
+    summary='Reserve an unavailable book',
+    description='Join the FIFO queue for a book with no available copies. When a copy is returned '
+                'the first patron in the queue gets a hold on it for a limited time.',
+    request=ReservationCreateSerializer,
+    responses={
+        201: ReservationSerializer,
+        400: ErrorResponseSerializer,
+        404: ErrorResponseSerializer
+    },
+    tags=['Reservations']
+)
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated])
+def reservations_view(request):
+    if request.method == 'GET':
+        active = Reservation.objects.filter(
+            user=request.user, status__in=Reservation.ACTIVE_STATUSES
+        ).select_related('book').annotate(queue_head=F('book__hold_queue__head'))
+        return Response(ReservationSerializer(active, many=True).data)
+
+    serializer = ReservationCreateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    user = request.user
+    
+    try:
+        with transaction.atomic():
+            book = branches.lock_book(serializer.validated_data['book_id'])
+            reservations.expire_holds(book)
+            
+            if book.available_copies > 0:
+                return Response({
+                    'error': 'Copies are available; borrow the book instead'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if Reservation.objects.filter(user=user, book=book, status__in=Reservation.ACTIVE_STATUSES).exists():
+                return Response({
+                    'error': 'You already have a reservation for this book'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if Borrow.objects.filter(user=user, book=book, return_date__isnull=True).exists():
+                return Response({
+                    'error': 'You are currently borrowing this book'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            reservation = reservations.join_queue(user, book)
+            return Response(ReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
+    
+    except Book.DoesNotExist:
+        return Response({
+            'error': 'Book not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+@extend_schema(
+    operation_id='cancel_reservation',
+    summary='Cancel a reservation',
+    description='Leave the queue, or give up a ready hold so the copy goes to the next patron.',
+    responses={
+        204: None,
+        404: ErrorResponseSerializer
+    },
+    tags=['Reservations']
+)
+@api_view(['DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def cancel_reservation(request, pk):
+    with transaction.atomic():
+        try:
+            reservation = Reservation.objects.get(
+                pk=pk, user=request.user, status__in=Reservation.ACTIVE_STATUSES
+            )
+        except Reservation.DoesNotExist:
+            return Response({
+                'error': 'Reservation not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        reservation.book = branches.lock_book(reservation.book_id)
+        reservation.refresh_from_db(fields=['status', 'ticket'])
+        if reservation.status in Reservation.ACTIVE_STATUSES:
+            reservations.cancel(reservation)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+# Analytics Views
+@extend_schema(
+    parameters=[CirculationQuerySerializer],
+    responses={200: CirculationReportSerializer(many=True)},
+    tags=['Analytics']
+)
+class CirculationReportView(APIView):
+    """Circulation totals per book, category or author, read from the daily rollups."""
+    permission_classes = [permissions.IsAdminUser]
+    model = None
+    dimension = None
+
+    def get(self, request):
+        query = CirculationQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        return Response(analytics.circulation_report(
+            self.model, self.dimension, params['start'], params['end'], params['limit']
+        ))
+
+# Inventory Views
+@extend_schema(tags=['Inventory'])
+class InventoryAuditView(APIView):
+    """
+    Check that every book's available copies equal its total copies minus open
+    borrows and ready holds. POST runs an audit (and repairs with
+    ``"repair": true``); GET reads the latest recorded run.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(
+        operation_id='latest_inventory_audit',
+        summary='Latest inventory audit',
+        responses={
+            200: InventoryAuditRunSerializer,
+            404: ErrorResponseSerializer
+        }
+    )
+    def get(self, request):
+        run = inventory.latest_run()
+        if run is None:
+            return Response({
+                'error': 'No inventory audit has run yet'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response(InventoryAuditRunSerializer(run).data)
+
+    @extend_schema(
+        operation_id='audit_inventory',
+        summary='Audit and optionally repair book inventory',
+        request=InventoryAuditQuerySerializer,
+        responses={200: InventoryAuditSerializer}
+    )
+    def post(self, request):
+        query = InventoryAuditQuerySerializer(data=request.data)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        discrepancy_list = []
+
+        def report(row):
+            if len(discrepancy_list) < params['limit']:
+                discrepancy_list.append(row)
+
+        run = inventory.audit(incremental=params['incremental'], fix=params['repair'], report=report)
+        run.discrepancy_list = discrepancy_list
+        return Response(InventoryAuditSerializer(run).data)
+
+# Availability feed (Server-Sent Events, needs an ASGI server)
+def _availability_event(book_id, copies):
+    data = json.dumps({'book': book_id, 'available_copies': copies})
+    return f'event: availability\ndata: {data}\n\n'
+
+async def availability_stream(request):
+    """
+    Stream ``available_copies`` for ``?books=1,2,3``: the current value of
+    every book first, then one event per change.
+    """
+    feed = settings.AVAILABILITY_FEED
+    try:
+        book_ids = {int(value) for value in request.GET.get('books', '').split(',') if value}
+    except ValueError:
+        return JsonResponse({'error': 'books must be a comma-separated list of ids'}, status=400)
+    if not book_ids or len(book_ids) > feed['MAX_BOOKS']:
+        return JsonResponse({'error': f"Subscribe to between 1 and {feed['MAX_BOOKS']} books"}, status=400)
+
+    async def events():
+        # Subscribe before reading the snapshot so no change can fall in
+        # between; a response that is never streamed subscribes nothing.
+        subscription = get_broker().subscribe(book_ids, asyncio.get_running_loop())
+        try:
+            snapshot = Book.objects.filter(id__in=book_ids).values_list('id', 'available_copies')
+            async for book_id, copies in snapshot:
+                yield _availability_event(book_id, copies)
+            while True:
+                changes = await subscription.changes(timeout=feed['HEARTBEAT_SECONDS'])
+                if not changes:
+                    yield ': keep-alive\n\n'
+                for book_id, copies in changes.items():
+                    yield _availability_event(book_id, copies)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
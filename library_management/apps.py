@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class LibraryManagementConfig(AppConfig):
+    name = 'library_management'
+    verbose_name = 'Library Management'
+
+    def ready(self):
+        from . import checks  # noqa: F401  (registers system checks)
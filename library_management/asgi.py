@@ -2,6 +2,9 @@
 ASGI config for library_management project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn library_management.asgi:application``)
+to use the Server-Sent Events availability feed at
+``/api/books/availability/stream/``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
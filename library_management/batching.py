@@ -0,0 +1,44 @@
+"""
+Constant-memory iteration over large tables.
+
+Batches are fetched with keyset pagination (``WHERE pk > last ORDER BY pk
+LIMIT n``): every batch is an index range scan, however deep into the table
+it is, and only one batch is held in memory at a time. Admin actions and
+management commands that may touch millions of rows go through here instead
+of evaluating a whole queryset.
+"""
+from itertools import islice
+
+
+def keyset_batches(queryset, batch_size=1000, fields=None):
+    """
+    Yield lists of up to ``batch_size`` rows of ``queryset`` in primary key
+    order: model instances, or ``(pk, *fields)`` tuples when ``fields`` is
+    given.
+    """
+    queryset = queryset.order_by('pk')
+    if fields is not None:
+        queryset = queryset.values_list('pk', *fields)
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        if len(batch) < batch_size:
+            return
+        last_pk = batch[-1][0] if fields is not None else batch[-1].pk
+
+
+def pk_batches(queryset, batch_size=1000):
+    """Yield lists of primary keys of ``queryset``."""
+    for batch in keyset_batches(queryset, batch_size, fields=()):
+        yield [row[0] for row in batch]
+
+
+def chunked(iterable, size):
+    """Split any iterable into lists of ``size`` items, e.g. for ``bulk_create``."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.db import connections
+
+
+def _server_max_connections(alias):
+    """Ask PostgreSQL for ``max_connections``; ``None`` if unavailable."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW max_connections')
+            return int(cursor.fetchone()[0])
+    except Exception:
+        return None
+
+
+@register()
+def check_connection_budget(app_configs, databases=None, **kwargs):
+    """
+    Warn when the web workers can open more connections than the database
+    server accepts.
+
+    With the psycopg pool every worker process may hold ``max_size``
+    connections; with persistent connections every worker thread keeps one.
+    """
+    db = settings.DATABASES['default']
+    if db['ENGINE'] == 'django.db.backends.sqlite3':
+        return []
+
+    pool = db.get('OPTIONS', {}).get('pool')
+    if pool:
+        per_worker = pool.get('max_size', 1)
+        source = f"pool max_size={per_worker}"
+    else:
+        per_worker = settings.WEB_THREADS
+        source = f"WEB_THREADS={per_worker}"
+
+    limit = settings.DB_MAX_CONNECTIONS
+    if databases and 'default' in databases:
+        limit = _server_max_connections('default') or limit
+
+    demand = settings.WEB_CONCURRENCY * per_worker
+    if demand <= limit:
+        return []
+    return [
+        Warning(
+            f"Workers may open {demand} database connections "
+            f"(WEB_CONCURRENCY={settings.WEB_CONCURRENCY} x {source}) "
+            f"but the server allows {limit}.",
+            hint="Lower DB_POOL_MAX_SIZE or WEB_CONCURRENCY, raise the server's "
+                 "max_connections, or put PgBouncer in front of the database.",
+            id='library_management.W001',
+        )
+    ]
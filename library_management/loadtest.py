@@ -0,0 +1,318 @@
+"""
+Load generator used by ``python manage.py loadtest``.
+
+Each virtual user is a thread with its own keep-alive HTTP connection and
+JWT. It either replays a recorded traffic file or runs the synthetic mix of
+login, catalogue browsing, search, detail views, borrows and returns.
+
+Recorded traffic is JSON Lines, one request per line::
+
+    {"name": "browse", "method": "GET", "path": "/api/books/?page={page}"}
+    {"name": "borrow", "method": "POST", "path": "/api/borrow/", "body": {"book_id": "{book_id}"}, "auth": true}
+
+``{book_id}`` and ``{page}`` are replaced with a random catalogue book and
+page; ``auth`` sends the virtual user's token; an optional ``think`` overrides
+the think time after that request.
+"""
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+# Lock conflicts as SQLite and PostgreSQL word them ("lock" alone also
+# matches e.g. a "Blocked" title or an "unlock" field).
+LOCK_ERROR_MARKERS = (
+    'database is locked',
+    'database table is locked',
+    'deadlock',
+    'lock timeout',
+    'could not obtain lock',
+)
+
+# (weight, operation) of the synthetic mix; virtual users log in before their
+# first request, and before every request when tokens are not reused.
+SYNTHETIC_MIX = [
+    (40, 'browse'),
+    (20, 'search'),
+    (20, 'detail'),
+    (10, 'borrow'),
+    (10, 'return'),
+]
+
+SEARCH_TERMS = ['harry', 'potter', 'murder', 'pride', 'farm', 'king', 'the', 'sample', 'book', 'orwell']
+
+
+def classify(status, payload, content=b''):
+    """Name the kind of failure of a response, or ``None`` on success."""
+    if 200 <= status < 300:
+        return None
+    if status == 0:
+        return 'connection_error'
+    if status == 429:
+        return 'throttled'
+    # Error pages are only descriptive with DEBUG on ("database is locked").
+    text = json.dumps(payload) if payload is not None else content.decode('utf-8', 'replace')
+    text = text.lower()
+    if 'maximum borrowing limit' in text:
+        return 'limit_reached'
+    if 'no copies available' in text:
+        return 'no_copies'
+    if 'already returned' in text:
+        return 'already_returned'
+    if is_lock_error(text):
+        return 'lock_error'
+    return f'http_{status}'
+
+
+def is_lock_error(text):
+    """Whether a (lower-cased) error message is a lock conflict rather than another failure."""
+    return any(marker in text for marker in LOCK_ERROR_MARKERS)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.queries = 0
+        self.counted_requests = 0
+
+    def record(self, name, elapsed, error, queries):
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            if error is not None:
+                self.errors[name][error] += 1
+            if queries is not None:
+                self.queries += queries
+                self.counted_requests += 1
+
+    def summary(self, elapsed):
+        operations = {}
+        total = 0
+        errors = Counter()
+        for name in sorted(self.latencies):
+            latencies = sorted(self.latencies[name])
+            total += len(latencies)
+            errors.update(self.errors[name])
+            operations[name] = {
+                'requests': len(latencies),
+                'errors': sum(self.errors[name].values()),
+                'throughput': round(len(latencies) / elapsed, 2),
+                **{
+                    f'p{int(fraction * 100)}_ms': round(percentile(latencies, fraction) * 1000, 1)
+                    for fraction in (0.5, 0.9, 0.95, 0.99)
+                },
+                'max_ms': round(latencies[-1] * 1000, 1),
+            }
+        return {
+            'duration_seconds': round(elapsed, 2),
+            'requests': total,
+            'throughput': round(total / elapsed, 2) if elapsed else 0.0,
+            'errors': dict(errors.most_common()),
+            'db_queries': self.queries if self.counted_requests else None,
+            'db_queries_per_request': round(self.queries / self.counted_requests, 2) if self.counted_requests else None,
+            'operations': operations,
+        }
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, runner, username, start_delay):
+        super().__init__(daemon=True)
+        self.runner = runner
+        self.username = username
+        self.start_delay = start_delay
+        self.random = random.Random(f'{runner.seed}:{username}')
+        self.token = None
+        self.open_borrows = []
+        self.connection = None
+
+    # HTTP
+
+    def request(self, name, method, path, body=None, auth=False):
+        runner = self.runner
+        headers = {'Accept': 'application/json'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if auth and self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+
+        started = time.perf_counter()
+        status, content, queries = 0, b'', None
+        # A kept-alive connection may have been closed by the server; retry once on a new one.
+        for reused in (self.connection is not None, False):
+            try:
+                if self.connection is None:
+                    self.connection = runner.connect()
+                self.connection.request(method, runner.prefix + path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                content = response.read()
+                status = response.status
+                queries = response.getheader('X-DB-Queries')
+                break
+            except (OSError, http.client.HTTPException):
+                if self.connection is not None:
+                    self.connection.close()
+                self.connection = None
+                if not reused:
+                    break
+        elapsed = time.perf_counter() - started
+
+        try:
+            payload = json.loads(content) if content else None
+        except ValueError:
+            payload = None
+        runner.stats.record(name, elapsed, classify(status, payload, content), int(queries) if queries else None)
+        return status, payload
+
+    # Operations
+
+    def login(self):
+        status, payload = self.request(
+            'login', 'POST', '/api/login/', {'username': self.username, 'password': self.runner.password}
+        )
+        if status == 200:
+            self.token = payload['access']
+
+    def browse(self):
+        self.request('browse', 'GET', f'/api/books/?page={self.random_page()}', auth=True)
+
+    def search(self):
+        self.request('search', 'GET', f'/api/books/?search={self.random.choice(SEARCH_TERMS)}', auth=True)
+
+    def detail(self):
+        self.request('detail', 'GET', f'/api/books/{self.random.choice(self.runner.book_ids)}/', auth=True)
+
+    def borrow(self):
+        status, payload = self.request(
+            'borrow', 'POST', '/api/borrow/', {'book_id': self.random.choice(self.runner.book_ids)}, auth=True
+        )
+        if status == 201:
+            self.open_borrows.append(payload['id'])
+
+    def return_(self):
+        if not self.open_borrows:
+            return self.borrow()
+        borrow_id = self.open_borrows.pop(self.random.randrange(len(self.open_borrows)))
+        self.request('return', 'POST', '/api/return/', {'borrow_id': borrow_id}, auth=True)
+
+    def replay(self, entry):
+        def fill(value):
+            if isinstance(value, str):
+                if value == '{book_id}':
+                    return self.random.choice(self.runner.book_ids)
+                # Plain replacement: paths and bodies may contain other braces.
+                if '{book_id}' in value:
+                    value = value.replace('{book_id}', str(self.random.choice(self.runner.book_ids)))
+                if '{page}' in value:
+                    value = value.replace('{page}', str(self.random_page()))
+                return value
+            if isinstance(value, dict):
+                return {key: fill(item) for key, item in value.items()}
+            return value
+
+        self.request(
+            entry.get('name', entry['method']), entry['method'], fill(entry['path']),
+            fill(entry.get('body')), auth=entry.get('auth', False)
+        )
+        return entry.get('think')
+
+    def random_page(self):
+        return self.random.randint(1, self.runner.pages)
+
+    # Main loop
+
+    def run(self):
+        runner = self.runner
+        time.sleep(self.start_delay)
+        operations = {
+            'browse': self.browse, 'search': self.search, 'detail': self.detail,
+            'borrow': self.borrow, 'return': self.return_,
+        }
+        names = [name for _, name in SYNTHETIC_MIX]
+        weights = [weight for weight, _ in SYNTHETIC_MIX]
+        position = self.random.randrange(len(runner.traffic)) if runner.traffic else 0
+
+        while time.monotonic() < runner.deadline:
+            if self.token is None or not runner.reuse_tokens:
+                self.login()
+            think = None
+            if runner.traffic:
+                think = self.replay(runner.traffic[position])
+                position = (position + 1) % len(runner.traffic)
+            else:
+                operations[self.random.choices(names, weights)[0]]()
+            if think is None:
+                think = self.random.expovariate(1 / runner.think_time) if runner.think_time else 0
+            if think:
+                time.sleep(think)
+
+        # Leave the catalogue as it was found.
+        while self.open_borrows:
+            self.request('return', 'POST', '/api/return/', {'borrow_id': self.open_borrows.pop()}, auth=True)
+
+
+class LoadTest:
+    def __init__(self, base_url, usernames, password, duration, ramp_up=0.0, think_time=0.0,
+                 reuse_tokens=True, traffic=None, timeout=10.0, seed=0):
+        parts = urlsplit(base_url)
+        self.scheme, self.host, self.port = parts.scheme, parts.hostname, parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.usernames = usernames
+        self.password = password
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.reuse_tokens = reuse_tokens
+        self.traffic = traffic or []
+        self.timeout = timeout
+        self.seed = seed
+        self.stats = Stats()
+        self.book_ids = []
+        self.pages = 1
+        self.deadline = 0.0
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def discover_catalogue(self):
+        """Collect book ids through the API, as the virtual users will see them."""
+        connection = self.connect()
+        page = 1
+        while page <= 10:
+            connection.request('GET', f'{self.prefix}/api/books/?fields=id&page={page}')
+            response = connection.getresponse()
+            payload = json.loads(response.read() or b'null')
+            if response.status != 200:
+                break
+            self.book_ids.extend(book['id'] for book in payload['results'])
+            self.pages = max(1, -(-payload['count'] // max(len(payload['results']), 1)))
+            if not payload['next']:
+                break
+            page += 1
+        connection.close()
+        if not self.book_ids:
+            raise RuntimeError(f'No books found at {self.host}:{self.port}{self.prefix}/api/books/')
+
+    def run(self):
+        self.discover_catalogue()
+        step = self.ramp_up / len(self.usernames) if self.usernames else 0
+        users = [VirtualUser(self, username, index * step) for index, username in enumerate(self.usernames)]
+        started = time.monotonic()
+        self.deadline = started + self.ramp_up + self.duration
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        return self.stats.summary(time.monotonic() - started)
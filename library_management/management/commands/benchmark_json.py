@@ -0,0 +1,75 @@
+import io
+import timeit
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from books.models import Author, Category, Book
+from books.serializers import BookSerializer
+from library_management.parsers import FastJSONParser
+from library_management.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = 'Compare the stdlib and fast JSON renderer/parser on a page of books'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000, help='Books per page (default: 1000)')
+        parser.add_argument('--repeat', type=int, default=50, help='Timed iterations (default: 50)')
+
+    def build_page(self, items):
+        """Serialize unsaved books so the benchmark needs no database rows."""
+        now = timezone.now()
+        authors = [Author(id=i, name=f'Author {i}') for i in range(1, 51)]
+        categories = [Category(id=i, name=f'Category {i}') for i in range(1, 11)]
+        books = [
+            Book(
+                id=i,
+                title=f'Book title {i} — édition',
+                description='A fairly long description of the book. ' * 8,
+                author=authors[i % len(authors)],
+                category=categories[i % len(categories)],
+                total_copies=5,
+                available_copies=i % 6,
+                created_at=now - timedelta(days=i),
+                updated_at=now,
+            )
+            for i in range(1, items + 1)
+        ]
+        return {
+            'count': items,
+            'next': None,
+            'previous': None,
+            'results': BookSerializer(books, many=True).data,
+        }
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; the fast classes use the stdlib.'))
+
+        page = self.build_page(options['items'])
+        repeat = options['repeat']
+
+        stdlib_bytes = JSONRenderer().render(page)
+        fast_bytes = FastJSONRenderer().render(page)
+        if stdlib_bytes != fast_bytes:
+            raise CommandError('FastJSONRenderer output differs from JSONRenderer')
+        if FastJSONParser().parse(io.BytesIO(fast_bytes)) != JSONParser().parse(io.BytesIO(stdlib_bytes)):
+            raise CommandError('FastJSONParser result differs from JSONParser')
+
+        self.stdout.write(f'Payload: {options["items"]} books, {len(stdlib_bytes) / 1024:.1f} KiB')
+        cases = [
+            ('render', 'JSONRenderer', lambda: JSONRenderer().render(page)),
+            ('render', 'FastJSONRenderer', lambda: FastJSONRenderer().render(page)),
+            ('parse', 'JSONParser', lambda: JSONParser().parse(io.BytesIO(stdlib_bytes))),
+            ('parse', 'FastJSONParser', lambda: FastJSONParser().parse(io.BytesIO(stdlib_bytes))),
+        ]
+        baseline = {}
+        for operation, name, func in cases:
+            elapsed = min(timeit.repeat(func, number=repeat, repeat=3)) / repeat
+            baseline.setdefault(operation, elapsed)
+            speedup = baseline[operation] / elapsed
+            self.stdout.write(f'{name:<18} {elapsed * 1000:8.3f} ms  x{speedup:.1f}')
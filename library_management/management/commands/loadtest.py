@@ -0,0 +1,102 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from library_management.loadtest import LoadTest
+
+
+class Command(BaseCommand):
+    help = 'Drive a running server with recorded or synthetic traffic and report throughput and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='Server to test')
+        parser.add_argument('--file', help='Recorded traffic (JSON Lines); default: the synthetic mix')
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users (default: 10)')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds at full load (default: 30)')
+        parser.add_argument('--ramp-up', type=float, default=0, help='Seconds to start all users over')
+        parser.add_argument('--think-time', type=float, default=0, help='Mean pause between requests, seconds')
+        parser.add_argument(
+            '--no-token-reuse', action='store_false', dest='reuse_tokens',
+            help='Log in again before every request'
+        )
+        parser.add_argument('--username-prefix', default='loadtest', help='Virtual users log in as <prefix><n>')
+        parser.add_argument('--password', default='loadtest123')
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Create the virtual users in this project\'s database first'
+        )
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Also write the summary as JSON to this file')
+
+    def load_traffic(self, path):
+        traffic = []
+        with open(path, encoding='utf-8') as lines:
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError as exc:
+                    raise CommandError(f'{path}:{number}: {exc}')
+                if not isinstance(entry, dict) or 'method' not in entry or 'path' not in entry:
+                    raise CommandError(f'{path}:{number}: expected an object with "method" and "path"')
+                traffic.append(entry)
+        if not traffic:
+            raise CommandError(f'{path} has no requests to replay')
+        return traffic
+
+    def create_users(self, usernames, password):
+        User = get_user_model()
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        # Hash once: every virtual user shares the password.
+        password = make_password(password)
+        User.objects.bulk_create(
+            User(username=username, email=f'{username}@example.com', password=password)
+            for username in usernames if username not in existing
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+        traffic = self.load_traffic(options['file']) if options['file'] else None
+        usernames = [f"{options['username_prefix']}{n}" for n in range(options['users'])]
+        if options['create_users']:
+            self.create_users(usernames, options['password'])
+
+        test = LoadTest(
+            options['base_url'], usernames, options['password'], options['duration'],
+            ramp_up=options['ramp_up'], think_time=options['think_time'],
+            reuse_tokens=options['reuse_tokens'], traffic=traffic,
+            timeout=options['timeout'], seed=options['seed'],
+        )
+        try:
+            summary = test.run()
+        except (OSError, RuntimeError) as exc:
+            raise CommandError(f'Cannot reach {options["base_url"]}: {exc}')
+
+        self.stdout.write(
+            f"{summary['requests']} requests in {summary['duration_seconds']} s: "
+            f"{summary['throughput']} req/s"
+        )
+        self.stdout.write(f"{'operation':<10} {'requests':>8} {'errors':>7} {'req/s':>8} "
+                          f"{'p50 ms':>8} {'p90 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name, row in summary['operations'].items():
+            self.stdout.write(
+                f"{name:<10} {row['requests']:>8} {row['errors']:>7} {row['throughput']:>8} "
+                f"{row['p50_ms']:>8} {row['p90_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}"
+            )
+        for error, count in summary['errors'].items():
+            self.stdout.write(self.style.WARNING(f'{error}: {count}'))
+        if summary['db_queries'] is None:
+            self.stdout.write('DB queries: not reported (start the server with QUERY_COUNT_HEADER=true)')
+        else:
+            self.stdout.write(
+                f"DB queries: {summary['db_queries']} ({summary['db_queries_per_request']} per request)"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(summary, output, indent=2)
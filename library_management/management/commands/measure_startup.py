@@ -0,0 +1,79 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: everything a worker does before its first request.
+PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import resolve
+resolve(sys.argv[1])
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure worker cold start (import time, RSS) for each settings profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile', action='append', dest='profiles',
+            help='Settings module to measure; repeatable '
+                 '(default: library_management.settings and library_management.settings_api)'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Cold starts per profile (default: 5)')
+        parser.add_argument('--path', default='/api/books/', help='URL resolved before stopping the clock')
+        parser.add_argument('--top', type=int, default=0, help='Also list the N slowest top-level imports')
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or ['library_management.settings', 'library_management.settings_api']
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+
+        for profile in profiles:
+            runs = [self.probe(profile, options['path']) for _ in range(options['repeat'])]
+            seconds = [run['seconds'] for run in runs]
+            self.stdout.write(
+                f"{profile}: {statistics.median(seconds) * 1000:.0f} ms median "
+                f"(min {min(seconds) * 1000:.0f} ms), "
+                f"{max(run['max_rss_kb'] for run in runs) / 1024:.1f} MiB max RSS, "
+                f"{runs[0]['modules']} modules"
+            )
+            if options['top']:
+                for name, microseconds in self.slowest_imports(profile, options['path'], options['top']):
+                    self.stdout.write(f'    {microseconds / 1000:8.1f} ms  {name}')
+
+    def run_probe(self, profile, path, *flags):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': profile}
+        result = subprocess.run(
+            [sys.executable, *flags, '-c', PROBE, path],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'{profile} failed to start:\n{result.stderr}')
+        return result
+
+    def probe(self, profile, path):
+        return json.loads(self.run_probe(profile, path).stdout)
+
+    def slowest_imports(self, profile, path, count):
+        """Top-level imports by cumulative time, from ``python -X importtime``."""
+        timings = []
+        for line in self.run_probe(profile, path, '-X', 'importtime').stderr.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit() and not name.startswith('  '):
+                timings.append((name.strip(), int(cumulative)))
+        return sorted(timings, key=lambda timing: timing[1], reverse=True)[:count]
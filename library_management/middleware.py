@@ -0,0 +1,52 @@
+"""
+Opt-in diagnostics middleware.
+
+``QueryCountMiddleware`` adds an ``X-DB-Queries`` header with the number of
+SQL statements a request ran, which ``python manage.py loadtest`` sums up.
+It is only active with ``QUERY_COUNT_HEADER = True`` (env ``QUERY_COUNT_HEADER``);
+otherwise Django drops it from the chain at startup.
+
+``ProfilingMiddleware`` runs a request under cProfile when a staff user asks
+for it with an ``X-Profile`` header (see ``profiling.py``). It is only active
+with ``REQUEST_PROFILING['ENABLED']`` (env ``REQUEST_PROFILING``).
+"""
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from . import profiling
+
+
+class QueryCountMiddleware:
+    def __init__(self, get_response):
+        if not settings.QUERY_COUNT_HEADER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = self.get_response(request)
+        response['X-DB-Queries'] = str(queries)
+        return response
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if 'X-Profile' not in request.headers or not profiling.is_staff(request):
+            return self.get_response(request)
+        response, profile = profiling.profile_request(self.get_response, request)
+        # "busy" when another request on this worker is already being profiled
+        response['X-Profile-Id'] = profile['id'] if profile else 'busy'
+        return response
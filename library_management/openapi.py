@@ -0,0 +1,51 @@
+"""
+drf-spectacular annotations that cost nothing when the docs are not served.
+
+Views and serializers import ``extend_schema`` & co. from here. With
+``drf_spectacular`` in ``INSTALLED_APPS`` these are the real objects; in the
+API-only profile (``settings_api``) they are no-ops, so workers never import
+drf-spectacular, PyYAML and uritemplate just to decorate views.
+"""
+from django.conf import settings
+
+__all__ = [
+    'OpenApiParameter', 'OpenApiResponse', 'OpenApiTypes',
+    'extend_schema', 'extend_schema_field', 'extend_schema_view',
+]
+
+if 'drf_spectacular' in settings.INSTALLED_APPS:
+    from drf_spectacular.types import OpenApiTypes
+    from drf_spectacular.utils import (
+        OpenApiParameter, OpenApiResponse, extend_schema, extend_schema_field, extend_schema_view,
+    )
+else:
+    def _unchanged(target):
+        return target
+
+    def extend_schema(*args, **kwargs):
+        return _unchanged
+
+    def extend_schema_view(**kwargs):
+        return _unchanged
+
+    def extend_schema_field(*args, **kwargs):
+        return _unchanged
+
+    class OpenApiParameter:
+        QUERY = 'query'
+        PATH = 'path'
+        HEADER = 'header'
+        COOKIE = 'cookie'
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+    class OpenApiResponse:
+        def __init__(self, *args, **kwargs):
+            pass
+
+    class _OpenApiTypes:
+        def __getattr__(self, name):
+            return name
+
+    OpenApiTypes = _OpenApiTypes()
@@ -0,0 +1,233 @@
+"""
+Staff-only, opt-in profiling of live workers.
+
+With ``REQUEST_PROFILING['ENABLED']`` (env ``REQUEST_PROFILING``) two kinds
+of profile can be taken without redeploying:
+
+* a single request, run under cProfile when a staff user sends an
+  ``X-Profile: 1`` header (``ProfilingMiddleware``); the response names the
+  profile in ``X-Profile-Id``;
+* a time window on one worker: ``POST /api/profiles/`` starts a thread in
+  the worker that served it which samples every thread's stack each
+  ``SAMPLE_INTERVAL`` seconds, so requests run at full speed meanwhile.
+
+Each profile is written to ``REQUEST_PROFILING['DIRECTORY']`` of the worker
+host as a downloadable file (a pstats dump for requests, collapsed stacks
+for flame graph tools for windows) plus a JSON summary of the top
+functions by self time; only the newest ``KEEP`` are kept. When disabled
+the middleware drops out of the chain at startup and ``/api/profiles/`` is
+not routed, so nothing is paid.
+"""
+import cProfile
+import json
+import os
+import pstats
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+EXTENSIONS = {'request': '.prof', 'window': '.folded'}
+
+# cProfile can't nest, and one window at a time is plenty.
+_request_lock = threading.Lock()
+_window_lock = threading.Lock()
+
+
+def _config(name):
+    return settings.REQUEST_PROFILING[name]
+
+
+def is_staff(request):
+    """Staff check for middleware, which runs before DRF's JWT authentication."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def _label(filename, line, name):
+    """``path:line(function)`` like pstats, relative to the project or ``sys.path`` entry."""
+    for root in sorted({str(settings.BASE_DIR), *filter(None, sys.path)}, key=len, reverse=True):
+        if filename.startswith(root + os.sep):
+            filename = filename[len(root) + 1:]
+            break
+    return f'{filename}:{line}({name})'
+
+
+# Storage
+
+def path(profile_id, suffix):
+    return os.path.join(_config('DIRECTORY'), f'{profile_id}{suffix}')
+
+
+def new_id(started):
+    # Sorts by start time.
+    return f'{started:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+
+
+def _save(profile_id, kind, label, started, duration, summary, write):
+    """Write the profile file and its JSON summary, drop the oldest; returns the summary."""
+    os.makedirs(_config('DIRECTORY'), exist_ok=True)
+    write(path(profile_id, EXTENSIONS[kind]))
+    meta = {
+        'id': profile_id,
+        'kind': kind,
+        'label': label,
+        'worker': f'{socket.gethostname()}:{os.getpid()}',
+        'started_at': started.isoformat(),
+        'duration_ms': round(duration * 1000, 2),
+        'top_functions': summary,
+    }
+    with open(path(profile_id, '.json'), 'w') as summary_file:
+        json.dump(meta, summary_file, indent=2)
+
+    for stale in list_profiles()[_config('KEEP'):]:
+        for suffix in (EXTENSIONS[stale['kind']], '.json'):
+            try:
+                os.remove(path(stale['id'], suffix))
+            except FileNotFoundError:
+                pass
+    return meta
+
+
+def list_profiles():
+    """Summaries of the stored profiles, newest first."""
+    try:
+        names = sorted((name for name in os.listdir(_config('DIRECTORY')) if name.endswith('.json')), reverse=True)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        profile = get_profile(name[:-len('.json')])
+        if profile is not None:
+            profiles.append(profile)
+    return profiles
+
+
+def get_profile(profile_id):
+    # Ids are generated here; anything else can't name a file.
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    try:
+        with open(path(profile_id, '.json')) as summary_file:
+            return json.load(summary_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# Single requests
+
+def profile_request(get_response, request):
+    """
+    Run ``get_response(request)`` under cProfile; returns the response and
+    the profile summary, or ``None`` when another request is being profiled.
+    """
+    if not _request_lock.acquire(blocking=False):
+        return get_response(request), None
+    try:
+        profiler = cProfile.Profile()
+        started, clock = datetime.now(timezone.utc), time.perf_counter()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - clock
+        stats = pstats.Stats(profiler).stats
+        top = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:_config('TOP_FUNCTIONS')]
+        summary = [
+            {
+                'function': _label(*function),
+                'calls': calls,
+                'self_ms': round(self_time * 1000, 3),
+                'cumulative_ms': round(cumulative * 1000, 3),
+            }
+            for function, (_, calls, self_time, cumulative, _) in top
+        ]
+        label = f'{request.method} {request.get_full_path()} -> {response.status_code}'
+        return response, _save(new_id(started), 'request', label, started, duration, summary, profiler.dump_stats)
+    finally:
+        _request_lock.release()
+
+
+# Time windows
+
+def _sample_window(profile_id, seconds, interval, started):
+    own = threading.get_ident()
+    labels = {}  # code object: label
+    stacks = Counter()
+    samples = 0
+    clock = time.perf_counter()
+    deadline = clock + seconds
+    while time.perf_counter() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code not in labels:
+                    labels[code] = _label(code.co_filename, code.co_firstlineno, code.co_name)
+                stack.append(labels[code])
+                frame = frame.f_back
+            stacks[tuple(reversed(stack))] += 1
+        samples += 1
+        time.sleep(interval)
+    duration = time.perf_counter() - clock
+
+    self_samples, total_samples = Counter(), Counter()
+    for stack, count in stacks.items():
+        self_samples[stack[-1]] += count
+        for function in set(stack):
+            total_samples[function] += count
+    summary = [
+        {
+            'function': function,
+            'self_samples': count,
+            'total_samples': total_samples[function],
+            'self_percent': round(100 * count / max(sum(stacks.values()), 1), 2),
+        }
+        for function, count in self_samples.most_common(_config('TOP_FUNCTIONS'))
+    ]
+
+    def write(filename):
+        # One "root;caller;...;leaf count" line per stack, as flamegraph.pl and speedscope read.
+        with open(filename, 'w') as folded:
+            for stack, count in stacks.most_common():
+                folded.write(f"{';'.join(stack)} {count}\n")
+
+    label = f'{seconds:g} s window, {samples} samples every {interval * 1000:g} ms'
+    return _save(profile_id, 'window', label, started, duration, summary, write)
+
+
+def start_window(seconds):
+    """
+    Sample this worker for ``seconds`` in a background thread; returns the
+    id the profile will be stored under, or ``None`` when a window is
+    already being sampled.
+    """
+    if not _window_lock.acquire(blocking=False):
+        return None
+    started = datetime.now(timezone.utc)
+    profile_id = new_id(started)
+
+    def run():
+        try:
+            _sample_window(profile_id, seconds, _config('SAMPLE_INTERVAL'), started)
+        finally:
+            _window_lock.release()
+
+    threading.Thread(target=run, name='profile-window', daemon=True).start()
+    return profile_id
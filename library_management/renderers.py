@@ -0,0 +1,41 @@
+"""
+JSON renderer backed by orjson, with the stdlib renderer as fallback.
+
+The output follows ``rest_framework.renderers.JSONRenderer``: compact
+separators, UTF-8 output, ``Z`` for UTC datetimes, Decimals as numbers and
+``\\u2028``/``\\u2029`` escaped. It is not byte-identical for every float:
+orjson spells some exponents differently (``1e16`` for ``1e+16``, the same
+value) and renders NaN and infinities as ``null`` where ``JSONRenderer``
+raises ``ValueError``. Anything orjson can't encode like the stdlib
+(indented output for the browsable API, ``ensure_ascii``, integers wider
+than 64 bits) goes through the stdlib renderer instead.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    if orjson is not None:
+        orjson_options = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        orjson_default = staticmethod(encoders.JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.orjson_default, option=self.orjson_options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same strict-javascript-subset escaping as JSONRenderer.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
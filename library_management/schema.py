@@ -0,0 +1,93 @@
+"""
+OpenAPI schema served from memory.
+
+``SpectacularAPIView`` introspects every view and serializer on each request.
+The schema only changes when the code does, so it is built once per process
+(or loaded from a file produced at deploy time with
+``python manage.py spectacular --file schema.yml`` and ``API_SCHEMA_FILE``)
+and every rendering is kept as pre-serialized and pre-gzipped bytes with an
+ETag. A deploy starts new processes, which is what invalidates the cache.
+"""
+import gzip
+import hashlib
+import threading
+
+import yaml
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from drf_spectacular.views import SpectacularAPIView
+
+_schemas = {}
+_renderings = {}
+_lock = threading.Lock()
+
+
+class RenderedSchema:
+    def __init__(self, content, content_type):
+        self.content = content
+        self.gzipped = gzip.compress(content, mtime=0)
+        self.content_type = content_type
+        self.etag = '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+
+def load_schema_file(path):
+    """Load a schema previously written by ``manage.py spectacular``."""
+    with open(path, 'rb') as fh:
+        return yaml.safe_load(fh)
+
+
+def _matches(etag, if_none_match):
+    """Weak comparison against an ``If-None-Match`` list, as RFC 9110 asks."""
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in (tag.removeprefix('W/') for tag in etags)
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """Drop-in replacement for ``SpectacularAPIView`` with per-process caching."""
+
+    def _get_schema_response(self, request):
+        version = self.api_version or request.version or self._get_version_parameter(request)
+        renderer = request.accepted_renderer
+        media_type = request.accepted_media_type
+        key = (version, request.GET.get('lang'), renderer.format, media_type)
+
+        rendered = _renderings.get(key)
+        if rendered is None:
+            with _lock:
+                rendered = _renderings.get(key)
+                if rendered is None:
+                    schema = self._get_schema(request, version)
+                    content = renderer.render(schema, media_type, self.get_renderer_context())
+                    content_type = media_type
+                    if renderer.charset:
+                        content_type = f'{media_type}; charset={renderer.charset}'
+                    rendered = _renderings[key] = RenderedSchema(content, content_type)
+
+        if _matches(rendered.etag, request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(rendered.gzipped, content_type=rendered.content_type)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(rendered.content, content_type=rendered.content_type)
+
+        response['ETag'] = rendered.etag
+        response['Cache-Control'] = 'no-cache'
+        response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, version)}"'
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+    def _get_schema(self, request, version):
+        # Called with the lock held.
+        key = (version, request.GET.get('lang'))
+        if key not in _schemas:
+            if settings.API_SCHEMA_FILE:
+                _schemas[key] = load_schema_file(settings.API_SCHEMA_FILE)
+            else:
+                generator = self.generator_class(
+                    urlconf=self.urlconf, api_version=version, patterns=self.patterns
+                )
+                _schemas[key] = generator.get_schema(request=request, public=self.serve_public)
+        return _schemas[key]
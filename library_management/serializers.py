@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 
@@ -5,5 +6,31 @@ class APIRootResponseSerializer(serializers.Serializer):
     """Serializer for API root response"""
     message = serializers.CharField()
     endpoints = serializers.DictField()
-    admin = serializers.CharField()
-    documentation = serializers.DictField()
+    admin = serializers.CharField(required=False, help_text='Only when the admin is installed')
+    documentation = serializers.DictField(required=False, help_text='Only when docs or the browsable API are served')
+
+
+class ProfileSerializer(serializers.Serializer):
+    """Serializer for a stored request or window profile"""
+    id = serializers.CharField()
+    kind = serializers.ChoiceField(choices=['request', 'window'])
+    label = serializers.CharField(help_text='Request line and status, or window length and sampling rate')
+    worker = serializers.CharField(help_text='host:pid of the profiled worker')
+    started_at = serializers.DateTimeField()
+    duration_ms = serializers.FloatField()
+    top_functions = serializers.ListField(
+        child=serializers.DictField(), required=False,
+        help_text='Functions with the most self time (detail only)'
+    )
+
+
+class ProfileWindowSerializer(serializers.Serializer):
+    """Serializer for starting a sampling window on the worker that serves the request"""
+    id = serializers.CharField(read_only=True)
+    seconds = serializers.FloatField(min_value=0.1, default=10)
+
+    def validate_seconds(self, value):
+        limit = settings.REQUEST_PROFILING['MAX_WINDOW_SECONDS']
+        if value > limit:
+            raise serializers.ValidationError(f'At most {limit} seconds')
+        return value
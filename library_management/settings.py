@@ -1,6 +1,10 @@
+import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
+from .database import database_config, env_bool, env_int
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -31,6 +35,7 @@ INSTALLED_APPS = [
     'django_filters',
     'corsheaders',
     'drf_spectacular',
+    'library_management',
     'authentication',
     'books',
 ]
@@ -44,6 +49,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'library_management.middleware.QueryCountMiddleware',
+    'library_management.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'library_management.urls'
@@ -68,14 +75,18 @@ WSGI_APPLICATION = 'library_management.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# See library_management/database.py for the environment variables.
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
+# Deployment shape, used by the startup check that compares the number of
+# connections the workers may open against the database server limit.
+WEB_CONCURRENCY = env_int('WEB_CONCURRENCY', 1)
+WEB_THREADS = env_int('WEB_THREADS', 1)
+DB_MAX_CONNECTIONS = env_int('DB_MAX_CONNECTIONS', 100)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,12 +138,51 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'library_management.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'library_management.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_THROTTLE_CLASSES': [
+        'library_management.throttling.SlidingWindowThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '10/min',
+        'register': '5/min',
+        'borrow': '30/min',
+        'return': '30/min',
+        'catalogue': '600/min',
+    },
+}
+
+# Where throttle counters live: LocalMemoryStore (per worker process) or
+# CacheStore (Django's default cache, shared between workers and hosts)
+THROTTLE_STORE = os.environ.get('THROTTLE_STORE', 'library_management.throttling.LocalMemoryStore')
+
+# Turn throttling off to measure capacity rather than the limits (load tests)
+THROTTLE_ENABLED = env_bool('THROTTLE_ENABLED', True)
+
+# Add an X-DB-Queries header to every response (see library_management/middleware.py)
+QUERY_COUNT_HEADER = env_bool('QUERY_COUNT_HEADER', False)
+
+# Staff-only profiling of single requests and worker time windows (see library_management/profiling.py)
+REQUEST_PROFILING = {
+    'ENABLED': env_bool('REQUEST_PROFILING', False),
+    'DIRECTORY': os.environ.get('REQUEST_PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'library-profiles')),
+    'KEEP': 200,                 # newest profiles kept per host
+    'TOP_FUNCTIONS': 30,         # functions in each summary
+    'SAMPLE_INTERVAL': 0.005,    # seconds between stack samples in a window
+    'MAX_WINDOW_SECONDS': 120,
 }
 
 # Simple JWT Settings
@@ -151,6 +201,63 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Real-time availability feed (/api/books/availability/stream/)
+AVAILABILITY_FEED = {
+    'BROKER': 'books.availability.InProcessBroker',
+    'COALESCE_SECONDS': 0.25,
+    'HEARTBEAT_SECONDS': 15,
+    'MAX_BOOKS': 50,
+}
+
+# In-process cache of /api/books/<pk>/ payloads for the most requested books
+BOOK_DETAIL_CACHE = {
+    'MAX_ENTRIES': 256,
+    'TTL_SECONDS': 300,
+}
+
+# Borrow/return events relayed to downstream systems by `manage.py relay_outbox`
+OUTBOX = {
+    'PUBLISHER': os.environ.get('OUTBOX_PUBLISHER', 'books.outbox.LogPublisher'),
+    'BATCH_SIZE': env_int('OUTBOX_BATCH_SIZE', 500),
+    'WEBHOOK_URL': os.environ.get('OUTBOX_WEBHOOK_URL', ''),
+    'WEBHOOK_TIMEOUT': 10,
+}
+
+# Due-date reminders and overdue notices sent by `manage.py send_reminders`
+REMINDERS = {
+    'DUE_SOON_DAYS': env_int('REMINDER_DUE_SOON_DAYS', 2),
+    'BATCH_SIZE': env_int('REMINDER_BATCH_SIZE', 500),
+    'EMAIL_BACKEND': os.environ.get('REMINDER_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend'),
+    'FROM_EMAIL': os.environ.get('REMINDER_FROM_EMAIL', 'library@example.com'),
+}
+
+# How long the first response to a request with an Idempotency-Key is replayed
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+# After this long without a response a claimed key is taken to belong to a
+# killed worker and may be claimed again (keep it above the request timeout)
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = timedelta(seconds=env_int('IDEMPOTENCY_IN_FLIGHT_TIMEOUT', 120))
+
+# In-process prefix index behind /api/books/suggest/
+BOOK_SUGGEST = {
+    'MAX_ENTRIES': 500000,  # larger catalogues use the database fallback
+    'TTL_SECONDS': 600,
+}
+
+# "Patrons who borrowed this also borrowed" (`manage.py build_recommendations`)
+RECOMMENDATIONS = {
+    'TOP_K': 10,          # neighbours kept per book
+    'USER_CHUNK': 5000,   # users per sparse matrix chunk in full builds
+}
+
+# Returned borrows moved to ArchivedBorrow by `manage.py archive_borrows`
+BORROW_ARCHIVE = {
+    'AFTER_DAYS': env_int('BORROW_ARCHIVE_AFTER_DAYS', 365),  # days since return
+    'BATCH_SIZE': 1000,
+}
+
+# How long a returned copy is held for the next patron in the reservation queue
+RESERVATION_HOLD_PERIOD = timedelta(days=3)
+
 # Custom User Model
 AUTH_USER_MODEL = 'authentication.User'
 
@@ -177,7 +284,11 @@ Features:
         {'name': 'Authors', 'description': 'Author management endpoints (Admin required for modifications)'},
         {'name': 'Categories', 'description': 'Category management endpoints (Admin required for modifications)'},
         {'name': 'Books', 'description': 'Book management endpoints (Admin required for modifications)'},
+        {'name': 'Branches', 'description': 'Library branches and the copies each one stocks'},
         {'name': 'Borrowing', 'description': 'Book borrowing and returning system'},
+        {'name': 'Reservations', 'description': 'Queue for books with no available copies'},
+        {'name': 'Inventory', 'description': 'Inventory consistency audits (staff only)'},
+        {'name': 'Analytics', 'description': 'Circulation reports for staff, read from daily rollups'},
         {'name': 'User Management', 'description': 'User-related endpoints including penalty tracking'},
     ],
     'SECURITY': [
@@ -201,3 +312,8 @@ Features:
         'pathInMiddlePanel': True,
     },
 }
+
+# Serve /api/schema/ from a schema file generated at deploy time
+# (``python manage.py spectacular --file schema.yml``) instead of building
+# it on the first request of every process.
+API_SCHEMA_FILE = os.environ.get('API_SCHEMA_FILE')
@@ -0,0 +1,50 @@
+"""
+API-only settings for workers that never serve the admin or the docs.
+
+    DJANGO_SETTINGS_MODULE=library_management.settings_api gunicorn library_management.wsgi
+
+Everything matches ``settings`` except that the admin, messages, static
+files, drf-spectacular and the browsable API are left out, so a freshly
+recycled worker imports much less before serving its first request. Run
+``migrate``, the admin and the schema/docs with the default settings.
+``python manage.py measure_startup`` compares both profiles.
+"""
+from .settings import *  # noqa: F401,F403
+
+API_ONLY_EXCLUDED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'drf_spectacular',
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_ONLY_EXCLUDED_APPS]
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware != 'django.contrib.messages.middleware.MessageMiddleware'
+]
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+            ],
+        },
+    },
+]
+
+# JWT only: session authentication exists for the browsable API.
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'library_management.renderers.FastJSONRenderer',
+    ],
+}
+del REST_FRAMEWORK['DEFAULT_SCHEMA_CLASS']
@@ -0,0 +1,154 @@
+"""
+Per-route request throttling with sliding-window counters.
+
+Each scope (login, register, borrow, return, catalogue) has a rate in
+``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']`` and is counted per user, or per
+client IP for anonymous requests. A request is allowed while
+
+    previous_window_count * (1 - elapsed_fraction) + current_window_count < limit
+
+which smooths the burst a fixed window allows at its boundary while keeping
+only two integers per client and scope.
+
+Counters live in the store named by ``THROTTLE_STORE``:
+
+- ``LocalMemoryStore`` keeps them in the worker's memory. Checks cost a few
+  microseconds, but every worker process counts separately, so the effective
+  limit on a host is the rate times the number of workers.
+- ``CacheStore`` keeps them in Django's default cache (Redis, Memcached, ...)
+  so all workers and hosts share one count, at the cost of a cache round trip.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LocalMemoryStore:
+    prune_every = 10000
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    def hit(self, key, limit, window, now):
+        """Count a request; return ``(allowed, seconds_to_wait)``."""
+        bucket, offset = divmod(now, window)
+        with self._lock:
+            self._hits += 1
+            if self._hits % self.prune_every == 0:
+                self._prune(bucket)
+
+            entry = self._counters.get(key)
+            if entry is None or entry[0] < bucket - 1:
+                previous, current = 0, 0
+            elif entry[0] == bucket - 1:
+                previous, current = entry[2], 0
+            else:
+                previous, current = entry[1], entry[2]
+
+            allowed, wait = _check(previous, current, limit, window, offset)
+            if allowed:
+                current += 1
+            self._counters[key] = [bucket, previous, current]
+            return allowed, wait
+
+    def _prune(self, bucket):
+        stale = [key for key, entry in self._counters.items() if entry[0] < bucket - 1]
+        for key in stale:
+            del self._counters[key]
+
+
+class CacheStore:
+    def hit(self, key, limit, window, now):
+        bucket, offset = divmod(now, window)
+        current_key = f'{key}:{int(bucket)}'
+        previous_key = f'{key}:{int(bucket) - 1}'
+        counts = cache.get_many([previous_key, current_key])
+        previous, current = counts.get(previous_key, 0), counts.get(current_key, 0)
+
+        allowed, wait = _check(previous, current, limit, window, offset)
+        if allowed and not cache.add(current_key, 1, timeout=int(2 * window) + 1):
+            try:
+                cache.incr(current_key)
+            except ValueError:
+                # Expired between add() and incr().
+                cache.set(current_key, 1, timeout=int(2 * window) + 1)
+        return allowed, wait
+
+
+def _check(previous, current, limit, window, offset):
+    fraction = offset / window
+    if previous * (1 - fraction) + current < limit:
+        return True, 0.0
+    if current >= limit or not previous:
+        return False, window - offset
+    # Wait until enough of the previous window has slid out.
+    needed = 1 - (limit - current) / previous
+    return False, max(needed - fraction, 0.0) * window
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = import_string(settings.THROTTLE_STORE)()
+    return _store
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Throttle a view by its ``throttle_scope`` (or this class's ``scope``).
+    Views without a scope are not throttled.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):
+        # The rate depends on the view, so it is resolved in allow_request().
+        pass
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scope', None) or getattr(self, 'scope', None)
+        if not self.scope or not settings.THROTTLE_ENABLED:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.get_rate())
+
+        allowed, self._wait = get_store().hit(
+            self.get_cache_key(request, view), self.num_requests, self.duration, time.time()
+        )
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class LoginThrottle(SlidingWindowThrottle):
+    scope = 'login'
+
+
+class RegisterThrottle(SlidingWindowThrottle):
+    scope = 'register'
+
+
+class BorrowThrottle(SlidingWindowThrottle):
+    scope = 'borrow'
+
+
+class ReturnThrottle(SlidingWindowThrottle):
+    scope = 'return'
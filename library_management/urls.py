@@ -1,21 +1,28 @@
-from django.contrib import admin
+from django.apps import apps
+from django.conf import settings
 from django.urls import path, include
+from django.urls.resolvers import RoutePattern, URLResolver
 from django.shortcuts import redirect
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-    SpectacularRedocView,
-)
-from drf_spectacular.utils import extend_schema
+from rest_framework.settings import api_settings
+from .openapi import extend_schema
 from .serializers import APIRootResponseSerializer
 
 def redirect_to_api(request):
     return redirect('/api/')
 
+def lazy_include(route, urlconf, namespace=None):
+    """
+    Like ``include()``, but ``urlconf`` is only imported once a URL under
+    ``route`` is resolved or any URL is reversed, so workers that never
+    serve it skip the import.
+    """
+    return URLResolver(RoutePattern(route, is_endpoint=False), urlconf, app_name=namespace, namespace=namespace)
+
 @extend_schema(
     operation_id='api_root',
     summary='API Root',
@@ -33,7 +40,7 @@ def api_root(request, format=None):
     
     Welcome to the Library Management API. Below are the available endpoints:
     """
-    return Response({
+    data = {
         'message': 'Welcome to Library Management API',
         'endpoints': {
             'authentication': {
@@ -49,26 +56,40 @@ def api_root(request, format=None):
                 'return': request.build_absolute_uri('/api/return/'),
             }
         },
-        'admin': request.build_absolute_uri('/admin/'),
-        'documentation': {
+    }
+    # Only link what this settings profile routes (see urlpatterns below).
+    if apps.is_installed('django.contrib.admin'):
+        data['admin'] = request.build_absolute_uri('/admin/')
+    documentation = {}
+    if apps.is_installed('drf_spectacular'):
+        documentation.update({
             'swagger_ui': request.build_absolute_uri('/api/docs/'),
             'redoc': request.build_absolute_uri('/api/redoc/'),
             'openapi_schema': request.build_absolute_uri('/api/schema/'),
-            'browsable_api': 'Navigate to any endpoint above to see the DRF browsable API interface'
-        }
-    })
+        })
+    if BrowsableAPIRenderer in api_settings.DEFAULT_RENDERER_CLASSES:
+        documentation['browsable_api'] = 'Navigate to any endpoint above to see the DRF browsable API interface'
+    if documentation:
+        data['documentation'] = documentation
+    return Response(data)
 
 urlpatterns = [
     path('', redirect_to_api),
-    path('admin/', admin.site.urls),
-    
-    # API Documentation
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     
     # API endpoints
     path('api/', api_root, name='api-root'),
     path('api/', include('authentication.urls')),
     path('api/', include('books.urls')),
 ]
+
+# The API-only settings profile leaves out the admin and drf-spectacular.
+if apps.is_installed('django.contrib.admin'):
+    urlpatterns.append(lazy_include('admin/', 'library_management.urls_admin', namespace='admin'))
+
+# Staff profiling endpoints, only routed while profiling is enabled
+if settings.REQUEST_PROFILING['ENABLED']:
+    urlpatterns.append(lazy_include('api/profiles/', 'library_management.urls_profiling'))
+
+# API Documentation (after the API routes, so API requests never import it)
+if apps.is_installed('drf_spectacular'):
+    urlpatterns.append(lazy_include('api/', 'library_management.urls_docs'))
@@ -0,0 +1,4 @@
+"""Admin routes, included lazily from ``urls.py``."""
+from django.contrib import admin
+
+urlpatterns = admin.site.get_urls()
@@ -0,0 +1,16 @@
+"""
+OpenAPI schema and documentation routes.
+
+Included lazily from ``urls.py`` so drf-spectacular is only imported by the
+first request (or reverse) that needs these URLs.
+"""
+from django.urls import path
+from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
+
+from .schema import CachedSpectacularAPIView
+
+urlpatterns = [
+    path('schema/', CachedSpectacularAPIView.as_view(), name='schema'),
+    path('docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+    path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+]
@@ -0,0 +1,102 @@
+"""
+Staff endpoints for the profiles taken by ``profiling.py``, included lazily
+from ``urls.py`` and only when ``REQUEST_PROFILING['ENABLED']``.
+"""
+import os
+
+from django.http import FileResponse
+from django.urls import path
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from . import profiling
+from .openapi import OpenApiResponse, extend_schema
+from .serializers import ProfileSerializer, ProfileWindowSerializer
+
+CONTENT_TYPES = {'request': 'application/octet-stream', 'window': 'text/plain'}
+
+
+@extend_schema(
+    methods=['GET'],
+    operation_id='list_profiles',
+    summary='List stored profiles',
+    description='Request and window profiles stored on this host, newest first.',
+    responses={200: ProfileSerializer(many=True)},
+    tags=['Profiling']
+)
+@extend_schema(
+    methods=['POST'],
+    operation_id='start_profile_window',
+    summary='Sample this worker for a time window',
+    description='Samples the stacks of every thread of the worker that serves this request for `seconds`. '
+                'The profile appears under the returned id once the window has ended.',
+    request=ProfileWindowSerializer,
+    responses={
+        202: ProfileWindowSerializer,
+        409: OpenApiResponse(description='A window is already being sampled on this worker'),
+    },
+    tags=['Profiling']
+)
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAdminUser])
+def profiles(request):
+    if request.method == 'GET':
+        return Response([
+            {key: value for key, value in profile.items() if key != 'top_functions'}
+            for profile in profiling.list_profiles()
+        ])
+
+    serializer = ProfileWindowSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    seconds = serializer.validated_data['seconds']
+    profile_id = profiling.start_window(seconds)
+    if profile_id is None:
+        return Response({
+            'error': 'A window is already being sampled on this worker'
+        }, status=status.HTTP_409_CONFLICT)
+    return Response({'id': profile_id, 'seconds': seconds}, status=status.HTTP_202_ACCEPTED)
+
+
+@extend_schema(
+    operation_id='get_profile',
+    summary='Profile summary',
+    description='The top functions of a stored profile by self time.',
+    responses={200: ProfileSerializer, 404: OpenApiResponse(description='No such profile (yet)')},
+    tags=['Profiling']
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def profile_detail(request, profile_id):
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(profile)
+
+
+@extend_schema(
+    operation_id='download_profile',
+    summary='Download a profile',
+    description='A pstats dump (`python -m pstats`, snakeviz) for requests, collapsed stacks '
+                '(flamegraph.pl, speedscope) for windows.',
+    responses={200: OpenApiResponse(description='Profile file'), 404: OpenApiResponse(description='No such profile')},
+    tags=['Profiling']
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def profile_download(request, profile_id):
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    filename = profiling.path(profile_id, profiling.EXTENSIONS[profile['kind']])
+    return FileResponse(
+        open(filename, 'rb'), as_attachment=True, filename=os.path.basename(filename),
+        content_type=CONTENT_TYPES[profile['kind']],
+    )
+
+
+urlpatterns = [
+    path('', profiles, name='profiles'),
+    path('<str:profile_id>/', profile_detail, name='profile-detail'),
+    path('<str:profile_id>/download/', profile_download, name='profile-download'),
+]